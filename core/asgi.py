@@ -20,12 +20,14 @@ from channels.auth import AuthMiddlewareStack
 import game.routing 
 
 from game.middleware import JWTAuthMiddleware
+from game.scheduler import SchedulerLifespan
 
-application = ProtocolTypeRouter({
+# SchedulerLifespan: disconnect/sıra zamanlayıcıları sunucu açılışında başlar
+application = SchedulerLifespan(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": JWTAuthMiddleware(
         URLRouter(
             game.routing.websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+}))
\ No newline at end of file
@@ -149,14 +149,166 @@ REST_FRAMEWORK = {
     ),
 }
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
+# Oyun motoru
+# 'memory': process içi oda durumu + toplu veritabanı yazımı (sadece tek worker)
+# 'database': her tahmin tek kilitli transaction (çok worker - CHANNEL_BROKER_URL ile varsayılan)
+GAME_ENGINE = {
+    'BACKEND': os.getenv("GAME_ENGINE_BACKEND", "database" if os.getenv("CHANNEL_BROKER_URL") else "memory"),
+    'FLUSH_INTERVAL': float(os.getenv("GAME_ENGINE_FLUSH_INTERVAL", "0.5")),
+    'FLUSH_BATCH_SIZE': 500,
+}
+
+# Cache
+# Çok worker'lı kurulumda leaderboard değişikliklerinin tüm process'lere ulaşması için
+# paylaşılan bir backend kullanın (ör. django.core.cache.backends.db.DatabaseCache
+# + python manage.py createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("CACHE_LOCATION", "numberduel"),
+    }
 }
 
+# Leaderboard
+LEADERBOARD = {
+    'MIN_GAMES_FOR_WIN_RATE': 10,
+    'MAX_PAGE_SIZE': 100,
+    'CACHE_TIMEOUT': 300,
+    'CHANGE_TTL': 3600,
+}
+
+# Nadiren değişen yapılandırma kayıtları (GlobalSettings) için process içi önbellek
+# Worker'lar arası geçersiz kılma paylaşımlı CACHES (ör. Redis/Memcached) gerektirir
+CONFIG_CACHE = {
+    'TTL': 300,
+    'VERSION_CHECK_INTERVAL': 1.0,
+}
+
+# Kalıcı zamanlayıcılar (disconnect hükmen yenilgisi vb.)
+GAME_SCHEDULER = {
+    'TICK': 1.0,
+    'SLOTS': 512,
+    'SWEEP_INTERVAL': 5,
+    'SWEEP_BATCH_SIZE': 500,
+    'CLAIM_LEASE': 60,
+}
+
+# Hamle süresi: süre dolunca POLICY uygulanır (zamanlayıcı wheel'inde, veritabanına yazılmaz)
+# Varsayılan kapalı: açmak oyun kuralını değiştirir (ör. TURN_TIMER_LIMIT=60)
+TURN_TIMER = {
+    'LIMIT': int(os.getenv("TURN_TIMER_LIMIT", "0")),  # sıra başına saniye; 0: süre sınırı yok
+    'POLICY': os.getenv("TURN_TIMER_POLICY", "forfeit"),  # 'forfeit': süresi dolan kaybeder, 'skip': sıra rakibe geçer
+    'MAX_SKIPS': 3,        # 'skip' ile tahminsiz üst üste bu kadar süre dolarsa sonuncusu kaybeder
+}
+
+# Channel layer
+# CHANNEL_BROKER_URL verilirse birden fazla daphne worker'ı game.layers.BrokerChannelLayer
+# üzerinden haberleşir (broker: python manage.py run_channel_broker)
+# Örnek: unix:///tmp/numberduel-broker.sock veya tcp://10.0.0.5:7070
+# tcp:// için CHANNEL_BROKER_TOKEN zorunlu (broker ve worker'larda aynı); trafik şifrelenmez, sadece iç ağ
+CHANNEL_BROKER = {
+    'ADDRESS': os.getenv("CHANNEL_BROKER_URL", ""),
+    'TOKEN': os.getenv("CHANNEL_BROKER_TOKEN", ""),
+    'GROUP_EXPIRY': int(os.getenv("CHANNEL_GROUP_EXPIRY", "86400")),
+    'MAX_CLIENT_BUFFER': 8 * 1024 * 1024,
+}
+
+if CHANNEL_BROKER['ADDRESS']:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "game.layers.BrokerChannelLayer",
+            "CONFIG": {
+                "address": CHANNEL_BROKER['ADDRESS'],
+                "capacity": int(os.getenv("CHANNEL_CAPACITY", "100")),
+                "expiry": 60,
+                "token": CHANNEL_BROKER['TOKEN'],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
 
 CORS_ALLOWED_ORIGINS = os.getenv("CORS_ORIGINS", "").split(",")
 CORS_ALLOW_CREDENTIALS = True
+# Sayfalama header'ları frontend'den okunabilsin
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'X-Total-Count']
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+# Bitmiş odaların arşivlenmesi (manage.py archive_rooms)
+ARCHIVE = {
+    'RETENTION_DAYS': 30,   # bu süreden önce biten odalar arşive taşınır
+    'BATCH_SIZE': 500,      # transaction başına taşınan oda
+}
+
+# Hesap hareketi export'u (transactions/export/<csv|ndjson>/)
+TRANSACTION_EXPORT = {
+    'CHUNK_SIZE': 2000,       # sunucu taraflı cursor'dan tek seferde okunan satır
+    'LINES_PER_CHUNK': 500,   # yanıta tek parça olarak yazılan satır
+}
+
+# ws/lobby/ akışı
+LOBBY = {
+    'TICK': 0.5,            # delta'lar bu aralıkla birleştirilip gönderilir (saniye)
+    'SNAPSHOT_LIMIT': 500,  # bağlanınca gönderilen en yeni oda sayısı
+}
+
+# İzleyiciler (ws/game/<room_id>/, oyuncu olmayan kullanıcılar)
+SPECTATORS = {
+    'MAX_PER_ROOM': 10000,  # oda başına izleyici sınırı (process başına)
+    'TICK': 0.25,           # delta'lar bu aralıkla batch olarak gönderilir (saniye)
+    'SEND_BATCH': 500,      # bu kadar sokete yazdıktan sonra event loop'a dön
+}
+
+# Yeniden bağlanma: oda başına son yayınlar (?since=<event_seq> ile tekrar gönderilir)
+REPLAY = {
+    'BUFFER_SIZE': 64,   # oda başına tutulan olay; daha büyük boşlukta tam durum (SNAPSHOT) gönderilir
+    'MAX_ROOMS': 10000,  # günlüğü tutulan oda sayısı (process başına, en eski kullanılan atılır)
+    'TTL': 600,          # bu kadar saniye yayın yapmayan odanın günlüğü atılır (bitmiş oyunlar)
+}
+
+# soak_game eşikleri: 1000 oyun başına izin verilen büyüme
+SOAK = {
+    'MAX_RSS_KB_PER_1K': 8192,    # --no-tracemalloc ile
+    'MAX_TRACED_KB_PER_1K': 2048,
+    'MAX_OBJECTS_PER_1K': 5,      # task, grup, kanal, oda, zamanlayıcı vb.
+    'SETTLE': 1.0,                # örnekten önce gecikmeli temizlikler için bekleme (saniye)
+}
+
+# WebSocket handshake kimlik önbelleği (process başına)
+WEBSOCKET_AUTH = {
+    'USER_CACHE_SIZE': 10000,
+    'USER_CACHE_TTL': 300,  # saniye - diğer worker'lardaki değişiklikler en geç bu sürede görülür
+}
+
+# /metrics (Prometheus) - Bearer token ister; token boşsa kapalıdır
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# False: token olmadan herkese açık (sadece dışarıya kapalı iç ağda kullanın)
+METRICS_REQUIRE_TOKEN = os.getenv("METRICS_REQUIRE_TOKEN", "true").lower() != "false"
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'default',
+        },
+    },
+    'loggers': {
+        'game': {
+            'handlers': ['console'],
+            'level': os.getenv("GAME_LOG_LEVEL", "INFO"),
+        },
+    },
+}
\ No newline at end of file
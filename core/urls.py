@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from game.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),
     path('api/game/', include('game.urls')),
+    path('metrics', metrics_view),
 ]
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import useWebSocket, { ReadyState } from 'react-use-websocket';
 import { useParams, useNavigate } from 'react-router-dom';
 
@@ -14,17 +14,25 @@ const GameBoard = () => {
     const [myUserId, setMyUserId] = useState(null);
     const [guessCount, setGuessCount] = useState(0);
     const [disconnectWarning, setDisconnectWarning] = useState(false);
+    // Sıra süresi: sunucunun gönderdiği time_left'ten hesaplanan bitiş anı (ms)
+    const [deadline, setDeadline] = useState(null);
+    const [timeLeft, setTimeLeft] = useState(null);
     const [playerBalances, setPlayerBalances] = useState({
         myBalance: null,
         myStartBalance: null,
         betAmount: null
     });
     const logsEndRef = useRef(null);
+    // Son alınan olayın imleci ("<epoch>-<sıra>", opak): yeniden bağlanırken sadece kaçırılanlar istenir
+    const lastSeqRef = useRef(null);
     const token = localStorage.getItem('access_token');
-    const wsUrl = `ws://127.0.0.1:8000/ws/game/${roomId}/?token=${token}`;
+    const getSocketUrl = useCallback(() => {
+        const since = lastSeqRef.current !== null ? `&since=${encodeURIComponent(lastSeqRef.current)}` : '';
+        return `ws://127.0.0.1:8000/ws/game/${roomId}/?token=${token}${since}`;
+    }, [roomId, token]);
     
     const { sendJsonMessage, lastMessage, readyState } = useWebSocket(
-        wsUrl,
+        getSocketUrl,
         {
             shouldReconnect: (closeEvent) => {
                 console.log('WebSocket koptu, yeniden bağlanılıyor...', closeEvent);
@@ -65,10 +73,50 @@ const GameBoard = () => {
     
     }, [navigate]);
 
+    useEffect(() => {
+        if (deadline === null) {
+            setTimeLeft(null);
+            return;
+        }
+        const update = () => setTimeLeft(Math.max(0, Math.ceil((deadline - Date.now()) / 1000)));
+        update();
+        const interval = setInterval(update, 1000);
+        return () => clearInterval(interval);
+    }, [deadline]);
+
     useEffect(() => {
         if (lastMessage !== null) {
             const data = JSON.parse(lastMessage.data);
             console.log('📨 WebSocket mesajı:', data);
+            if (data.event_seq !== undefined) {
+                lastSeqRef.current = data.event_seq;
+            }
+            if (data.time_left !== undefined && data.time_left !== null) {
+                setDeadline(Date.now() + data.time_left * 1000);
+            }
+            if (data.event === 'SNAPSHOT') {
+                // Yeniden bağlanma: kaçırılan olaylar yerine tam durum
+                const current = data.players.find(player => player.id === data.turn);
+                setGameStarted(true);
+                setGuessCount(data.guesses.length);
+                setTurn(data.turn);
+                setTurnName(current ? current.username : '');
+                const names = Object.fromEntries(data.players.map(player => [player.id, player.username]));
+                setLogs(data.guesses.map(item => ({
+                    text: item.hint
+                        ? `${item.hint === 'UP' ? '📈' : '📉'} ${names[item.guesser_id]}: ${item.guess} → Daha ${item.hint === 'UP' ? 'YUKARI' : 'AŞAĞI'}!`
+                        : `🎉 ${names[item.guesser_id]} doğru sayıyı buldu: ${item.guess}`,
+                    guess: item.guess,
+                    guesserName: names[item.guesser_id],
+                    guesserId: item.guesser_id,
+                    event: item.hint ? 'CONTINUE' : 'WINNER',
+                    timestamp: new Date().toLocaleTimeString()
+                })));
+                if (data.winner_id) {
+                    setGameEnded(true);
+                }
+                return;
+            }
             if (data.error) {
                 
                 setLogs(prev => [...prev, {
@@ -149,10 +197,12 @@ const GameBoard = () => {
                 
                 setGameEnded(true);
                 setDisconnectWarning(false);
+                setDeadline(null);
             
                 const iAmWinner = data.winner_id === myUserId;
                 const isManualLeave = data.reason === 'manual_leave';
                 const isDisconnect = data.reason === 'disconnect';
+                const isTimeout = data.reason === 'timeout';
                 
                 if (isManualLeave) {
                     if (iAmWinner) {
@@ -175,6 +225,15 @@ const GameBoard = () => {
                         alert('❌ 30 saniye bağlantısız kaldınız ve oyunu kaybettiniz.');
                         navigate('/lobby');
                     }
+                } else if (isTimeout) {
+                    const timeoutMessage = iAmWinner
+                        ? '⏰ Rakibiniz süresinde tahmin yapmadı!\n\nSiz kazandınız ve bahsi aldınız. 💰'
+                        : '⏰ Süresinde tahmin yapmadığınız için oyunu kaybettiniz.';
+
+                    setTimeout(() => {
+                        alert(timeoutMessage);
+                        navigate('/lobby');
+                    }, 500);
                 } else {
                     const winMessage = iAmWinner 
                         ? '🎉 Tebrikler! Doğru sayıyı buldunuz ve bahsi kazandınız! 💰' 
@@ -295,6 +354,14 @@ const GameBoard = () => {
                                     </strong>
                                     <br />
                                     <small>{guessCount} tahmin yapıldı</small>
+                                    {timeLeft !== null && (
+                                        <>
+                                            <br />
+                                            <small className={timeLeft <= 10 ? 'text-danger fw-bold' : ''}>
+                                                ⏱️ {timeLeft} sn
+                                            </small>
+                                        </>
+                                    )}
                                 </div>
                             )}
                             {!gameStarted && !gameEnded && (
@@ -409,6 +476,7 @@ const GameBoard = () => {
                                             className={`alert ${
                                                 log.event === 'WINNER' ? 'alert-success' :
                                                 log.event === 'START' ? 'alert-info' :
+                                                log.event === 'TIMEOUT' ? 'alert-secondary' :
                                                 log.event === 'ERROR' ? 'alert-danger' :
                                                 isMyGuess ? 'alert-primary' : 'alert-warning'
                                             } py-2 px-3 mb-2 small`}
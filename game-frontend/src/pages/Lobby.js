@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import useWebSocket from 'react-use-websocket';
 import { gameAPI, authAPI } from '../utils/api';
 
 const Lobby = () => {
@@ -14,6 +15,37 @@ const Lobby = () => {
     const [error, setError] = useState('');
     const [leaderboard, setLeaderboard] = useState([]);
     const navigate = useNavigate();
+    const token = localStorage.getItem('access_token');
+
+    // Oda listesi: bağlanınca SNAPSHOT, sonra sadece değişiklikler (DELTA)
+    const { lastJsonMessage } = useWebSocket(
+        `ws://127.0.0.1:8000/ws/lobby/?token=${token}`,
+        {
+            shouldReconnect: () => true,
+            reconnectInterval: (attemptNumber) => Math.min(1000 * Math.pow(2, attemptNumber), 10000),
+        }
+    );
+
+    useEffect(() => {
+        if (!lastJsonMessage) return;
+        if (lastJsonMessage.event === 'SNAPSHOT') {
+            setRooms(lastJsonMessage.rooms);
+        } else if (lastJsonMessage.event === 'DELTA') {
+            setRooms(prevRooms => {
+                const byId = new Map(prevRooms.map(room => [room.id, room]));
+                lastJsonMessage.deltas.forEach(delta => {
+                    if (delta.op === 'upsert') {
+                        byId.set(delta.room.id, delta.room);
+                    } else {
+                        byId.delete(delta.id);
+                    }
+                });
+                return Array.from(byId.values()).sort(
+                    (a, b) => new Date(b.created_at) - new Date(a.created_at)
+                );
+            });
+        }
+    }, [lastJsonMessage]);
 
     useEffect(() => {
         const storedUsername = localStorage.getItem('username');
@@ -27,10 +59,8 @@ const Lobby = () => {
         setUsername(storedUsername);
         setBalance(parseFloat(storedBalance) || 0);
         loadBalance();
-        loadRooms();
         loadLeaderboard();
         const interval = setInterval(() => {
-            loadRooms();
             loadLeaderboard();
         }, 3000);
         return () => clearInterval(interval);
@@ -46,15 +76,6 @@ const Lobby = () => {
         }
     };
 
-    const loadRooms = async () => {
-        try {
-            const response = await gameAPI.getRooms();
-            setRooms(response.data);
-        } catch (err) {
-            console.error('Odalar yüklenemedi:', err);
-        }
-    };
-
     const loadLeaderboard = async () => {
         try {
             const response = await gameAPI.getLeaderboard();
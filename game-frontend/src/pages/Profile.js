@@ -5,6 +5,7 @@ import { authAPI, gameAPI } from '../utils/api';
 const Profile = () => {
     const [profile, setProfile] = useState(null);
     const [transactions, setTransactions] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [filter, setFilter] = useState('all');
     const navigate = useNavigate();
 
@@ -25,10 +26,11 @@ const Profile = () => {
         }
     };
 
-    const loadTransactions = async () => {
+    const loadTransactions = async (cursor) => {
         try {
-            const response = await gameAPI.getTransactions();
-            setTransactions(response.data);
+            const response = await gameAPI.getTransactions(cursor);
+            setTransactions(prev => cursor ? [...prev, ...response.data] : response.data);
+            setNextCursor(response.headers['x-next-cursor'] || null);
         } catch (err) {
             console.error('Transaction geçmişi yüklenemedi:', err);
         }
@@ -193,6 +195,14 @@ const Profile = () => {
                                         </tbody>
                                     </table>
                                 )}
+                                {nextCursor && (
+                                    <button
+                                        className="btn btn-outline-secondary w-100"
+                                        onClick={() => loadTransactions(nextCursor)}
+                                    >
+                                        Daha Fazla Yükle
+                                    </button>
+                                )}
                             </div>
                         </div>
                     </div>
@@ -73,8 +73,8 @@ export const gameAPI = {
     joinRoom: (roomId) => 
         api.post(`/game/rooms/${roomId}/join/`),
     
-    getTransactions: () => 
-        api.get('/game/transactions/'),
+    getTransactions: (cursor) => 
+        api.get('/game/transactions/', { params: cursor ? { cursor } : {} }),
     
     getLeaderboard: () => 
         api.get('/game/leaderboard/'),
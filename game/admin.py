@@ -1,7 +1,42 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
-from django.utils.html import format_html
-from .models import Room, GlobalSettings, Transaction, GameSession
+from django.db.models import Count
+from django.shortcuts import redirect
+from django.utils.html import format_html, format_html_join
+from .config import global_settings
+from .archive import GUESS_FIELDS
+from .models import Room, GlobalSettings, Transaction, GameSession, ArchivedGame
+
+
+def guess_history_table(entries):
+    """
+    Tahmin geçmişi tablosu - entries: (seq, oyuncu, tahmin, yanıt, zaman) demetleri
+    Kullanıcı adı ve yanıt metni kullanıcı kaynaklıdır: her hücre format_html_join ile escape edilir
+    """
+    entries = list(entries)
+    rows = format_html_join(
+        '',
+        '<tr style="border-bottom: 1px solid #ddd; background: {};">'
+        '<td style="padding: 8px; text-align: center;"><strong>{}</strong></td>'
+        '<td style="padding: 8px;"><strong>{}</strong></td>'
+        '<td style="padding: 8px; text-align: center;">{}</td>'
+        '<td style="padding: 8px;">{}</td>'
+        '<td style="padding: 8px;"><small>{}</small></td>'
+        '</tr>',
+        (
+            ('#f9f9f9' if seq % 2 == 0 else 'white', seq, name, guess, (response or '')[:60], str(created_at)[:19])
+            for seq, name, guess, response, created_at in entries
+        )
+    )
+    return format_html(
+        '<table style="width:100%; border-collapse: collapse; margin-top: 10px;">'
+        '<tr style="background: #417690; color: white;"><th style="padding: 8px;">#</th><th>Oyuncu</th><th>Tahmin</th><th>Sonuç</th><th>Zaman</th></tr>'
+        '{}</table>'
+        '<p style="margin-top: 10px;"><strong>Toplam Tahmin:</strong> {}</p>',
+        rows,
+        len(entries)
+    )
+
 
 User = get_user_model()
 
@@ -11,7 +46,11 @@ class GlobalSettingsAdmin(admin.ModelAdmin):
     list_display = ('min_bet', 'max_bet', 'bet_step')
     
     def has_add_permission(self, request):
-        return not GlobalSettings.objects.exists()
+        # Tekil kayıt önbellek ilk yüklendiğinde oluşturulur: eklenmez, düzenlenir
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        return redirect('admin:game_globalsettings_change', global_settings.get().pk)
     
     def has_delete_permission(self, request, obj=None):
         return False
@@ -77,14 +116,18 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = (
         'id',
         'user',
+        'kind',
         'amount_display',
         'description',
+        'room_display',
         'created_at'
     )
     list_filter = (
+        'kind',
         'created_at',
         'user',
     )
+    raw_id_fields = ('user', 'room')
     search_fields = ('user__username', 'description')
     date_hierarchy = 'created_at'
     
@@ -102,6 +145,11 @@ class TransactionAdmin(admin.ModelAdmin):
     amount_display.short_description = 'Miktar'
     amount_display.admin_order_field = 'amount'
 
+    def room_display(self, obj):
+        # Oda arşivlenmiş olabilir: ilişkiyi yüklemeden id göster
+        return f"#{obj.room_id}" if obj.room_id else '-'
+    room_display.short_description = 'Oda'
+
 
 # Oyun Odaları
 @admin.register(Room)
@@ -156,7 +204,7 @@ class GameSessionAdmin(admin.ModelAdmin):
     )
     list_filter = ('started_at', 'winner', 'ended_at')
     search_fields = ('room__name', 'winner__username', 'room__creator__username', 'room__player2__username')
-    readonly_fields = ('started_at', 'ended_at', 'history', 'target_number', 'turn_count_display', 'duration_display')
+    readonly_fields = ('started_at', 'ended_at', 'target_number', 'turn_count_display', 'duration_display')
     
     def room_name(self, obj):
         return f"#{obj.room.id} - {obj.room.name}"
@@ -173,8 +221,15 @@ class GameSessionAdmin(admin.ModelAdmin):
         return '-'
     loser_display.short_description = 'Kaybeden'
     
+    def get_queryset(self, request):
+        # Liste sayfasında satır başına COUNT sorgusu yapılmasın
+        return super().get_queryset(request).select_related('room', 'winner').annotate(guess_count=Count('guesses'))
+    
     def turn_count_display(self, obj):
-        return f"{obj.turn_count} tahmin"
+        count = getattr(obj, 'guess_count', None)
+        if count is None:
+            count = obj.turn_count
+        return f"{count} tahmin"
     turn_count_display.short_description = 'Tur Sayısı'
     
     def duration_display(self, obj):
@@ -187,28 +242,48 @@ class GameSessionAdmin(admin.ModelAdmin):
         return self.readonly_fields
     
     def history_display(self, obj):
-        if not obj.history:
+        guesses = list(obj.guesses.all())
+        if not guesses:
             return "Henüz tahmin yapılmadı"
         
-        html = '<table style="width:100%; border-collapse: collapse; margin-top: 10px;">'
-        html += '<tr style="background: #417690; color: white;"><th style="padding: 8px;">#</th><th>Oyuncu</th><th>Tahmin</th><th>Sonuç</th><th>Zaman</th></tr>'
-        
-        for idx, entry in enumerate(obj.history, 1):
-            bg_color = '#f9f9f9' if idx % 2 == 0 else 'white'
-            html += f'<tr style="border-bottom: 1px solid #ddd; background: {bg_color};">'
-            html += f'<td style="padding: 8px; text-align: center;"><strong>{idx}</strong></td>'
-            html += f'<td style="padding: 8px;"><strong>{entry.get("guesser", "")}</strong></td>'
-            html += f'<td style="padding: 8px; text-align: center;">{entry.get("guess", "")}</td>'
-            html += f'<td style="padding: 8px;">{entry.get("response", "")[:60]}</td>'
-            html += f'<td style="padding: 8px;"><small>{entry.get("timestamp", "")[:19]}</small></td>'
-            html += f'</tr>'
-        
-        html += '</table>'
-        html += f'<p style="margin-top: 10px;"><strong>Toplam Tahmin:</strong> {len(obj.history)}</p>'
-        return format_html(html)
+        return guess_history_table(
+            (entry.seq, entry.guesser_name, entry.guess, entry.response, entry.created_at.isoformat())
+            for entry in guesses
+        )
     history_display.short_description = 'Oyun Geçmişi (Detaylı)'
 
 
+# Arşivlenmiş Oyunlar
+@admin.register(ArchivedGame)
+class ArchivedGameAdmin(admin.ModelAdmin):
+    list_display = ('room_id', 'name', 'bet_amount', 'creator', 'player2', 'winner', 'created_at', 'ended_at')
+    list_filter = ('ended_at',)
+    search_fields = ('name', 'creator__username', 'player2__username')
+    date_hierarchy = 'created_at'
+    exclude = ('guesses',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('creator', 'player2', 'winner')
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields if field.name != 'guesses'] + ['history_display']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def history_display(self, obj):
+        if not obj.guesses:
+            return "Tahmin yok"
+        return guess_history_table(
+            (entry['seq'], entry['guesser_name'], entry['guess'], entry['response'], entry['created_at'])
+            for entry in (dict(zip(GUESS_FIELDS, row)) for row in obj.guesses)
+        )
+    history_display.short_description = 'Oyun Geçmişi'
+
+
 # Register İşlemleri
 try:
     admin.site.unregister(User)
@@ -3,3 +3,16 @@ from django.apps import AppConfig
 
 class GameConfig(AppConfig):
     name = 'game'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save, post_delete
+        from .metrics import install_query_counter
+        from .middleware import refresh_identity, forget_identity
+        connection_created.connect(install_query_counter)
+
+        # WebSocket kimlik önbelleği: kullanıcı değişince/silinince güncelle
+        User = get_user_model()
+        post_save.connect(refresh_identity, sender=User, dispatch_uid='game_refresh_identity')
+        post_delete.connect(forget_identity, sender=User, dispatch_uid='game_forget_identity')
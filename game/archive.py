@@ -0,0 +1,152 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import ArchivedGame, GameGuess, GameSession, Room
+
+logger = logging.getLogger(__name__)
+
+# ArchivedGame.guesses satırlarındaki alan sırası
+GUESS_FIELDS = ('seq', 'guesser_id', 'guesser_name', 'guess', 'response', 'created_at')
+
+
+def archive_setting(name, default):
+    return getattr(settings, 'ARCHIVE', {}).get(name, default)
+
+
+def archivable_rooms(cutoff):
+    """cutoff'tan önce biten odalar (bitiş zamanı yoksa oluşturulma zamanına göre)"""
+    return Room.objects.filter(status='FINISHED').filter(
+        Q(game_session__ended_at__lt=cutoff) |
+        Q(game_session__ended_at__isnull=True, created_at__lt=cutoff)
+    )
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Tek transaction'da en fazla batch_size odayı arşive yaz ve sıcak tablolardan sil
+    Eşzamanlı çalışan arşivleyiciler kilitli odaları atlar (skip_locked).
+    Dönüş: taşınan oda sayısı
+    """
+    with transaction.atomic():
+        rooms = list(
+            archivable_rooms(cutoff).select_for_update(skip_locked=True, of=('self',)).order_by('id').values(
+                'id', 'name', 'bet_amount', 'creator_id', 'player2_id', 'created_at'
+            )[:batch_size]
+        )
+        if not rooms:
+            return 0
+        ids = [room['id'] for room in rooms]
+
+        sessions = {
+            session['room_id']: session
+            for session in GameSession.objects.filter(room_id__in=ids).values(
+                'room_id', 'target_number', 'winner_id', 'started_at', 'ended_at'
+            )
+        }
+        guesses = defaultdict(list)
+        rows = GameGuess.objects.filter(session__room_id__in=ids).order_by('session_id', 'seq').values_list(
+            'session__room_id', *GUESS_FIELDS
+        )
+        for room_id, *fields, created_at in rows:
+            # DjangoJSONEncoder zamanı milisaniyeye keser: game_record aynı değeri okusun
+            guesses[room_id].append([*fields, created_at.isoformat()])
+
+        ArchivedGame.objects.bulk_create([
+            ArchivedGame(
+                room_id=room['id'],
+                name=room['name'],
+                bet_amount=room['bet_amount'],
+                creator_id=room['creator_id'],
+                player2_id=room['player2_id'],
+                winner_id=sessions.get(room['id'], {}).get('winner_id'),
+                target_number=sessions.get(room['id'], {}).get('target_number'),
+                created_at=room['created_at'],
+                started_at=sessions.get(room['id'], {}).get('started_at'),
+                ended_at=sessions.get(room['id'], {}).get('ended_at'),
+                guesses=guesses[room['id']],
+            )
+            for room in rooms
+        ])
+        # GameSession, GameGuess ve zamanlayıcılar CASCADE ile silinir;
+        # hareket kayıtları (Transaction.room_id) yerinde kalır
+        Room.objects.filter(id__in=ids).delete()
+        return len(ids)
+
+
+def archive_finished_rooms(retention_days=None, batch_size=None, max_batches=None):
+    """
+    Saklama süresini aşan bitmiş odaları parça parça arşivle (cron / zamanlanmış görev)
+    Dönüş: taşınan oda sayısı
+    """
+    if retention_days is None:
+        retention_days = archive_setting('RETENTION_DAYS', 30)
+    if batch_size is None:
+        batch_size = archive_setting('BATCH_SIZE', 500)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        batches += 1
+        if moved < batch_size:
+            break
+    logger.info("Arşivleme bitti rooms=%s batches=%s cutoff=%s", total, batches, cutoff.isoformat())
+    return total
+
+
+def game_record(room_id):
+    """
+    Arşivden haberdar oyun kaydı: önce sıcak tablolar, yoksa arşiv
+    Dönüş: sözlük veya None
+    """
+    room = Room.objects.filter(id=room_id).values(
+        'id', 'name', 'bet_amount', 'status', 'creator_id', 'player2_id', 'created_at',
+        'game_session__winner_id', 'game_session__target_number',
+        'game_session__started_at', 'game_session__ended_at'
+    ).first()
+    if room is not None:
+        return {
+            'room_id': room['id'],
+            'name': room['name'],
+            'bet_amount': room['bet_amount'],
+            'status': room['status'],
+            'creator_id': room['creator_id'],
+            'player2_id': room['player2_id'],
+            'winner_id': room['game_session__winner_id'],
+            'target_number': room['game_session__target_number'],
+            'created_at': room['created_at'],
+            'started_at': room['game_session__started_at'],
+            'ended_at': room['game_session__ended_at'],
+            'guesses': list(
+                GameGuess.objects.filter(session__room_id=room_id).order_by('seq').values(*GUESS_FIELDS)
+            ),
+            'archived': False,
+        }
+
+    game = ArchivedGame.objects.filter(room_id=room_id).first()
+    if game is None:
+        return None
+    guesses = [dict(zip(GUESS_FIELDS, row)) for row in game.guesses]
+    for guess in guesses:
+        guess['created_at'] = parse_datetime(guess['created_at'])
+    return {
+        'room_id': game.room_id,
+        'name': game.name,
+        'bet_amount': game.bet_amount,
+        'status': 'FINISHED',
+        'creator_id': game.creator_id,
+        'player2_id': game.player2_id,
+        'winner_id': game.winner_id,
+        'target_number': game.target_number,
+        'created_at': game.created_at,
+        'started_at': game.started_at,
+        'ended_at': game.ended_at,
+        'guesses': guesses,
+        'archived': True,
+    }
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import math
+import random
+import time
+from contextlib import contextmanager
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework_simplejwt.tokens import AccessToken
+from .engine import engine_setting, evaluate_guess, guess_payload
+from .metrics import db_queries, phase_seconds, phase_queries
+from .models import Room
+from .protocol import CODECS, JSON, FrameCache, broadcast_message, expand, frame
+
+RECEIVE_TIMEOUT = 10
+
+
+@contextmanager
+def throwaway_database(keepdb=False, verbosity=0):
+    """
+    Ayarlardaki veritabanının test kopyasını oluştur (test_<NAME>), iş bitince sil
+    SQLite için bellek içi, PostgreSQL için ayrı bir veritabanı kullanılır.
+    """
+    old_config = setup_databases(verbosity=verbosity, interactive=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        teardown_databases(old_config, verbosity=verbosity, keepdb=keepdb)
+
+
+def percentile(values, pct):
+    """Nearest-rank yüzdelik"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+@database_sync_to_async
+def create_rooms(count, bet_amount, prefix):
+    """count adet FULL oda ve 2*count oyuncu oluştur - Dönüş: [(room_id, [(user_id, token), ...])]"""
+    User = get_user_model()
+    password = make_password(None)
+    users = User.objects.bulk_create([
+        User(username=f'{prefix}{i}', password=password) for i in range(count * 2)
+    ])
+    rooms = Room.objects.bulk_create([
+        Room(
+            name=f'{prefix}room{i}',
+            bet_amount=bet_amount,
+            creator=users[i * 2],
+            player2=users[i * 2 + 1],
+            status='FULL'
+        )
+        for i in range(count)
+    ])
+    return [
+        (room.id, [(user.id, str(AccessToken.for_user(user))) for user in users[i * 2:i * 2 + 2]])
+        for i, room in enumerate(rooms)
+    ]
+
+
+class SimulatedPlayer:
+    def __init__(self, application, room_id, user_id, token, codec, stats):
+        self.application = application
+        self.path = f'/ws/game/{room_id}/?token={token}'
+        self.user_id = user_id
+        self.codec = codec
+        self.stats = stats
+        self.socket = None
+        # Son alınan olay: yeniden bağlanırken ?since= ile gönderilir (bkz. game/replay.py)
+        self.last_seq = None
+
+    async def connect(self):
+        # JSON istemcisi alt protokol önermez (eski istemcilerle aynı yol)
+        subprotocols = [self.codec.subprotocol] if self.codec.binary else None
+        path = self.path if self.last_seq is None else f'{self.path}&since={self.last_seq}'
+        self.socket = WebsocketCommunicator(self.application, path, subprotocols=subprotocols)
+        connected, _ = await self.socket.connect(RECEIVE_TIMEOUT)
+        if not connected:
+            raise RuntimeError(f'WebSocket reddedildi: {self.path}')
+
+    async def disconnect(self):
+        # Varsayılan 1 sn'de test iletişimcisi uygulamayı iptal eder (disconnect handler çalışmaz);
+        # sunucular (daphne application_close_timeout) daha uzun bekler
+        await self.socket.disconnect(timeout=RECEIVE_TIMEOUT)
+
+    async def reconnect(self):
+        await self.disconnect()
+        await self.connect()
+
+    async def send(self, data):
+        await self.socket.send_to(**frame(self.codec, data))
+
+    async def receive_message(self):
+        output = await self.socket.receive_output(RECEIVE_TIMEOUT)
+        if output['type'] != 'websocket.send':
+            raise RuntimeError(f'Beklenmeyen çıktı: {output}')
+        data = output.get('bytes')
+        if data is None:
+            data = output['text']
+        self.stats['bytes_received'] += len(data) if isinstance(data, bytes) else len(data.encode())
+        self.stats['messages_received'] += 1
+        message = expand(self.codec.decode(data)) if self.codec.binary else json.loads(data)
+        self.last_seq = message.get('event_seq', self.last_seq)
+        return message
+
+    async def receive(self, event=None):
+        """
+        Sonraki oyun mesajını bekle - Dönüş: (mesaj, zaman)
+        event verilirse diğer mesajlar, verilmezse tekrarlanan START mesajları ve yeniden
+        bağlanmadaki SNAPSHOT atlanır (iki oyuncu aynı anda bağlanınca her iki consumer da
+        START yayınlayabilir).
+        """
+        while True:
+            message = await self.receive_message()
+            if event is not None and message.get('event') != event:
+                continue
+            if event is None and message.get('event') in ('START', 'SNAPSHOT'):
+                continue
+            return message, time.perf_counter()
+
+
+async def play_room(application, room_id, players, rng, disconnect_rate, stats, codec):
+    """
+    İki oyunculu bir oyunu ikiye bölme (bisection) ile sonuna kadar oyna
+    Sırası gelen oyuncu disconnect_rate olasılıkla tahminden önce kopup yeniden bağlanır.
+    """
+    players = {
+        user_id: SimulatedPlayer(application, room_id, user_id, token, codec, stats)
+        for user_id, token in players
+    }
+    for player in players.values():
+        await player.connect()
+    try:
+        starts = await asyncio.gather(*(player.receive('START') for player in players.values()))
+        turn = starts[0][0]['turn']
+        low, high = 1, 100
+        while True:
+            if rng.random() < disconnect_rate:
+                await players[turn].reconnect()
+                stats['reconnects'] += 1
+
+            guess = (low + high) // 2
+            sent_at = time.perf_counter()
+            await players[turn].send({'action': 'guess', 'number': guess})
+            received = await asyncio.gather(*(player.receive() for player in players.values()))
+            stats['latencies'].append(max(at for _, at in received) - sent_at)
+            stats['guesses'] += 1
+
+            message = received[0][0]
+            if message.get('event') == 'WINNER':
+                return
+            if 'error' in message:
+                raise RuntimeError(message['error'])
+            if message['hint'] == 'UP':
+                low = guess + 1
+            else:
+                high = guess - 1
+            turn = message['turn']
+    finally:
+        for player in players.values():
+            await player.disconnect()
+
+
+def phase_summary():
+    """metrics histogramlarından aşama başına ortalama süre ve sorgu sayısı"""
+    summary = {}
+    for phase, row in sorted(phase_seconds.values.items()):
+        if not row[-1]:
+            continue
+        queries = phase_queries.values.get(phase)
+        summary[phase] = {
+            'count': row[-1],
+            'mean_ms': round(row[-2] / row[-1] * 1000, 3),
+            'queries_per_call': round(queries[-2] / queries[-1], 2) if queries else None,
+        }
+    return summary
+
+
+async def run_benchmark(application, rooms=50, concurrency=None, disconnect_rate=0.0, bet_amount=10, seed=None,
+                        protocol=JSON):
+    """
+    rooms adet oyunu eşzamanlı oynat ve sonuçları sözlük olarak döndür
+    Veritabanı kayıtları çağıranın veritabanına yazılır (bkz. throwaway_database).
+    protocol: oyuncuların önerdiği WebSocket alt protokolü (bkz. game/protocol.py)
+    """
+    rng = random.Random(seed)
+    codec = CODECS[protocol]
+    prefix = f'bench{int(time.time() * 1000)}_'
+    room_list = await create_rooms(rooms, bet_amount, prefix)
+    stats = {
+        'latencies': [], 'guesses': 0, 'reconnects': 0, 'errors': [],
+        'bytes_received': 0, 'messages_received': 0,
+    }
+    semaphore = asyncio.Semaphore(concurrency or rooms)
+
+    async def play(room_id, players):
+        async with semaphore:
+            try:
+                await play_room(application, room_id, players, rng, disconnect_rate, stats, codec)
+            except Exception as e:
+                stats['errors'].append(f'room={room_id}: {e!r}')
+
+    # Not: uygulama test iletişimcisinde boş context ile çalışır, bu yüzden
+    # sorgular track() ile değil süreç geneli sayaçtan ölçülür
+    queries_before = db_queries.value
+    started = time.perf_counter()
+    await asyncio.gather(*(play(room_id, players) for room_id, players in room_list))
+    elapsed = time.perf_counter() - started
+    queries = db_queries.value - queries_before
+    games = rooms - len(stats['errors'])
+    latencies_ms = [value * 1000 for value in stats['latencies']]
+
+    return {
+        'engine': engine_setting('BACKEND', 'memory'),
+        'protocol': protocol,
+        'rooms': rooms,
+        'concurrency': concurrency or rooms,
+        'disconnect_rate': disconnect_rate,
+        'games_completed': games,
+        'errors': stats['errors'],
+        'guesses': stats['guesses'],
+        'reconnects': stats['reconnects'],
+        'duration_s': round(elapsed, 3),
+        'games_per_s': round(games / elapsed, 2) if elapsed else None,
+        'guesses_per_s': round(stats['guesses'] / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            name: round(value, 3) if value is not None else None
+            for name, value in (
+                ('p50', percentile(latencies_ms, 50)),
+                ('p95', percentile(latencies_ms, 95)),
+                ('p99', percentile(latencies_ms, 99)),
+                ('max', max(latencies_ms, default=None)),
+            )
+        },
+        'messages_received': stats['messages_received'],
+        'bytes_per_message': (
+            round(stats['bytes_received'] / stats['messages_received'], 1) if stats['messages_received'] else None
+        ),
+        'db_queries': queries,
+        'db_queries_per_game': round(queries / games, 2) if games else None,
+        'phases': phase_summary(),
+    }
+
+
+def sample_messages():
+    """Oyun boyunca gönderilen tipik mesajlar (protokol karşılaştırması için)"""
+    balances = {
+        role: {'user_id': user_id, 'current': 990.0, 'start': 1000.0, 'bet': 10.0}
+        for role, user_id in (('creator', 101), ('player2', 102))
+    }
+    continue_message, continue_event, hint = evaluate_guess('oyuncu_101', 50, 73)
+    winner_message, winner_event, _ = evaluate_guess('oyuncu_102', 73, 73)
+    return {
+        'START': {
+            'type': 'game_message',
+            'message': '🎮 Oyun başladı! Gizli sayı 1-100 arasında seçildi.',
+            'turn': 101,
+            'turn_name': 'oyuncu_101',
+            'event': 'START',
+            'balances': balances,
+        },
+        'CONTINUE': guess_payload(1, 101, 'oyuncu_101', 50, continue_message, continue_event, hint, 102, 'oyuncu_102'),
+        'WINNER': guess_payload(2, 102, 'oyuncu_102', 73, winner_message, winner_event, None, 101, 'oyuncu_101'),
+    }
+
+
+def run_protocol_benchmark(iterations=10000):
+    """Her alt protokol için mesaj başına bayt ve kodlama süresi (mikrosaniye)"""
+    results = {}
+    for subprotocol, codec in CODECS.items():
+        rows = {}
+        for name, message in sample_messages().items():
+            size = len(codec.encode(message)) if codec.binary else len(codec.encode(message).encode())
+            started = time.perf_counter()
+            for _ in range(iterations):
+                codec.encode(message)
+            elapsed = time.perf_counter() - started
+            rows[name] = {'bytes': size, 'encode_us': round(elapsed / iterations * 1e6, 3)}
+        results[subprotocol] = rows
+    return results
+
+
+def run_fanout_benchmark(receivers=10, iterations=2000, mixed=False):
+    """
+    Bir yayının receivers soketlik odaya dağıtım maliyeti (mikrosaniye/yayın)
+    Soketler JSON'dur (mixed: alt protokollere sırayla dağıtılır); per_socket: soket başına
+    kodlama, shared: FrameCache ile protokol başına tek kodlama.
+    """
+    codecs = list(CODECS.values()) if mixed else [CODECS[JSON]]
+    sockets = [codecs[i % len(codecs)] for i in range(receivers)]
+    message = sample_messages()['CONTINUE']
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for codec in sockets:
+            frame(codec, message)
+    per_socket = time.perf_counter() - started
+
+    cache = FrameCache()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        event = broadcast_message(message)
+        for codec in sockets:
+            cache.frame(codec, event)
+    shared = time.perf_counter() - started
+
+    return {
+        'receivers': receivers,
+        'mixed': mixed,
+        'per_socket_us': round(per_socket / iterations * 1e6, 3),
+        'shared_us': round(shared / iterations * 1e6, 3),
+    }
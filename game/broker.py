@@ -0,0 +1,190 @@
+import asyncio
+import hmac
+import logging
+import struct
+import time
+import msgpack
+
+HEADER = struct.Struct('!I')
+
+logger = logging.getLogger(__name__)
+
+
+def pack_frame(frame):
+    payload = msgpack.packb(frame, use_bin_type=True)
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(HEADER.size)
+    (length,) = HEADER.unpack(header)
+    payload = await reader.readexactly(length)
+    return msgpack.unpackb(payload, raw=False)
+
+
+def parse_address(address):
+    """
+    'unix:///tmp/numberduel.sock' veya 'tcp://127.0.0.1:7070'
+    Dönüş: ('unix', path) veya ('tcp', (host, port))
+    """
+    if address.startswith('unix://'):
+        return 'unix', address[len('unix://'):]
+    if address.startswith('tcp://'):
+        host, _, port = address[len('tcp://'):].rpartition(':')
+        return 'tcp', (host or '127.0.0.1', int(port))
+    raise ValueError(f"Geçersiz broker adresi: {address}")
+
+
+async def open_connection(address):
+    kind, target = parse_address(address)
+    if kind == 'unix':
+        return await asyncio.open_unix_connection(target)
+    return await asyncio.open_connection(*target)
+
+
+def client_of(channel):
+    """'specific.<client_id>!xyz' → '<client_id>'"""
+    return channel[:channel.index('!')].rsplit('.', 1)[-1]
+
+
+class ChannelBroker:
+    """
+    Channel layer için hafif mesaj aracısı (broker)
+
+    - Her worker process'i tek bir bağlantı açar ve bir client_id ile kaydolur
+    - Process'e özel kanallar ('...<client_id>!xyz') sahibi olan bağlantıya yönlendirilir
+    - Grup üyelikleri burada tutulur; group_send her process'e TEK frame gönderir
+
+    Kimlik doğrulama: token verilirse 'hello' frame'i aynı token'ı taşımayan bağlantı kapatılır.
+    unix:// soketine erişim dosya izinleriyle sınırlanır; tcp:// token olmadan dinlemez
+    (ağdaki herkes her odaya yayın yapabilir ve mesajları okuyabilirdi). Trafik şifrelenmez:
+    tcp:// sadece güvenilir iç ağda kullanılmalıdır.
+    """
+
+    def __init__(self, address, group_expiry=86400, max_client_buffer=8 * 1024 * 1024, token=''):
+        self.address = address
+        self.group_expiry = group_expiry
+        self.max_client_buffer = max_client_buffer
+        self.token = token
+        # {client_id: writer}
+        self.clients = {}
+        # {group: {channel: joined_at}}
+        self.groups = {}
+        self.server = None
+        self.expirer = None
+
+    async def start(self):
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            self.server = await asyncio.start_unix_server(self.handle_client, path=target)
+        else:
+            if not self.token:
+                raise ValueError("tcp:// broker kimlik doğrulamasız dinlemez: CHANNEL_BROKER_TOKEN verin")
+            self.server = await asyncio.start_server(self.handle_client, *target)
+        self.expirer = asyncio.get_running_loop().create_task(self.expire_loop())
+        return self.server
+
+    async def close(self):
+        if self.expirer is not None:
+            self.expirer.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in list(self.clients.values()):
+            writer.close()
+
+    def authorized(self, frame):
+        if not self.token:
+            return True
+        return len(frame) > 2 and hmac.compare_digest(str(frame[2]), self.token)
+
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        client_id = None
+        try:
+            frame = await read_frame(reader)
+            if frame[0] != 'hello':
+                return
+            if not self.authorized(frame):
+                logger.warning("Broker: geçersiz token, bağlantı kapatıldı")
+                return
+            client_id = frame[1]
+            self.clients[client_id] = writer
+            logger.info("Broker: worker bağlandı client=%s", client_id)
+
+            while True:
+                frame = await read_frame(reader)
+                self.dispatch(frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if client_id is not None and self.clients.get(client_id) is writer:
+                del self.clients[client_id]
+                self.drop_client_channels(client_id)
+                logger.info("Broker: worker ayrıldı client=%s", client_id)
+            writer.close()
+
+    def dispatch(self, frame):
+        op = frame[0]
+        if op == 'send':
+            _, channel, message = frame
+            self.deliver(client_of(channel), [channel], message)
+        elif op == 'group_add':
+            _, group, channel = frame
+            self.groups.setdefault(group, {})[channel] = time.time()
+        elif op == 'group_discard':
+            _, group, channel = frame
+            members = self.groups.get(group)
+            if members is not None:
+                members.pop(channel, None)
+                if not members:
+                    del self.groups[group]
+        elif op == 'group_send':
+            _, group, message = frame
+            self.group_send(group, message)
+        elif op == 'flush':
+            self.groups = {}
+
+    def group_send(self, group, message):
+        members = self.groups.get(group)
+        if not members:
+            return
+        deadline = time.time() - self.group_expiry
+        by_client = {}
+        for channel, joined_at in list(members.items()):
+            if joined_at < deadline:
+                del members[channel]
+                continue
+            by_client.setdefault(client_of(channel), []).append(channel)
+        for client_id, channels in by_client.items():
+            self.deliver(client_id, channels, message)
+
+    def deliver(self, client_id, channels, message):
+        writer = self.clients.get(client_id)
+        if writer is None or writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > self.max_client_buffer:
+            logger.warning("Broker: worker yavaş, mesaj düşürüldü client=%s", client_id)
+            return
+        writer.write(pack_frame(['deliver', channels, message]))
+
+    def drop_client_channels(self, client_id):
+        for group, members in list(self.groups.items()):
+            for channel in [c for c in members if client_of(c) == client_id]:
+                del members[channel]
+            if not members:
+                del self.groups[group]
+
+    async def expire_loop(self):
+        while True:
+            await asyncio.sleep(60)
+            deadline = time.time() - self.group_expiry
+            for group, members in list(self.groups.items()):
+                for channel in [c for c, joined_at in members.items() if joined_at < deadline]:
+                    del members[channel]
+                if not members:
+                    del self.groups[group]
@@ -0,0 +1,90 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'config:{}:version'
+
+
+def config_setting(name, default):
+    return getattr(settings, 'CONFIG_CACHE', {}).get(name, default)
+
+
+class ConfigCache:
+    """
+    Nadiren değişen yapılandırma kayıtları için process içi önbellek
+
+    - Değer TTL boyunca process'te tutulur
+    - invalidate(): yerel kopyayı düşürür ve paylaşılan cache'deki sürümü artırır;
+      diğer worker'lar sürümü en geç VERSION_CHECK_INTERVAL saniyede bir kontrol eder
+      (CACHES paylaşımlı değilse - LocMem - diğer worker'lar TTL sonunda görür)
+    - Single-flight: soğuk başlangıçta aynı anda gelen istekler için tek yükleme yapılır
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.value = None
+        self.version = None
+        self.expires_at = 0
+        self.checked_at = 0
+
+    def fresh(self, now):
+        if self.version is None or now >= self.expires_at:
+            return False
+        if now - self.checked_at < config_setting('VERSION_CHECK_INTERVAL', 1.0):
+            return True
+        self.checked_at = now
+        return cache.get(VERSION_KEY.format(self.name), 0) == self.version
+
+    def get(self):
+        if self.fresh(time.monotonic()):
+            return self.value
+        with self.lock:
+            # Beklerken başka bir thread yüklemiş olabilir
+            now = time.monotonic()
+            if self.fresh(now):
+                return self.value
+            version = cache.get(VERSION_KEY.format(self.name), 0)
+            self.value = self.loader()
+            self.version = version
+            self.expires_at = now + config_setting('TTL', 300)
+            self.checked_at = now
+            return self.value
+
+    def invalidate(self):
+        """Yerel kopyayı hemen, diğer worker'ları transaction commit olunca geçersiz kıl"""
+        self.version = None
+        transaction.on_commit(self.bump_version)
+
+    def bump_version(self):
+        key = VERSION_KEY.format(self.name)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+        self.version = None
+
+
+registry = {}
+
+
+def register(name, loader):
+    registry[name] = ConfigCache(name, loader)
+    return registry[name]
+
+
+def invalidate(name):
+    registry[name].invalidate()
+
+
+def load_global_settings():
+    from .models import GlobalSettings
+    return GlobalSettings.objects.get_or_create(pk=1)[0]
+
+
+# Salt okunur kullanın: dönen nesne process içinde paylaşılır
+global_settings = register('global_settings', load_global_settings)
@@ -1,75 +1,219 @@
 import json
+import logging
 import random
+from decimal import Decimal, InvalidOperation
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.db import transaction as db_transaction
+from django.conf import settings
 from .models import Room, Transaction, GameSession
+from .serializers import RoomSerializer
+from .engine import engine
+from .utils import settle_game, join_timer_key
+from .scheduler import scheduler
+from .leaderboard import publish as publish_leaderboard
+from .metrics import track, open_sockets, register_gauge
+from .lobby import hub as lobby_hub, lobby_setting, publish_room
+from .protocol import BROADCAST_ID, negotiate, frame, frame_cache, broadcast_message
+from .spectators import hub as spectator_hub, publish_spectator, load_view
+from .replay import EVENT_SEQ, event_log, parse_since, replays, replay_snapshots
+from .matchmaking import Ticket, queue as match_queue, parse_bets, validate_request, create_match_room
 from django.contrib.auth import get_user_model
-from django.utils import timezone
-from datetime import timedelta
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+DISCONNECT_TIMEOUT = 30
+
+# Bu process'te açık soketi olan odalar: {room_id: soket sayısı}
+active_rooms = {}
+
+register_gauge('numberduel_active_rooms', 'Açık soketi olan oda sayısı', lambda: len(active_rooms))
+register_gauge('numberduel_pending_timers', 'Bekleyen zamanlayıcı sayısı', lambda: scheduler.pending)
+register_gauge('numberduel_matchmaking_queue', 'Eşleşme bekleyen oyuncu sayısı', lambda: len(match_queue))
+register_gauge('numberduel_spectators', 'Bu process\'teki izleyici sayısı', lambda: spectator_hub.total)
+
+
+def turn_setting(name, default):
+    return getattr(settings, 'TURN_TIMER', {}).get(name, default)
+
+
+def turn_timer_key(room_id):
+    return f'turn_{room_id}'
+
+
+def start_turn_clock(room_id, user_id, seq, skips=0):
+    """
+    Sıranın süresini başlat (odanın önceki sıra süresinin yerine geçer)
+    seq: sıradaki oyuncunun beklediği son tahmin; skips: tahminsiz üst üste dolan süre
+    Dönüş: kalan süre (saniye, yayına time_left olarak eklenir) - süre sınırı kapalıysa None
+    """
+    limit = turn_setting('LIMIT', 0)
+    if not limit:
+        return None
+    key = turn_timer_key(room_id)
+    armed = scheduler.local(key)
+    if armed is not None and (armed.user_id, armed.seq) == (user_id, seq):
+        # Aynı sıra tekrar duyuruluyor (ör. yeniden bağlanma): süre baştan başlamaz
+        return scheduler.remaining(key)
+    scheduler.schedule_local('turn', key, limit, int(room_id), user_id, seq=seq, skips=skips)
+    return limit
+
+
+async def broadcast(room_id, message):
+    """
+    Odadaki tüm soketlere yayın (bkz. protocol.FrameCache) - izleyicilere delta olarak
+    Yayın sıra numarası alır ve yeniden bağlanma için odanın olay günlüğüne yazılır (bkz. game/replay.py)
+    """
+    message = event_log.record(room_id, broadcast_message(message))
+    if str(room_id) not in active_rooms:
+        # Bu process odanın sonraki yayınlarını (başka worker'dan) görmeyecek: günlük tutulmaz
+        event_log.drop(room_id)
+    await get_channel_layer().group_send(f'game_{room_id}', message)
+    await publish_spectator(room_id, message)
+
 
 class GameConsumer(AsyncWebsocketConsumer):
-    disconnect_timers = {}
-    
+    """
+    Oyun soketi: ws/game/{room_id}/
+
+    Odanın oyuncuları oyunu oynar; diğer giriş yapmış kullanıcılar salt okunur izleyicidir:
+    bir SNAPSHOT (oyuncular, sıra, tahminler - hedef sayı olmadan), ardından DELTA batch'leri
+    (bkz. game/spectators.py). İzleyiciler oyuncu grubuna girmez, oda/bahis durumunu etkilemez.
+    """
+
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'game_{self.room_id}'
         self.user_id = self.scope['user'].id
+        # JSON (varsayılan) veya ikili alt protokol (bkz. game/protocol.py)
+        self.codec, subprotocol = negotiate(self.scope)
+        self.role = None
 
-        # Odaya bağlan
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        room = await self.get_room_access()
+        if room is None:
+            await self.close()
+            return
+        if self.user_id is None or self.user_id not in (room['creator_id'], room['player2_id']):
+            if not self.scope['user'].is_authenticated:
+                await self.close()
+                return
+            await self.watch(subprotocol)
+            return
+        self.role = 'player'
+        # Yeniden bağlanmada gönderilen yayınların kimlikleri: gruptan tekrar gelirlerse atlanır
+        self.replayed = None
 
-        print(f"🔌 WebSocket bağlandı: User {self.user_id}, Room {self.room_id}")
+        async with track('connect'):
+            # Odaya bağlan
+            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+            await self.accept(subprotocol=subprotocol)
+            open_sockets.inc()
+            active_rooms[self.room_id] = active_rooms.get(self.room_id, 0) + 1
 
-        timer_key = f"{self.room_id}_{self.user_id}"
-        if timer_key in self.disconnect_timers:
-            print(f"⏱️ Disconnect timer iptal edildi (reconnect): User {self.user_id}")
-            self.disconnect_timers[timer_key].cancel()
-            del self.disconnect_timers[timer_key]
+            logger.info("WebSocket bağlandı user=%s room=%s", self.user_id, self.room_id)
 
-        if await self.is_room_full():
-            game_exists = await self.game_session_exists()
-            if not game_exists:
-                success = await self.lock_bets()
-                if success:
-                    await self.start_game()
+            # Reconnect: bekleyen disconnect zamanlayıcısını iptal et (hangi worker'da kurulduysa)
+            if await scheduler.cancel(self.disconnect_timer_key):
+                logger.info("Disconnect timer iptal edildi (reconnect) user=%s room=%s", self.user_id, self.room_id)
+            if room['status'] == 'FULL':
+                # Bahsi kilitli oyuncu (katılan veya eşleşen) bağlandı: iade zamanlayıcısı gereksiz
+                await scheduler.cancel(join_timer_key(self.room_id, self.user_id))
+
+            if room['status'] == 'FULL':
+                game_exists = await self.game_session_exists()
+                if not game_exists:
+                    async with track('lock_bets'):
+                        success = await self.lock_bets()
+                    if success:
+                        async with track('start_game'):
+                            await self.start_game()
+                    else:
+                        await self.send_message({
+                            'error': 'Bahis kilitlenemedi! Oyun başlatılamıyor.'
+                        })
                 else:
-                    await self.send(text_data=json.dumps({
-                        'error': 'Bahis kilitlenemedi! Oyun başlatılamıyor.'
-                    }))
-            else:
-                await self.send_current_game_state()
+                    await self.resume()
+            elif room['status'] == 'FINISHED':
+                await self.resume()
+
+    @property
+    def disconnect_timer_key(self):
+        return f"disconnect_{self.room_id}_{self.user_id}"
+
+    async def watch(self, subprotocol):
+        """İzleyici olarak bağlan: SNAPSHOT, ardından hub'ın DELTA batch'leri"""
+        await self.accept(subprotocol=subprotocol)
+        self.role = 'spectator'
+        open_sockets.inc()
+        # Snapshot gönderilene kadar gelen delta'lar backlog'da bekler
+        self.backlog = []
+        if not await spectator_hub.join(int(self.room_id), self):
+            await self.send_message({'error': 'Bu odanın izleyici kapasitesi dolu!'})
+            await self.close(code=4003)
+            return
+        logger.info("İzleyici bağlandı user=%s room=%s", self.user_id, self.room_id)
+
+        await self.send(**spectator_hub.snapshot(int(self.room_id), self.codec))
+        backlog, self.backlog = self.backlog, None
+        for encoded in backlog:
+            await self.send(**encoded)
+
+    async def push(self, encoded):
+        if self.backlog is not None:
+            self.backlog.append(encoded)
+        else:
+            await self.send(**encoded)
 
     async def disconnect(self, close_code):
-        print(f"🔌 WebSocket koptu: User {self.user_id}, Room {self.room_id}, Code: {close_code}")
+        if self.role is None:
+            return
+        if self.role == 'spectator':
+            spectator_hub.leave(int(self.room_id), self)
+            open_sockets.dec()
+            logger.info("İzleyici ayrıldı user=%s room=%s", self.user_id, self.room_id)
+            return
+
+        logger.info("WebSocket koptu user=%s room=%s code=%s", self.user_id, self.room_id, close_code)
+        open_sockets.dec()
+        remaining = active_rooms.get(self.room_id, 1) - 1
+        if remaining > 0:
+            active_rooms[self.room_id] = remaining
+        else:
+            active_rooms.pop(self.room_id, None)
+            # Grupta yerel soket kalmadı: başka worker'ın yayınları artık görülmez
+            event_log.drop(self.room_id)
         
         try:
             game_state = await self.get_game_state()
             
             if not game_state:
-                print(f"⚠️ Oyun başlamamış, oda OPEN'a çevriliyor")
+                logger.info("Oyun başlamamış, oda OPEN'a çevriliyor room=%s", self.room_id)
                 await self.reset_room_and_refund()
             else:
                 if not game_state.get('winner_id'):
-                    print(f"⏱️ 30 saniye disconnect timer başlatıldı: User {self.user_id}")
-                    
-                    import asyncio
-                    timer_key = f"{self.room_id}_{self.user_id}"
-                    timer = asyncio.create_task(self.handle_disconnect_timeout())
-                    self.disconnect_timers[timer_key] = timer
+                    logger.info("Disconnect timer başlatıldı user=%s room=%s timeout=%s", self.user_id, self.room_id, DISCONNECT_TIMEOUT)
+                    await scheduler.schedule(
+                        'disconnect',
+                        self.disconnect_timer_key,
+                        DISCONNECT_TIMEOUT,
+                        room_id=int(self.room_id),
+                        user_id=self.user_id
+                    )
                     
-        except Exception as e:
-            print(f"❌ Disconnect handling hatası: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Disconnect handling hatası user=%s room=%s", self.user_id, self.room_id)
         
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        # Metin çerçeveleri her zaman JSON, ikili çerçeveler anlaşılan protokolde
+        data = json.loads(text_data) if text_data is not None else self.codec.decode(bytes_data)
         action = data.get('action')
+        if self.role != 'player':
+            await self.send_message({'error': 'İzleyiciler oyuna müdahale edemez.'})
+            return
 
         if action == 'guess':
             guess = int(data.get('number'))
@@ -77,7 +221,6 @@ class GameConsumer(AsyncWebsocketConsumer):
         
         elif action == 'leave_game':
             # Manuel ayrılma
-            print(f"👋 Manuel ayrılma isteği: User {self.user_id}")
             await self.handle_manual_leave()
 
     async def start_game(self):
@@ -85,22 +228,28 @@ class GameConsumer(AsyncWebsocketConsumer):
         Oyunu başlat - SADECE BİR KEZ çağrılmalı
         İki consumer instance olsa bile, sadece bir GameSession oluşturulmalı
         """
-        print(f"\n🎮 start_game() çağrıldı - Room ID: {self.room_id}")
+        logger.debug("start_game() çağrıldı room=%s", self.room_id)
         
         # ÖNCE: Zaten bir GameSession var mı kontrol et
         existing_game = await self.get_game_state()
         if existing_game:
-            print(f"⚠️ GameSession zaten var! Yeni oluşturulmayacak.")
-            print(f"   Target: {existing_game['target_number']}, Turn: {existing_game['current_turn_name']}")
+            logger.info("GameSession zaten var, yeni oluşturulmayacak room=%s", self.room_id)
+            # Eşzamanlı başlatma: süreyi hangi consumer önce yayınlarsa o başlatır (ilk tahminden önce seq=0)
+            key = turn_timer_key(self.room_id)
+            time_left = (
+                scheduler.remaining(key) if scheduler.local(key) is not None
+                else start_turn_clock(self.room_id, existing_game['current_turn_id'], 0)
+            )
             # Mevcut oyun durumunu client'lara gönder
-            await self.channel_layer.group_send(
-                self.room_group_name,
+            await broadcast(
+                self.room_id,
                 {
                     'type': 'game_message',
                     'message': f'🎮 Oyun devam ediyor!',
                     'turn': existing_game['current_turn_id'],
                     'turn_name': existing_game['current_turn_name'],
-                    'event': 'START'
+                    'event': 'START',
+                    'time_left': time_left
                 }
             )
             return
@@ -114,123 +263,102 @@ class GameConsumer(AsyncWebsocketConsumer):
         starting_player_id = random.choice(players)
         
         # GameSession oluştur (veritabanında state tut) - ATOMIC!
-        success = await self.create_game_session(target_number, starting_player_id)
+        starting_player_id = await self.create_game_session(target_number, starting_player_id)
         
-        if not success:
-            print(f"❌ GameSession oluşturulamadı!")
+        if starting_player_id is None:
+            logger.error("GameSession oluşturulamadı room=%s", self.room_id)
             return
         
-        print(f"✅ GameSession oluşturuldu:")
-        print(f"   Target Number: {target_number}")
-        print(f"   Starting Player ID: {starting_player_id}")
-        
         # Başlayan oyuncunun adını al
         starting_player_name = await self.get_username(starting_player_id)
-        print(f"   Starting Player Name: {starting_player_name}")
         
         # Oyuncuların güncel bakiyelerini al
         player_balances = await self.get_player_balances()
-        print(f"   Bakiye bilgileri hazırlandı")
 
-        await self.channel_layer.group_send(
-            self.room_group_name,
+        await broadcast(
+            self.room_id,
             {
                 'type': 'game_message',
                 'message': f'🎮 Oyun başladı! Gizli sayı 1-100 arasında seçildi.',
                 'turn': starting_player_id,
                 'turn_name': starting_player_name,
                 'event': 'START',
-                'balances': player_balances
+                'balances': player_balances,
+                'time_left': start_turn_clock(self.room_id, starting_player_id, 0)
             }
         )
         
-        print(f"📤 START mesajı gönderildi (bakiye bilgileri dahil)\n")
+        logger.info("Oyun başladı room=%s starting_player=%s", self.room_id, starting_player_id)
 
     async def handle_guess(self, guess):
         user_id = self.scope['user'].id
         username = self.scope['user'].username
-        
-        print(f"\n=== TAHMIN KONTROLÜ ===")
-        print(f"Tahmin yapan: {username} (ID: {user_id}, Tip: {type(user_id)})")
-        print(f"Tahmin: {guess}")
-        
-        # VERİTABANINDAN oyun durumunu al
-        game_state = await self.get_game_state()
-        
-        if not game_state:
-            print(f"❌ Oyun bulunamadı!")
-            await self.send(text_data=json.dumps({'error': 'Oyun bulunamadı!'}))
-            return
-        
-        print(f"Sıradaki: {game_state['current_turn_name']} (ID: {game_state['current_turn_id']}, Tip: {type(game_state['current_turn_id'])})")
-        print(f"Eşit mi? {user_id} == {game_state['current_turn_id']} → {user_id == game_state['current_turn_id']}")
-        
-        # Sıra kontrolü (veritabanından)
-        if user_id != game_state['current_turn_id']:
-            print(f"❌ Sıra kontrolü başarısız!")
-            print(f"======================\n")
-            
-            # Sadece hata yapan kullanıcıya gönder, diğerine gönderme
-            await self.send(text_data=json.dumps({
-                'error': f'Lütfen sıranı bekle. Şu an sıra: {game_state["current_turn_name"]}'
-            }))
+
+        logger.debug("Tahmin user=%s room=%s guess=%s", user_id, self.room_id, guess)
+
+        async with track('handle_guess'):
+            # Sıra kontrolü ve tahmin değerlendirmesi bellekte (GameEngine)
+            payload = await engine.apply_guess(self.room_id, user_id, username, guess)
+
+            if 'error' in payload:
+                # Sadece hata yapan kullanıcıya gönder, diğerine gönderme
+                await self.send_message({'error': payload['error']})
+                return
+
+            if payload['event'] == 'WINNER':
+                # Bekleyen tahminleri yaz, sonra bakiye transferini yap
+                # (veritabanı motoru tahminle birlikte ödemiştir: finish_game bir şey yapmaz)
+                scheduler.cancel_local(turn_timer_key(self.room_id))
+                await engine.close_room(self.room_id)
+                await self.finish_game(user_id)
+            else:
+                payload['time_left'] = start_turn_clock(self.room_id, payload['turn'], payload['seq'])
+
+            # Tüm oyunculara gönder
+            await broadcast(self.room_id, payload)
+
+    async def resume(self):
+        """
+        Yeniden bağlanma: ?since=<event_seq> ile sadece kaçırılan olaylar,
+        imleç yoksa veya boşluk olay günlüğünden büyükse tam durum (SNAPSHOT)
+        """
+        # Gruba katıldıktan sonra okunur: günlükteki yayınlar gruptan da gelebilir
+        recorded = event_log.events(self.room_id)
+        last_seq = event_log.last_seq(self.room_id)
+        self.replayed = {event[BROADCAST_ID] for event in recorded}
+        since = parse_since(self.scope)
+        events = event_log.replay(self.room_id, since) if since is not None else None
+        if events is not None:
+            replays.inc()
+            for event in events:
+                await self.send(**frame_cache.frame(self.codec, event))
             return
-        
-        print(f"✅ Sıra kontrolü başarılı!")
-        print(f"======================\n")
-
-        response_msg = ""
-        event = "CONTINUE"
-        target_number = game_state['target_number']
-
-        # Tahmin kontrolü
-        if guess < target_number:
-            response_msg = f"📈 {username}: {guess} → Daha YUKARI!"
-        elif guess > target_number:
-            response_msg = f"📉 {username}: {guess} → Daha AŞAĞI!"
-        else:
-            response_msg = f"🎉 {username} doğru sayıyı buldu: {guess}"
-            event = "WINNER"
-            await self.finish_game(user_id)
-
-        # Sırayı değiştir ve VERİTABANINA kaydet
-        players = await self.get_room_players()
-        next_player_id = players['player2_id'] if user_id == players['creator_id'] else players['creator_id']
-        next_player_name = await self.get_username(next_player_id)
-        
-        # History'ye ekle ve sırayı güncelle
-        await self.update_game_state(
-            guess=guess,
-            guesser_name=username,
-            response=response_msg,
-            next_turn_id=next_player_id if event != 'WINNER' else None,
-            winner_id=user_id if event == 'WINNER' else None
-        )
 
-        # Tüm oyunculara gönder
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'game_message',
-                'message': response_msg,
-                'last_guess': guess,
-                'guesser_name': username,
-                'guesser_id': user_id,
-                'turn': next_player_id if event != 'WINNER' else None,
-                'turn_name': next_player_name if event != 'WINNER' else None,
-                'event': event,
-                'winner_id': user_id if event == 'WINNER' else None,
-                'reason': 'normal' if event == 'WINNER' else None
-            }
-        )
+        replay_snapshots.inc()
+        # Günlükten sonra yüklenir: arada gelen olay iki kez gelebilir ama kaçırılmaz
+        unflushed, live = engine.unflushed(self.room_id)
+        view = await load_view(int(self.room_id), unflushed, live)
+        # Restart sonrası sıra süresi kurulu olmayabilir: görünümdeki sıradan başlatılır
+        time_left = start_turn_clock(self.room_id, view['turn'], view['seq']) if view['turn'] else None
+        await self.send_message({**view, EVENT_SEQ: last_seq, 'time_left': time_left})
 
     async def game_message(self, event):
-        await self.send(text_data=json.dumps(event))
+        event_log.observe(self.room_id, event)
+        if self.replayed:
+            # Gruptan önce tekrar gönderilenler gelir; ilk yeni yayından sonra kontrol gereksiz
+            if event[BROADCAST_ID] in self.replayed:
+                return
+            self.replayed = None
+        # Aynı yayın bu process'te her protokol için bir kez kodlanır
+        await self.send(**frame_cache.frame(self.codec, event))
+
+    async def send_message(self, message):
+        await self.send(**frame(self.codec, message))
 
     @database_sync_to_async
-    def is_room_full(self):
-        room = Room.objects.get(id=self.room_id)
-        return room.status == 'FULL'
+    def get_room_access(self):
+        """Oyuncu/izleyici ayrımı ve oda durumu için tek sorgu - oda yoksa None"""
+        return Room.objects.filter(id=self.room_id).values('status', 'creator_id', 'player2_id').first()
 
     @database_sync_to_async
     def get_room_players(self):
@@ -245,80 +373,22 @@ class GameConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def reset_room_and_refund(self):
-        """
-        Oyun başlamadan oyuncu ayrıldıysa:
-        - Odayı OPEN durumuna çevir
-        - player2'yi kaldır
-        - Bahisleri iade et
-        """
-        from django.db import transaction as db_transaction
-        from decimal import Decimal
-        
-        try:
-            with db_transaction.atomic():
-                room = Room.objects.select_for_update().get(id=self.room_id)
-                
-                # Bahis kilitli mi kontrol et
-                bet_locked = Transaction.objects.filter(
-                    description__contains=f"Oda #{room.id} bahis kilidi"
-                ).exists()
-                
-                if bet_locked and room.status == 'FULL':
-                    # Bahisleri iade et
-                    bet = Decimal(str(room.bet_amount))
-                    creator = User.objects.select_for_update().get(id=room.creator.id)
-                    
-                    if room.player2:
-                        player2 = User.objects.select_for_update().get(id=room.player2.id)
-                        
-                        creator.balance += bet
-                        player2.balance += bet
-                        creator.save()
-                        player2.save()
-                        
-                        # İade transaction'ları
-                        Transaction.objects.create(
-                            user=creator,
-                            amount=bet,
-                            description=f"Oda #{room.id} bahis iadesi (oyuncu ayrıldı)"
-                        )
-                        Transaction.objects.create(
-                            user=player2,
-                            amount=bet,
-                            description=f"Oda #{room.id} bahis iadesi (oyuncu ayrıldı)"
-                        )
-                        
-                        print(f"💰 Bahisler iade edildi: {bet} x 2 oyuncu")
-                
-                # Odayı OPEN'a çevir
-                room.player2 = None
-                room.status = 'OPEN'
-                room.save()
-                
-                print(f"✅ Oda OPEN durumuna çevrildi: Room #{room.id}")
-                
-        except Exception as e:
-            print(f"❌ reset_room_and_refund hatası: {str(e)}")
-            import traceback
-            traceback.print_exc()
-    
+        reopen_room(self.room_id)
+
     async def handle_manual_leave(self):
         """
         Kullanıcı 'Lobiye Dön' butonuna bastı
         """
-        print(f"👋 Manuel ayrılma: User {self.user_id}, Room {self.room_id}")
+        logger.info("Manuel ayrılma user=%s room=%s", self.user_id, self.room_id)
         
         game_state = await self.get_game_state()
         
         if not game_state:
             # Oyun başlamamış - reset ve iade
-            print(f"   Oyun başlamamış, bahisler iade edilecek")
             await self.reset_room_and_refund()
         else:
             # Oyun başlamış - diğer oyuncuyu kazandır
             if not game_state.get('winner_id'):
-                print(f"   Oyun başlamış, diğer oyuncu kazanacak")
-                
                 room_data = await self.get_room_players()
                 other_player_id = (
                     room_data['player2_id'] 
@@ -326,10 +396,13 @@ class GameConsumer(AsyncWebsocketConsumer):
                     else room_data['creator_id']
                 )
                 
+                engine.mark_finished(self.room_id, other_player_id)
+                scheduler.cancel_local(turn_timer_key(self.room_id))
+                await engine.close_room(self.room_id)
                 await self.finish_game(other_player_id, reason='manual_leave')
                 
-                await self.channel_layer.group_send(
-                    self.room_group_name,
+                await broadcast(
+                    self.room_id,
                     {
                         'type': 'game_message',
                         'message': '🏆 Rakibiniz oyundan ayrıldı. Kazandınız!',
@@ -339,7 +412,7 @@ class GameConsumer(AsyncWebsocketConsumer):
                     }
                 )
             else:
-                print(f"   Oyun zaten bitti")
+                logger.debug("Oyun zaten bitti room=%s", self.room_id)
     
     @database_sync_to_async
     def get_player_balances(self):
@@ -376,6 +449,7 @@ class GameConsumer(AsyncWebsocketConsumer):
         """
         Yeni GameSession oluştur - ATOMIC ve TEK SEFER
         get_or_create kullanarak aynı oda için sadece bir GameSession olmasını garanti et
+        Dönüş: kayıtlı oyunun başlayan oyuncusu (eşzamanlı bağlantıda diğerinin seçtiği olabilir), hata varsa None
         """
         from django.db import transaction as db_transaction
         
@@ -389,22 +463,17 @@ class GameConsumer(AsyncWebsocketConsumer):
                     room=room,
                     defaults={
                         'target_number': target_number,
-                        'current_turn': starting_player,
-                        'history': []
+                        'current_turn': starting_player
                     }
                 )
                 
-                if created:
-                    print(f"✅ YENİ GameSession oluşturuldu: ID={game_session.id}")
-                else:
-                    print(f"⚠️ GameSession ZATEN VAR: ID={game_session.id}, mevcut kullanılıyor")
+                if not created:
+                    logger.info("GameSession zaten var, mevcut kullanılıyor game=%s", game_session.id)
                 
-                return True
-        except Exception as e:
-            print(f"❌ GameSession oluşturma HATASI: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return False
+                return game_session.current_turn_id
+        except Exception:
+            logger.exception("GameSession oluşturma hatası room=%s", self.room_id)
+            return None
     
     @database_sync_to_async
     def get_game_state(self):
@@ -412,108 +481,15 @@ class GameConsumer(AsyncWebsocketConsumer):
         try:
             game = GameSession.objects.select_related('current_turn').get(room_id=self.room_id)
             
-            print(f"📊 GameSession State:")
-            print(f"   Room ID: {self.room_id}")
-            print(f"   Target: {game.target_number}")
-            print(f"   Current Turn: {game.current_turn.username} (ID: {game.current_turn.id})")
-            print(f"   History Count: {len(game.history)}")
-            
             return {
                 'target_number': game.target_number,
                 'current_turn_id': game.current_turn.id,
                 'current_turn_name': game.current_turn.username,
-                'history': game.history,
                 'winner_id': game.winner_id if game.winner else None
             }
         except GameSession.DoesNotExist:
-            print(f"❌ GameSession bulunamadı! Room ID: {self.room_id}")
             return None
     
-    @database_sync_to_async
-    def update_game_state(self, guess, guesser_name, response, next_turn_id, winner_id=None):
-        """Oyun durumunu güncelle"""
-        from django.db import transaction as db_transaction
-        
-        with db_transaction.atomic():
-            game = GameSession.objects.select_for_update().get(room_id=self.room_id)
-            
-            # History'ye ekle
-            history_entry = {
-                'guess': guess,
-                'guesser': guesser_name,
-                'response': response,
-                'timestamp': timezone.now().isoformat()
-            }
-            game.history.append(history_entry)
-            
-            # Sırayı güncelle
-            if next_turn_id:
-                game.current_turn_id = next_turn_id
-            
-            # Kazanan varsa kaydet
-            if winner_id:
-                game.winner_id = winner_id
-                game.ended_at = timezone.now()
-            
-            game.save()
-    
-    @database_sync_to_async
-    def send_current_game_state(self):
-        """Mevcut oyun durumunu yeni bağlanan kullanıcıya gönder"""
-        try:
-            game = GameSession.objects.select_related('current_turn').get(room_id=self.room_id)
-            return {
-                'current_turn_id': game.current_turn.id,
-                'current_turn_name': game.current_turn.username,
-                'history_count': len(game.history)
-            }
-        except GameSession.DoesNotExist:
-            return None
-    
-    async def handle_disconnect_timeout(self):
-        """
-        30 saniye bekle, eğer reconnect olmazsa diğer oyuncuya kazandır
-        """
-        import asyncio
-        
-        try:
-            # 30 saniye bekle
-            await asyncio.sleep(30)
-            
-            print(f"⏰ 30 saniye doldu! User {self.user_id} geri dönmedi.")
-            print(f"   Diğer oyuncu kazanacak...")
-            
-            # Diğer oyuncuyu bul
-            room_data = await self.get_room_players()
-            other_player_id = (
-                room_data['player2_id'] 
-                if self.user_id == room_data['creator_id'] 
-                else room_data['creator_id']
-            )
-            
-            # Diğer oyuncuyu kazanan yap
-            await self.finish_game(other_player_id, reason='disconnect')
-            
-            # Tüm oyunculara bildir
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'game_message',
-                    'message': f'🚫 Rakip 30 saniye bağlantısız kaldı. Oyunu kazandınız!',
-                    'event': 'WINNER',
-                    'winner_id': other_player_id,
-                    'reason': 'disconnect'
-                }
-            )
-            
-        except asyncio.CancelledError:
-            # Timer iptal edildi (reconnect oldu)
-            print(f"✅ Timer iptal edildi, user {self.user_id} geri döndü")
-        except Exception as e:
-            print(f"❌ Disconnect timeout hatası: {str(e)}")
-            import traceback
-            traceback.print_exc()
-    
     @database_sync_to_async
     def lock_bets(self):
         """
@@ -526,138 +502,363 @@ class GameConsumer(AsyncWebsocketConsumer):
             with db_transaction.atomic():
                 room = Room.objects.select_for_update().get(id=self.room_id)
                 
-                # Zaten kilit var mı kontrol et
-                if Transaction.objects.filter(
-                    description__contains=f"Oda #{room.id} bahis kilidi"
-                ).exists():
-                    print(f"⚠️ Bahisler zaten kilitli: Room {self.room_id}")
+                # Kilitli olmayan bahisler (katılan oyuncununki join'de kilitlendi)
+                locked = Transaction.locked_stakes(room.id)
+                pending_ids = [
+                    user_id for user_id in (room.creator_id, room.player2_id)
+                    if user_id not in locked
+                ]
+                if not pending_ids:
+                    logger.info("Bahisler zaten kilitli room=%s", self.room_id)
                     return True
                 
-                creator = User.objects.select_for_update().get(id=room.creator.id)
-                player2 = User.objects.select_for_update().get(id=room.player2.id)
+                players = list(User.objects.select_for_update().filter(id__in=pending_ids).order_by('id'))
                 bet = Decimal(str(room.bet_amount))
                 
                 # Bakiye kontrolleri
-                if creator.balance < bet:
-                    print(f"❌ {creator.username} bakiyesi yetersiz!")
-                    return False
-                
-                if player2.balance < bet:
-                    print(f"❌ {player2.username} bakiyesi yetersiz!")
-                    return False
+                for player in players:
+                    if player.balance < bet:
+                        logger.warning("Bakiye yetersiz user=%s room=%s", player.id, room.id)
+                        return False
                 
                 # Bahisleri çek
-                creator.balance -= bet
-                player2.balance -= bet
-                creator.save()
-                player2.save()
-                
-                # Transaction kayıtları
-                Transaction.objects.create(
-                    user=creator,
-                    amount=-bet,
-                    description=f"Oda #{room.id} bahis kilidi"
-                )
-                
-                Transaction.objects.create(
-                    user=player2,
-                    amount=-bet,
-                    description=f"Oda #{room.id} bahis kilidi"
-                )
+                for player in players:
+                    player.balance -= bet
+                    player.save()
+                    
+                    # Transaction kaydı
+                    Transaction.objects.create(
+                        user=player,
+                        room=room,
+                        kind='LOCK',
+                        amount=-bet,
+                        description=f"Oda #{room.id} bahis kilidi"
+                    )
+                publish_leaderboard(*players)
                 
-                print(f"✅ Bahisler kilitlendi: {bet} puan x 2 oyuncu")
-                print(f"   {creator.username}: {creator.balance + bet} → {creator.balance}")
-                print(f"   {player2.username}: {player2.balance + bet} → {player2.balance}")
+                logger.info("Bahisler kilitlendi room=%s bet=%s users=%s", room.id, bet, len(players))
                 
                 return True
                 
-        except Exception as e:
-            print(f"❌ Bahis kilitleme hatası: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Bahis kilitleme hatası room=%s", self.room_id)
             return False
 
-    @database_sync_to_async
-    def finish_game(self, winner_id, reason='normal'):
+    async def finish_game(self, winner_id, reason='normal'):
         """
         Oyun bitişinde bakiye transferini gerçekleştir
         reason: 'normal' (doğru tahmin) veya 'disconnect' (rakip ayrıldı)
         """
-        from django.db import transaction as db_transaction
-        from decimal import Decimal
-        
-        try:
-            with db_transaction.atomic():
-                # Odayı kilitle (race condition önlemi)
-                room = Room.objects.select_for_update().get(id=self.room_id)
-                
-                # Zaten bitmişse tekrar işlem yapma
-                if room.status == 'FINISHED':
-                    print(f"⚠️ Oyun zaten bitti: Room {self.room_id}")
-                    return
-                
-                # Kazanan ve kaybedeni belirle
-                winner = User.objects.select_for_update().get(id=winner_id)
-                loser_id = room.player2.id if winner_id == room.creator.id else room.creator.id
-                loser = User.objects.select_for_update().get(id=loser_id)
-                
+        async with track('finish_game'):
+            return await database_sync_to_async(settle_game)(self.room_id, winner_id, reason)
+
+
+def reopen_room(room_id, user_id=None):
+    """
+    Oyun başlamadan oyuncu ayrıldıysa / katılan veya eşleşen oyuncu bağlanmadıysa:
+    - Kilitli bahisleri iade et
+    - player2'yi kaldır, odayı OPEN durumuna çevir
+    user_id verilirse sadece oda hâlâ o oyuncuyla (kurucu veya player2) ve oyunsuz bekliyorsa
+    Dönüş: oda yeniden açıldıysa True
+    """
+    try:
+        with db_transaction.atomic():
+            room = Room.objects.select_for_update().get(id=room_id)
+            if user_id is not None and (
+                room.status != 'FULL' or user_id not in (room.creator_id, room.player2_id)
+                or GameSession.objects.filter(room_id=room_id).exists()
+            ):
+                return False
+
+            # Kimin bahsi kilitli? (katılan ve eşleşen oyuncularınki oda kurulurken kilitlenir)
+            locked = Transaction.locked_stakes(room.id)
+
+            if locked and room.status == 'FULL':
+                # Bahisleri iade et
                 bet = Decimal(str(room.bet_amount))
-                
-                # Bahisler zaten kilitlendiyse, kazanana 2x ver
-                # (Çünkü her iki oyuncudan da çekilmişti)
-                winner.balance += (bet * 2)
-                
-                # İstatistikleri güncelle
-                winner.total_wins += 1
-                winner.total_games += 1
-                loser.total_games += 1
-                
-                winner.save()
-                loser.save()
-                
-                print(f"📊 İstatistikler güncellendi:")
-                print(f"   {winner.username}: {winner.total_wins} win / {winner.total_games} game (Win rate: {winner.win_rate}%)")
-                print(f"   {loser.username}: {loser.total_wins} win / {loser.total_games} game (Win rate: {loser.win_rate}%)")
-                
-                # Transaction kayıtları
-                if reason == 'disconnect':
-                    Transaction.objects.create(
-                        user=winner,
-                        amount=(bet * 2),
-                        description=f"Oda #{room.id} kazancı - Rakip 30sn bağlantısız"
-                    )
-                    print(f"🏆 Disconnect kazancı: {winner.username} +{bet * 2}")
-                elif reason == 'manual_leave':
-                    Transaction.objects.create(
-                        user=winner,
-                        amount=(bet * 2),
-                        description=f"Oda #{room.id} kazancı - Rakip oyunu terketti"
-                    )
-                    print(f"🏆 Manuel ayrılma kazancı: {winner.username} +{bet * 2}")
-                else:
+                refunded = list(User.objects.select_for_update().filter(id__in=locked).order_by('id'))
+
+                for user in refunded:
+                    user.balance += bet
+                    user.save()
+
+                    # İade transaction'ı
                     Transaction.objects.create(
-                        user=winner,
-                        amount=(bet * 2),
-                        description=f"Oda #{room.id} kazancı - Rakip: {loser.username}"
+                        user=user,
+                        room=room,
+                        kind='REFUND',
+                        amount=bet,
+                        description=f"Oda #{room.id} bahis iadesi (oyuncu ayrıldı)"
                     )
-                    print(f"🏆 Normal kazanç: {winner.username} +{bet * 2}")
-                
-                # Oda durumunu güncelle
-                room.status = 'FINISHED'
-                room.save()
-                
-                # GameSession'ı güncelle
-                try:
-                    game = GameSession.objects.get(room_id=self.room_id)
-                    game.winner_id = winner_id
-                    game.ended_at = timezone.now()
-                    game.save()
-                except GameSession.DoesNotExist:
-                    pass
-                
-                print(f"✅ Oyun bitti: Room {self.room_id}, Kazanan: {winner.username}")
-                
-        except Exception as e:
-            print(f"❌ finish_game hatası: {str(e)}")
-            import traceback
-            traceback.print_exc()
\ No newline at end of file
+                publish_leaderboard(*refunded)
+
+                logger.info("Bahisler iade edildi room=%s bet=%s users=%s", room.id, bet, len(refunded))
+
+            # Odayı OPEN'a çevir
+            room.player2 = None
+            room.status = 'OPEN'
+            room.save()
+            publish_room(room, 'reopened')
+
+            logger.info("Oda OPEN durumuna çevrildi room=%s", room.id)
+            return True
+
+    except Exception:
+        logger.exception("reopen_room hatası room=%s", room_id)
+        return False
+
+
+@database_sync_to_async
+def get_other_player(room_id, user_id):
+    room = Room.objects.only('creator_id', 'player2_id').get(id=room_id)
+    return room.player2_id if user_id == room.creator_id else room.creator_id
+
+
+async def forfeit_disconnected_player(timer, message='🚫 Rakip 30 saniye bağlantısız kaldı. Oyunu kazandınız!'):
+    """
+    30 saniye doldu, oyuncu geri dönmedi: diğer oyuncuyu kazandır
+    Zamanlayıcıyı hangi worker tetiklerse tetiklesin settle_game idempotenttir.
+    """
+    logger.info("Disconnect süresi doldu user=%s room=%s", timer.user_id, timer.room_id)
+    other_player_id = await get_other_player(timer.room_id, timer.user_id)
+
+    engine.mark_finished(timer.room_id, other_player_id)
+    scheduler.cancel_local(turn_timer_key(timer.room_id))
+    await engine.close_room(timer.room_id)
+    async with track('finish_game'):
+        settled = await database_sync_to_async(settle_game)(timer.room_id, other_player_id, 'disconnect')
+    if not settled:
+        return
+
+    await broadcast(
+        timer.room_id,
+        {
+            'type': 'game_message',
+            'message': message,
+            'event': 'WINNER',
+            'winner_id': other_player_id,
+            'reason': 'disconnect'
+        }
+    )
+
+
+@database_sync_to_async
+def game_started(room_id):
+    return GameSession.objects.filter(room_id=room_id).exists()
+
+
+async def expire_join(timer):
+    """
+    Bahsi kilitli oyuncu (katılan veya eşleşen) JOIN_TIMEOUT içinde oyun soketini açmadı
+    (açınca zamanlayıcı iptal edilir). Oyun başlamadıysa kilitli bahisler iade edilir ve oda
+    yeniden açılır; rakip bağlanıp oyunu başlattıysa bağlantısı kopan oyuncu gibi hükmen kaybeder.
+    """
+    if not await game_started(timer.room_id):
+        if await database_sync_to_async(reopen_room)(timer.room_id, timer.user_id):
+            logger.info("Katılan oyuncu bağlanmadı, oda yeniden açıldı user=%s room=%s", timer.user_id, timer.room_id)
+        return
+    await forfeit_disconnected_player(timer, message='🚫 Rakip oyuna bağlanmadı. Oyunu kazandınız!')
+
+
+async def expire_turn(timer):
+    """
+    Sıradaki oyuncu TURN_TIMER['LIMIT'] içinde tahmin yapmadı
+    'forfeit': rakip kazanır; 'skip': sıra rakibe geçer, MAX_SKIPS'te süresi dolan kaybeder.
+    Süre tahminde iptal edilmez: arada tahmin yapıldıysa veya oyun bittiyse motor None döner.
+    """
+    forfeit = turn_setting('POLICY', 'forfeit') != 'skip' or timer.skips + 1 >= turn_setting('MAX_SKIPS', 3)
+    result = await engine.timeout_turn(timer.room_id, timer.user_id, timer.seq, forfeit)
+    if result is None:
+        return
+    other_player_id, players, settled = result
+    logger.info("Sıra süresi doldu user=%s room=%s forfeit=%s", timer.user_id, timer.room_id, forfeit)
+
+    if not forfeit:
+        await broadcast(
+            timer.room_id,
+            {
+                'type': 'game_message',
+                'message': f'⏰ {players.get(timer.user_id)} süresinde tahmin yapmadı, sıra rakibe geçti.',
+                'user_id': timer.user_id,
+                'turn': other_player_id,
+                'turn_name': players.get(other_player_id),
+                'event': 'TIMEOUT',
+                'time_left': start_turn_clock(timer.room_id, other_player_id, timer.seq, timer.skips + 1)
+            }
+        )
+        return
+
+    await engine.close_room(timer.room_id)
+    if not settled:
+        # Bellek motoru: bakiye transferi burada (veritabanı motoru süre aşımıyla birlikte ödemiştir)
+        async with track('finish_game'):
+            settled = await database_sync_to_async(settle_game)(timer.room_id, other_player_id, 'timeout')
+        if not settled:
+            return
+
+    await broadcast(
+        timer.room_id,
+        {
+            'type': 'game_message',
+            'message': f'⏰ {players.get(timer.user_id)} süresinde tahmin yapmadı. {players.get(other_player_id)} kazandı!',
+            'event': 'WINNER',
+            'winner_id': other_player_id,
+            'reason': 'timeout'
+        }
+    )
+
+
+scheduler.register('disconnect', forfeit_disconnected_player)
+scheduler.register('join', expire_join)
+scheduler.register('turn', expire_turn)
+
+
+class MatchmakingConsumer(AsyncWebsocketConsumer):
+    """
+    Sunucu tarafı eşleştirme: ws/matchmaking/
+
+    İstemci: {'action': 'queue', 'bet': 50} veya {'action': 'queue', 'min_bet': 20, 'max_bet': 100}
+             {'action': 'cancel'}
+    Sunucu:  QUEUED, MATCHED (room_id ile - ardından ws/game/{room_id}/ açılır), CANCELLED, error
+
+    Kuyruk process içidir: birden fazla worker varsa ws/matchmaking/ tek worker'a yönlendirilmeli.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.user.is_authenticated:
+            self.leave_queue()
+
+    def leave_queue(self):
+        ticket = match_queue.tickets.get(self.user.id)
+        # Aynı kullanıcı başka sekmeden kuyruğa girdiyse ona dokunma
+        if ticket is not None and ticket.channel_name == self.channel_name:
+            match_queue.remove(self.user.id)
+            return True
+        return False
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None:
+            # Eşleştirme sadece JSON metin çerçevesi konuşur (alt protokol anlaşılmaz)
+            await self.send(text_data=json.dumps({'error': 'Sadece JSON metin mesajı kabul edilir.'}))
+            return
+        data = json.loads(text_data)
+        action = data.get('action')
+
+        if action == 'queue':
+            await self.join_queue(data)
+
+        elif action == 'cancel':
+            self.leave_queue()
+            await self.send(text_data=json.dumps({'event': 'CANCELLED'}))
+
+    async def join_queue(self, data):
+        try:
+            min_bet, max_bet = parse_bets(data)
+        except (KeyError, TypeError, InvalidOperation):
+            await self.send(text_data=json.dumps({'error': 'bet veya min_bet/max_bet gerekli'}))
+            return
+
+        error = await database_sync_to_async(validate_request)(self.user.id, min_bet, max_bet)
+        if error:
+            await self.send(text_data=json.dumps({'error': error}))
+            return
+
+        ticket = Ticket(self.user.id, self.user.username, self.channel_name, min_bet, max_bet)
+        async with track('matchmaking'):
+            await match_ticket(ticket)
+
+    async def matchmaking_message(self, event):
+        await self.send(text_data=json.dumps(event))
+
+
+async def notify_ticket(ticket, **message):
+    await get_channel_layer().send(ticket.channel_name, {'type': 'matchmaking_message', **message})
+
+
+async def match_ticket(ticket):
+    """
+    Uyumlu bekleyen varsa odayı kur ve iki tarafa MATCHED gönder, yoksa kuyruğa ekle
+    Bakiyesi artık yetmeyen bekleyen kuyruktan düşer, sıradaki denenir.
+    """
+    while True:
+        partner, bet = match_queue.pop_partner(ticket)
+        if partner is None:
+            match_queue.add(ticket)
+            await notify_ticket(ticket, event='QUEUED', min_bet=str(ticket.min_bet), max_bet=str(ticket.max_bet))
+            return
+
+        try:
+            room_id, short_user_id = await database_sync_to_async(create_match_room)(partner, ticket, bet)
+        except Exception:
+            # Bekleyen kuyruktan çıkarılmıştı: sırasını geri ver
+            logger.exception("Eşleşme odası oluşturulamadı users=%s,%s", partner.user_id, ticket.user_id)
+            match_queue.add(partner, front=True)
+            await notify_ticket(ticket, error='Eşleşme kurulamadı, tekrar dene.')
+            return
+        if room_id is not None:
+            logger.info("Eşleşme room=%s bet=%s users=%s,%s", room_id, bet, partner.user_id, ticket.user_id)
+            for own, opponent in ((partner, ticket), (ticket, partner)):
+                await notify_ticket(
+                    own,
+                    event='MATCHED',
+                    room_id=room_id,
+                    bet_amount=str(bet),
+                    opponent_id=opponent.user_id,
+                    opponent_name=opponent.username
+                )
+            return
+
+        if short_user_id == ticket.user_id:
+            # Gelen oyuncunun bakiyesi yetmedi: bekleyen sırasını korusun
+            match_queue.add(partner, front=True)
+            await notify_ticket(ticket, error='Bakiye yetersiz!')
+            return
+        await notify_ticket(partner, error='Bakiye yetersiz!', event='CANCELLED')
+
+
+
+class LobbyConsumer(AsyncWebsocketConsumer):
+    """
+    Lobi akışı: ws/lobby/
+
+    Bağlanınca bir SNAPSHOT (OPEN/FULL odalar), ardından tick başına birleştirilmiş
+    DELTA mesajları: {'op': 'upsert', 'room': {...}} veya {'op': 'remove', 'id': ...}
+    """
+
+    async def connect(self):
+        if not self.scope['user'].is_authenticated:
+            await self.close()
+            return
+        await self.accept()
+
+        # Abonelik snapshot'tan önce: aradaki değişiklikler backlog'da bekler
+        self.backlog = []
+        await lobby_hub.join(self)
+        rooms = await self.get_snapshot()
+        await self.send(text_data=json.dumps({'event': 'SNAPSHOT', 'rooms': rooms}))
+        backlog, self.backlog = self.backlog, None
+        for text in backlog:
+            await self.send(text_data=text)
+
+    async def disconnect(self, close_code):
+        lobby_hub.leave(self)
+
+    async def push(self, text):
+        if self.backlog is not None:
+            self.backlog.append(text)
+        else:
+            await self.send(text_data=text)
+
+    @database_sync_to_async
+    def get_snapshot(self):
+        rooms = Room.objects.filter(
+            status__in=['OPEN', 'FULL']
+        ).select_related('creator').order_by('-created_at', '-id')[:lobby_setting('SNAPSHOT_LIMIT', 500)]
+        return [dict(row) for row in RoomSerializer(rooms, many=True).data]
\ No newline at end of file
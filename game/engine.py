@@ -0,0 +1,424 @@
+import asyncio
+import logging
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import GameSession, GameGuess
+from .utils import settle
+
+logger = logging.getLogger(__name__)
+
+
+def engine_setting(name, default):
+    return getattr(settings, 'GAME_ENGINE', {}).get(name, default)
+
+
+def evaluate_guess(username, guess, target_number):
+    """
+    Tahmini hedef sayı ile karşılaştır
+    Dönüş: (mesaj, event, ipucu) - ipucu: 'UP', 'DOWN' veya None
+    """
+    if guess < target_number:
+        return f"📈 {username}: {guess} → Daha YUKARI!", "CONTINUE", "UP"
+    if guess > target_number:
+        return f"📉 {username}: {guess} → Daha AŞAĞI!", "CONTINUE", "DOWN"
+    return f"🎉 {username} doğru sayıyı buldu: {guess}", "WINNER", None
+
+
+def guess_payload(seq, user_id, username, guess, response_msg, event, hint, next_player_id, next_player_name):
+    """Tahmin sonrası odaya yayınlanacak mesaj - seq: tahminin sıra numarası (GameGuess.seq)"""
+    return {
+        'type': 'game_message',
+        'message': response_msg,
+        'seq': seq,
+        'last_guess': guess,
+        'guesser_name': username,
+        'guesser_id': user_id,
+        'turn': next_player_id if event != 'WINNER' else None,
+        'turn_name': next_player_name if event != 'WINNER' else None,
+        'event': event,
+        'hint': hint,
+        'winner_id': user_id if event == 'WINNER' else None,
+        'reason': 'normal' if event == 'WINNER' else None
+    }
+
+
+class RoomState:
+    """
+    Bir odanın canlı oyun durumu (process içinde tutulur)
+    """
+    __slots__ = (
+        'room_id', 'session_id', 'target_number', 'current_turn_id', 'players',
+        'seq', 'winner_id', 'pending', 'inflight', 'lock', 'saved_turn_id',
+    )
+
+    def __init__(self, room_id, session_id, target_number, current_turn_id, players, seq=0, winner_id=None):
+        self.room_id = room_id
+        self.session_id = session_id
+        self.target_number = target_number
+        self.current_turn_id = current_turn_id
+        # Veritabanındaki sıra: farklıysa tahmin olmadan da yazılır (ör. süre dolunca sıra geçti)
+        self.saved_turn_id = current_turn_id
+        # {user_id: username} - sıra: creator, player2
+        self.players = players
+        # Son tahminin sıra numarası (GameGuess.seq)
+        self.seq = seq
+        self.winner_id = winner_id
+        # Henüz veritabanına yazılmamış tahminler
+        self.pending = []
+        # Yazılmakta olan tahminler (flush sürerken)
+        self.inflight = []
+        self.lock = asyncio.Lock()
+
+    def other_player(self, user_id):
+        for player_id in self.players:
+            if player_id != user_id:
+                return player_id
+        return None
+
+
+class GameEngine:
+    """
+    Process içi oyun motoru
+
+    - Oda durumu (hedef, sıra, oyuncular, geçmiş) ilk erişimde TEK sorgu ile yüklenir
+    - Tahminler bellekte doğrulanır ve yayınlanır
+    - Geçmiş ve sıra bilgisi arka planda toplu olarak veritabanına yazılır (write-behind)
+
+    NOT: Sadece tek worker'lı kurulum içindir (CHANNEL_BROKER_URL ile build_engine reddeder):
+    zamanlayıcılar başka worker'da tetiklenip oyunu bitirebilir.
+    """
+
+    def __init__(self):
+        self.rooms = {}
+        self.dirty = set()
+        self.flusher = None
+        # Kapatılırken yazılamayan odalar: flush yazınca bellekten çıkarır
+        self.closing = set()
+
+    async def get_state(self, room_id):
+        room_id = int(room_id)
+        state = self.rooms.get(room_id)
+        if state is None:
+            state = await self.load_state(room_id)
+            if state is None:
+                return None
+            # Yükleme sırasında başka bir coroutine eklemiş olabilir
+            state = self.rooms.setdefault(room_id, state)
+        return state
+
+    async def apply_guess(self, room_id, user_id, username, guess):
+        """
+        Tahmini bellekte uygula
+        Dönüş: {'error': ...} veya yayınlanacak payload
+        """
+        state = await self.get_state(room_id)
+        if state is None:
+            return {'error': 'Oyun bulunamadı!'}
+
+        async with state.lock:
+            if state.winner_id:
+                return {'error': 'Oyun zaten bitti!'}
+
+            if user_id != state.current_turn_id:
+                return {
+                    'error': f'Lütfen sıranı bekle. Şu an sıra: {state.players.get(state.current_turn_id)}'
+                }
+
+            response_msg, event, hint = evaluate_guess(username, guess, state.target_number)
+            state.seq += 1
+            state.pending.append(GameGuess(
+                session_id=state.session_id,
+                seq=state.seq,
+                guess=guess,
+                guesser_id=user_id,
+                guesser_name=username,
+                response=response_msg,
+                created_at=timezone.now()
+            ))
+
+            next_player_id = state.other_player(user_id)
+            if event == 'WINNER':
+                state.winner_id = user_id
+            else:
+                state.current_turn_id = next_player_id
+            self.mark_dirty(state)
+
+        return guess_payload(
+            state.seq, user_id, username, guess, response_msg, event, hint, next_player_id,
+            state.players.get(next_player_id)
+        )
+
+    async def timeout_turn(self, room_id, user_id, seq, forfeit):
+        """
+        Sıra süresi doldu: user_id hâlâ sırada ve son tahmin seq ise
+        forfeit=True rakip kazanır, False sıra rakibe geçer
+        Dönüş: (rakip id, {user_id: username}, ödendi mi) veya None (arada hamle yapıldı / oyun bitti)
+        Bellek motoru ödemez (False): bakiye transferi çağıranın settle_game çağrısıyla yapılır
+        """
+        state = await self.get_state(room_id)
+        if state is None:
+            return None
+
+        async with state.lock:
+            if state.winner_id or state.current_turn_id != user_id or state.seq != seq:
+                return None
+            other_player_id = state.other_player(user_id)
+            if forfeit:
+                state.winner_id = other_player_id
+            else:
+                state.current_turn_id = other_player_id
+                self.mark_dirty(state)
+        return other_player_id, state.players, False
+
+    def unflushed(self, room_id):
+        """
+        Veritabanında henüz görünmeyebilecek tahminler ve bellekteki oda durumu
+        Dönüş: ([GameGuess, ...], RoomState veya None)
+        """
+        state = self.rooms.get(int(room_id))
+        if state is None:
+            return [], None
+        return state.inflight + state.pending, state
+
+    def mark_finished(self, room_id, winner_id):
+        state = self.rooms.get(int(room_id))
+        if state is not None and not state.winner_id:
+            state.winner_id = winner_id
+
+    async def close_room(self, room_id):
+        """
+        Oyun bitti: bekleyen yazmaları boşalt ve odayı bellekten çıkar
+        Yazma başarısız olursa hata yükseltilmez: oda kazananıyla bellekte ve kirli kalır,
+        flush_loop tekrar dener ve yazınca çıkarır. Çağıran ödemeye ve yayına devam eder.
+        """
+        room_id = int(room_id)
+        state = self.rooms.get(room_id)
+        if state is None:
+            return
+        try:
+            await self.flush_states([state])
+        except Exception:
+            logger.exception("Oda kapatılırken tahminler yazılamadı, arka planda tekrar denenecek room=%s", room_id)
+            self.closing.add(room_id)
+            self.mark_dirty(state)
+            return
+        self.rooms.pop(room_id, None)
+        self.dirty.discard(room_id)
+        self.closing.discard(room_id)
+
+    def mark_dirty(self, state):
+        self.dirty.add(state.room_id)
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.get_running_loop().create_task(self.flush_loop())
+
+    async def flush_loop(self):
+        interval = engine_setting('FLUSH_INTERVAL', 0.5)
+        while self.dirty:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Engine flush hatası")
+
+    async def flush(self):
+        batch_size = engine_setting('FLUSH_BATCH_SIZE', 500)
+        while self.dirty:
+            room_ids = [self.dirty.pop() for _ in range(min(batch_size, len(self.dirty)))]
+            states = [self.rooms[room_id] for room_id in room_ids if room_id in self.rooms]
+            await self.flush_states(states)
+            for state in states:
+                if state.room_id in self.closing and not state.pending:
+                    self.rooms.pop(state.room_id, None)
+                    self.closing.discard(state.room_id)
+
+    async def flush_states(self, states):
+        batch = []
+        for state in states:
+            if state.pending or state.current_turn_id != state.saved_turn_id:
+                batch.append((state.room_id, state.session_id, state.pending, state.current_turn_id, state.seq))
+                state.inflight = state.pending
+                state.pending = []
+        if not batch:
+            return
+        try:
+            await self.write_batch(batch)
+            for room_id, _, _, current_turn_id, _ in batch:
+                state = self.rooms.get(room_id)
+                if state is not None:
+                    state.saved_turn_id = current_turn_id
+        except Exception:
+            # Yazılamayan tahminleri geri koy, bir sonraki turda tekrar denensin
+            for room_id, _, entries, _, _ in batch:
+                state = self.rooms.get(room_id)
+                if state is not None:
+                    state.pending[:0] = entries
+                    self.dirty.add(room_id)
+            raise
+        finally:
+            for state in states:
+                state.inflight = []
+
+    @database_sync_to_async
+    def load_state(self, room_id):
+        try:
+            game = GameSession.objects.select_related('room__creator', 'room__player2').get(room_id=room_id)
+        except GameSession.DoesNotExist:
+            return None
+        room = game.room
+        players = {room.creator_id: room.creator.username}
+        if room.player2_id:
+            players[room.player2_id] = room.player2.username
+        return RoomState(
+            room_id,
+            game.id,
+            game.target_number,
+            game.current_turn_id,
+            players,
+            seq=game.last_seq,
+            winner_id=game.winner_id
+        )
+
+    @database_sync_to_async
+    def write_batch(self, batch):
+        """
+        Birden fazla odanın bekleyen tahminlerini tek transaction'da yaz:
+        tek INSERT (GameGuess) + tek UPDATE (sıra ve son seq)
+        Kazanan bilgisi settle_game tarafından yazılır.
+        """
+        with db_transaction.atomic():
+            GameGuess.objects.bulk_create([entry for _, _, entries, _, _ in batch for entry in entries])
+            GameSession.objects.bulk_update(
+                [
+                    GameSession(id=session_id, current_turn_id=current_turn_id, last_seq=last_seq)
+                    for _, session_id, _, current_turn_id, last_seq in batch
+                ],
+                ['current_turn', 'last_seq']
+            )
+
+
+class DatabaseGameEngine:
+    """
+    Veritabanı tabanlı oyun motoru (çok worker'lı kurulum için)
+
+    Her tahmin TEK transaction içinde TEK kilitli okuma ile uygulanır:
+    sıra kontrolü, geçmişe ekleme ve sıra değişimi aynı kilit altında yapılır.
+    Sıradaki seq kilitli oturum satırındaki last_seq'ten gelir: tahmin başına
+    kilitli okuma + INSERT + UPDATE, MAX(seq) sorgusu yok.
+    Kazanan tahmin bakiye transferiyle (settle) aynı transaction'da commit edilir.
+    """
+
+    async def apply_guess(self, room_id, user_id, username, guess):
+        return await self.commit_guess(int(room_id), user_id, username, guess)
+
+    def mark_finished(self, room_id, winner_id):
+        pass
+
+    async def close_room(self, room_id):
+        pass
+
+    async def timeout_turn(self, room_id, user_id, seq, forfeit):
+        return await self.commit_timeout(int(room_id), user_id, seq, forfeit)
+
+    def unflushed(self, room_id):
+        # Tahminler commit'ten sonra yayınlanır: veritabanı her zaman güncel
+        return [], None
+
+    @database_sync_to_async
+    def commit_guess(self, room_id, user_id, username, guess):
+        with db_transaction.atomic():
+            try:
+                game = GameSession.objects.select_for_update(of=('self',)).select_related(
+                    'room__creator', 'room__player2'
+                ).get(room_id=room_id)
+            except GameSession.DoesNotExist:
+                return {'error': 'Oyun bulunamadı!'}
+
+            if game.winner_id:
+                return {'error': 'Oyun zaten bitti!'}
+
+            room = game.room
+            players = {room.creator_id: room.creator.username}
+            if room.player2_id:
+                players[room.player2_id] = room.player2.username
+
+            if user_id != game.current_turn_id:
+                return {
+                    'error': f'Lütfen sıranı bekle. Şu an sıra: {players.get(game.current_turn_id)}'
+                }
+
+            response_msg, event, hint = evaluate_guess(username, guess, game.target_number)
+            game.last_seq += 1
+            GameGuess.objects.create(
+                session=game,
+                seq=game.last_seq,
+                guess=guess,
+                guesser_id=user_id,
+                guesser_name=username,
+                response=response_msg,
+                created_at=timezone.now()
+            )
+
+            next_player_id = room.player2_id if user_id == room.creator_id else room.creator_id
+            if event == 'WINNER':
+                game.save(update_fields=['last_seq'])
+                # Kazanan ve bakiye transferi aynı transaction'da: ödemesiz kazanan kalmaz
+                try:
+                    settled = settle(room_id, user_id)
+                except Exception:
+                    logger.exception("Kazanan tahmin ödenemedi room=%s user=%s", room_id, user_id)
+                    settled = None
+                if not settled:
+                    # Tahmin de geri alınır: oyun sürer, oyuncu tekrar deneyebilir
+                    db_transaction.set_rollback(True)
+                    return {'error': 'Oyun zaten bitti!' if settled is False else 'Tahmin kaydedilemedi, tekrar dene.'}
+            else:
+                game.current_turn_id = next_player_id
+                game.save(update_fields=['current_turn', 'last_seq'])
+
+        return guess_payload(
+            game.last_seq, user_id, username, guess, response_msg, event, hint, next_player_id,
+            players.get(next_player_id)
+        )
+
+    @database_sync_to_async
+    def commit_timeout(self, room_id, user_id, seq, forfeit):
+        with db_transaction.atomic():
+            game = GameSession.objects.select_for_update(of=('self',)).select_related(
+                'room__creator', 'room__player2'
+            ).filter(room_id=room_id).first()
+            if game is None or game.winner_id or game.current_turn_id != user_id or game.last_seq != seq:
+                return None
+
+            room = game.room
+            players = {room.creator_id: room.creator.username}
+            if room.player2_id:
+                players[room.player2_id] = room.player2.username
+            other_player_id = room.player2_id if user_id == room.creator_id else room.creator_id
+            if forfeit:
+                # Kazanan ve bakiye transferi aynı transaction'da (bkz. commit_guess);
+                # hata olursa ikisi birlikte geri alınır
+                if not settle(room_id, other_player_id, 'timeout'):
+                    db_transaction.set_rollback(True)
+                    return None
+            else:
+                game.current_turn_id = other_player_id
+                game.save(update_fields=['current_turn'])
+        return other_player_id, players, forfeit
+
+
+def build_engine():
+    if engine_setting('BACKEND', 'memory') == 'database':
+        return DatabaseGameEngine()
+    if getattr(settings, 'CHANNEL_BROKER', {}).get('ADDRESS'):
+        # Zamanlayıcılar (disconnect, join) herhangi bir worker'da tetiklenir ve oyunu veritabanında
+        # bitirir; odanın canlı durumunu tutan worker bunu görmez
+        raise ImproperlyConfigured(
+            "GAME_ENGINE['BACKEND']='memory' tek worker içindir; CHANNEL_BROKER_URL ile 'database' kullanın"
+        )
+    return GameEngine()
+
+
+engine = build_engine()
@@ -0,0 +1,70 @@
+import csv
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+EXPORT_FIELDS = ('id', 'created_at', 'kind', 'amount', 'room_id', 'description')
+
+
+def export_setting(name, default):
+    return getattr(settings, 'TRANSACTION_EXPORT', {}).get(name, default)
+
+
+class Echo:
+    """csv.writer için: yazılan satırı döndürür, biriktirmez"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    """Sunucu taraflı cursor ile (PostgreSQL) satır satır oku - bellek kullanımı sabit"""
+    rows = queryset.order_by('-created_at', '-id').values_list(*EXPORT_FIELDS)
+    return rows.iterator(chunk_size=export_setting('CHUNK_SIZE', 2000))
+
+
+def csv_chunks(rows):
+    writer = csv.writer(Echo())
+    batch_size = export_setting('LINES_PER_CHUNK', 500)
+    buffer = [writer.writerow(EXPORT_FIELDS)]
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= batch_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_chunks(rows):
+    batch_size = export_setting('LINES_PER_CHUNK', 500)
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str, ensure_ascii=False) + '\n')
+        if len(buffer) >= batch_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+}
+
+
+def async_chunks(chunks):
+    """
+    ASGI için: senkron üreteci thread'de ilerlet
+    (senkron üreteç verilirse Django ASGI'de tüm yanıtı belleğe toplar)
+    """
+    pull = sync_to_async(next, thread_sensitive=True)
+
+    async def iterate():
+        while True:
+            chunk = await pull(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    return iterate()
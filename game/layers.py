@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+import uuid
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from .broker import open_connection, pack_frame, read_frame, client_of
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """
+    Process'ler (ve sunucular) arası channel layer
+
+    Grup üyelikleri ve yönlendirme game.broker.ChannelBroker üzerinden yapılır,
+    böylece birden fazla daphne worker'ı aynı odaya yayın yapabilir.
+    Broker: python manage.py run_channel_broker
+
+    Her expiry saniyede bir tarama süresi dolan mesajları ve boş kuyrukları atar;
+    mesajı süresi dolan kanal ölü sayılır ve grup üyelikleri bırakılır.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, address, expiry=60, capacity=100, channel_capacity=None, reconnect_delay=1.0, token='', **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.address = address
+        self.reconnect_delay = reconnect_delay
+        # tcp:// broker'ı için paylaşılan anahtar (bkz. ChannelBroker)
+        self.token = token
+        self.client_id = uuid.uuid4().hex
+        # {channel: asyncio.Queue((expires_at, message))}
+        self.channels = {}
+        # Yeniden bağlanınca broker'a tekrar bildirilecek üyelikler
+        self.groups = {}
+        self.loop = None
+        self.writer = None
+        self.connected = None
+        self.runner = None
+        self.sweeper = None
+
+    # Bağlantı yönetimi
+
+    async def connection(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # Yeni event loop (ör. testler): bağlantıyı sıfırdan kur
+            self.loop = loop
+            self.writer = None
+            self.connected = asyncio.Event()
+            self.runner = loop.create_task(self.run())
+            self.sweeper = loop.create_task(self.sweep_loop())
+        await self.connected.wait()
+        return self.writer
+
+    async def run(self):
+        while True:
+            try:
+                reader, writer = await open_connection(self.address)
+                writer.write(pack_frame(['hello', self.client_id, self.token]))
+                for group, channels in self.groups.items():
+                    for channel in channels:
+                        writer.write(pack_frame(['group_add', group, channel]))
+                await writer.drain()
+                self.writer = writer
+                self.connected.set()
+
+                while True:
+                    frame = await read_frame(reader)
+                    if frame[0] == 'deliver':
+                        _, channels, message = frame
+                        for channel in channels:
+                            try:
+                                self.put_local(channel, message)
+                            except ChannelFull:
+                                logger.warning("Kanal dolu, mesaj düşürüldü channel=%s", channel)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                logger.warning("Broker bağlantısı yok address=%s: %s", self.address, e)
+            self.connected.clear()
+            self.writer = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def write(self, frame):
+        writer = await self.connection()
+        writer.write(pack_frame(frame))
+        await writer.drain()
+
+    def local_queue(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def put_local(self, channel, message):
+        try:
+            self.local_queue(channel).put_nowait((time.time() + self.expiry, message))
+        except asyncio.QueueFull:
+            raise ChannelFull(channel)
+
+    def clean_expired(self):
+        """
+        Süresi dolan mesajları at (InMemoryChannelLayer._clean_expired gibi); boş ve
+        bekleyeni olmayan kuyruklar silinir: ölü kanala gelen mesajlar kalıcı kuyruk bırakmaz
+        Dönüş: mesajı süresi dolan (alıcısı olmayan) kanallar
+        """
+        now = time.time()
+        expired = []
+        for channel, queue in list(self.channels.items()):
+            dropped = False
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+                dropped = True
+            if dropped:
+                expired.append(channel)
+            if queue.empty() and not queue._getters:
+                del self.channels[channel]
+        return expired
+
+    async def sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.expiry)
+            try:
+                for channel in self.clean_expired():
+                    await self.discard_channel(channel)
+            except Exception:
+                logger.exception("Kanal taraması hatası")
+
+    async def discard_channel(self, channel):
+        """Kanalı (bu process'te ve broker'da) tüm gruplarından çıkar"""
+        for group, channels in list(self.groups.items()):
+            if channel in channels:
+                await self.group_discard(group, channel)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        if '!' not in channel:
+            raise TypeError("BrokerChannelLayer sadece process'e özel (!) kanalları destekler")
+        if client_of(channel) == self.client_id:
+            self.put_local(channel, dict(message))
+        else:
+            await self.write(['send', channel, message])
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        await self.connection()
+        queue = self.local_queue(channel)
+        try:
+            while True:
+                expires_at, message = await queue.get()
+                if expires_at >= time.time():
+                    return message
+        finally:
+            if queue.empty():
+                self.channels.pop(channel, None)
+
+    async def new_channel(self, prefix='specific.'):
+        return f"{prefix}{self.client_id}!{uuid.uuid4().hex[:12]}"
+
+    async def flush(self):
+        self.channels = {}
+        self.groups = {}
+        await self.write(['flush'])
+
+    async def close(self):
+        for task in (self.runner, self.sweeper):
+            if task is not None:
+                task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self.groups.setdefault(group, set()).add(channel)
+        await self.write(['group_add', group, channel])
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        channels = self.groups.get(group)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self.groups[group]
+        await self.write(['group_discard', group, channel])
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self.write(['group_send', group, message])
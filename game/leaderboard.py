@@ -0,0 +1,173 @@
+import bisect
+import threading
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'leaderboard:version'
+CHANGE_KEY = 'leaderboard:change:{}'
+PAGE_KEY = 'leaderboard:page:{}:{}:{}:{}'
+
+ORDERINGS = ('wins', 'win_rate')
+
+
+def leaderboard_setting(name, default):
+    return getattr(settings, 'LEADERBOARD', {}).get(name, default)
+
+
+def player_row(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'balance': float(user.balance),
+        'total_games': user.total_games,
+        'total_wins': user.total_wins,
+    }
+
+
+def win_rate(row):
+    if row['total_games'] == 0:
+        return 0
+    return round((row['total_wins'] / row['total_games']) * 100, 1)
+
+
+def publish(*users):
+    """
+    Bakiye/istatistik değişikliğini leaderboard'a bildir (transaction commit olunca)
+    Değişiklik paylaşılan cache'e sürüm numarasıyla yazılır; her process kendi
+    indeksini sadece değişen satırlarla günceller.
+    """
+    rows = [player_row(user) for user in users]
+    transaction.on_commit(lambda: push_changes(rows))
+
+
+def push_changes(rows):
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # Sürüm anahtarı silinmiş: herkes tam yeniden yüklesin
+        cache.set(VERSION_KEY, 1, timeout=None)
+        return
+    cache.set(CHANGE_KEY.format(version), rows, timeout=leaderboard_setting('CHANGE_TTL', 3600))
+
+
+class Leaderboard:
+    """
+    Process içi sıralama indeksi
+
+    - İlk kullanımda tek sorgu ile yüklenir, sonra sadece değişen oyuncular uygulanır
+    - Sıralı anahtar listeleri (bisect) ile sıra sorgusu O(log n)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        # {user_id: row}
+        self.players = {}
+        # {order: [(sort_key, user_id), ...]} - artan sırada
+        self.keys = {order: [] for order in ORDERINGS}
+
+    def sort_key(self, order, row):
+        if order == 'win_rate':
+            return (-win_rate(row), -row['total_games'], row['id'])
+        return (-row['total_wins'], -row['balance'], row['id'])
+
+    def eligible(self, order, row):
+        if order == 'win_rate':
+            return row['total_games'] >= leaderboard_setting('MIN_GAMES_FOR_WIN_RATE', 10)
+        return row['total_games'] > 0
+
+    def apply(self, row):
+        old = self.players.get(row['id'])
+        for order in ORDERINGS:
+            keys = self.keys[order]
+            if old is not None and self.eligible(order, old):
+                index = bisect.bisect_left(keys, self.sort_key(order, old))
+                if index < len(keys) and keys[index] == self.sort_key(order, old):
+                    del keys[index]
+            if self.eligible(order, row):
+                bisect.insort(keys, self.sort_key(order, row))
+        self.players[row['id']] = row
+
+    def load(self, version):
+        User = get_user_model()
+        self.players = {}
+        self.keys = {order: [] for order in ORDERINGS}
+        rows = User.objects.filter(total_games__gt=0).values(
+            'id', 'username', 'balance', 'total_games', 'total_wins'
+        )
+        for row in rows.iterator(chunk_size=5000):
+            row['balance'] = float(row['balance'])
+            self.players[row['id']] = row
+        for order in ORDERINGS:
+            self.keys[order] = sorted(
+                self.sort_key(order, row) for row in self.players.values() if self.eligible(order, row)
+            )
+        self.version = version
+
+    def sync(self):
+        """Paylaşılan sürüme yetiş: eksik değişiklik varsa tam yeniden yükle"""
+        shared = cache.get(VERSION_KEY, 0)
+        if self.version == shared:
+            return shared
+        if self.version is None or shared < self.version:
+            self.load(shared)
+            return shared
+        changes = cache.get_many([CHANGE_KEY.format(v) for v in range(self.version + 1, shared + 1)])
+        if len(changes) != shared - self.version:
+            self.load(shared)
+            return shared
+        for v in range(self.version + 1, shared + 1):
+            for row in changes[CHANGE_KEY.format(v)]:
+                self.apply(row)
+        self.version = shared
+        return shared
+
+    def entry(self, rank, row):
+        return {
+            'rank': rank,
+            'username': row['username'],
+            'balance': row['balance'],
+            'total_games': row['total_games'],
+            'total_wins': row['total_wins'],
+            'win_rate': win_rate(row)
+        }
+
+    def page(self, order='wins', page=1, page_size=10):
+        """Dönüş: (sayfa listesi, toplam oyuncu sayısı) - top-N sayfaları cache'lenir"""
+        with self.lock:
+            version = self.sync()
+            key = PAGE_KEY.format(order, page, page_size, version)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+            keys = self.keys[order]
+            start = (page - 1) * page_size
+            result = (
+                [
+                    self.entry(start + idx + 1, self.players[sort_key[-1]])
+                    for idx, sort_key in enumerate(keys[start:start + page_size])
+                ],
+                len(keys)
+            )
+        cache.set(key, result, timeout=leaderboard_setting('CACHE_TIMEOUT', 300))
+        return result
+
+    def rank(self, user_id, order='wins'):
+        """Dönüş: sıralama girdisi veya listede değilse None"""
+        with self.lock:
+            self.sync()
+            row = self.players.get(user_id)
+            if row is None or not self.eligible(order, row):
+                return None
+            index = bisect.bisect_left(self.keys[order], self.sort_key(order, row))
+            return self.entry(index + 1, row)
+
+    def total(self, order='wins'):
+        return len(self.keys[order])
+
+
+leaderboard = Leaderboard()
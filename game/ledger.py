@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal('0.00')
+
+
+def opening_balance():
+    """Yeni kullanıcının başlangıç bakiyesi (CustomUser.balance varsayılanı)"""
+    User = get_user_model()
+    return Decimal(str(User._meta.get_field('balance').get_default())).quantize(ZERO)
+
+
+def last_transaction_id():
+    return Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def users_to_check(since_transaction_id=None):
+    """Artımlı çalışmada sadece since_transaction_id'den sonra hareketi olan kullanıcılar"""
+    User = get_user_model()
+    users = User.objects.all()
+    if since_transaction_id:
+        users = users.filter(
+            id__in=Transaction.objects.filter(id__gt=since_transaction_id).values('user_id')
+        )
+    return users
+
+
+def user_chunks(users, chunk_size, after=0):
+    """Keyset ile kullanıcı id aralıkları - Dönüş: (ilk_id, son_id, adet)"""
+    while True:
+        ids = list(users.filter(id__gt=after).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids[0], ids[-1], len(ids)
+        after = ids[-1]
+
+
+def mismatches(users, first_id, last_id, opening):
+    """
+    Aralıktaki tutarsız kullanıcılar: balance != opening + SUM(amount)
+    Toplama ve karşılaştırma veritabanında (GROUP BY/HAVING) yapılır; satırlar
+    sunucu taraflı cursor ile okunur. Bakiye ve toplam aynı ifadede okunduğu için
+    oyun sırasında çalıştırmak yanlış alarm üretmez.
+    """
+    rows = users.filter(id__gte=first_id, id__lte=last_id).values('id', 'username', 'balance').annotate(
+        ledger=Coalesce(Sum('transactions__amount'), Value(ZERO), output_field=AMOUNT_FIELD)
+    ).annotate(
+        expected=ExpressionWrapper(Value(opening, output_field=AMOUNT_FIELD) + F('ledger'), output_field=AMOUNT_FIELD)
+    ).exclude(balance=F('expected')).order_by('id')
+    return rows.iterator(chunk_size=500)
+
+
+def correct(user_id, opening):
+    """
+    Bakiyeyi deftere eşitleyen ADJUSTMENT kaydı yaz
+    Kullanıcı kilitlenip fark yeniden hesaplanır (rapordan sonra oynanan oyunlar için).
+    Dönüş: yazılan düzeltme tutarı (fark kalmadıysa 0)
+    """
+    User = get_user_model()
+    with transaction.atomic():
+        user = User.objects.select_for_update().only('id', 'balance').get(id=user_id)
+        ledger = Transaction.objects.filter(user_id=user_id).aggregate(total=Sum('amount'))['total'] or ZERO
+        difference = user.balance - (opening + ledger)
+        if difference:
+            Transaction.objects.create(
+                user=user,
+                kind='ADJUSTMENT',
+                amount=difference,
+                description="Defter mutabakatı düzeltmesi"
+            )
+            logger.info("Defter düzeltmesi user=%s amount=%s", user_id, difference)
+        return difference
+
+
+class Checkpoint:
+    """
+    Mutabakat ilerlemesi (JSON dosyası)
+
+    - user_id: yarıda kalan çalışmada son tamamlanan kullanıcı (None: çalışma bitti)
+    - transaction_id: çalışma başındaki son hareket; bir sonraki artımlı çalışma bundan sonrasına bakar
+    - since: bu çalışmanın baktığı başlangıç hareketi (artımlı değilse None)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, name, default=None):
+        return self.state.get(name, default)
+
+    def save(self, **state):
+        self.state.update(state)
+        if not self.path:
+            return
+        # Yarıda kesilirse bozuk dosya kalmasın
+        temp = f'{self.path}.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(temp, self.path)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import time
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+LOBBY_GROUP = 'lobby'
+# Grup üyeliği channel layer'da süreyle tutulur: bu aralıkla yenilenir
+GROUP_REFRESH_INTERVAL = 3600
+
+
+def lobby_setting(name, default):
+    return getattr(settings, 'LOBBY', {}).get(name, default)
+
+
+def room_row(room):
+    from .serializers import RoomSerializer
+    return dict(RoomSerializer(room).data)
+
+
+def publish_room(room, reason):
+    """
+    Oda değişikliğini lobiye bildir (transaction commit olunca)
+    reason: created, joined, reopened, finished, expired
+    OPEN/FULL odalar 'upsert', diğerleri 'remove' olarak gider.
+    """
+    if room.status in ('OPEN', 'FULL'):
+        publish_delta({'op': 'upsert', 'reason': reason, 'room': room_row(room)})
+    else:
+        publish_removal(room.id, reason)
+
+
+def publish_removal(room_id, reason):
+    """
+    Odayı lobiden çıkar - oda nesnesi yüklemeden (örn. küme tabanlı güncellemelerde)
+    Consumer'lar URL'deki id'yi (str) verir: upsert'teki id ile aynı tipte gönderilir
+    """
+    publish_delta({'op': 'remove', 'reason': reason, 'id': int(room_id)})
+
+
+def publish_delta(delta):
+    transaction.on_commit(lambda: send_delta(delta))
+
+
+# Event loop'tan başlatılan gönderimler: loop task'lara zayıf referans tutar, bitene kadar burada
+sends = set()
+
+
+def send_done(task):
+    sends.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Lobi delta yayınlanamadı", exc_info=task.exception())
+
+
+def send_delta(delta):
+    message = {'type': 'lobby.delta', 'delta': delta}
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        async_to_sync(get_channel_layer().group_send)(LOBBY_GROUP, message)
+    else:
+        task = asyncio.ensure_future(get_channel_layer().group_send(LOBBY_GROUP, message))
+        sends.add(task)
+        task.add_done_callback(send_done)
+
+
+def delta_key(delta):
+    return delta['room']['id'] if delta['op'] == 'upsert' else delta['id']
+
+
+class LobbyHub:
+    """
+    Process başına tek lobi aboneliği
+
+    - Channel layer'daki 'lobby' grubunun bu process'teki tek üyesidir
+    - Delta'lar oda bazında birleştirilir (aynı tick'te son durum kazanır)
+    - Her tick'te batch bir kez serialize edilip yerel istemcilerin hepsine gönderilir
+    """
+
+    def __init__(self):
+        self.clients = set()
+        # {room_id: delta}
+        self.pending = {}
+        self.runner = None
+        self.loop = None
+        self.ready = None
+
+    def ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self.runner is None or self.runner.done() or self.loop is not loop:
+            self.loop = loop
+            self.ready = asyncio.Event()
+            self.runner = loop.create_task(self.run())
+
+    async def join(self, client):
+        """Grup aboneliği kurulunca döner: bundan sonraki değişiklikler client'a ulaşır"""
+        self.ensure_started()
+        self.clients.add(client)
+        await self.ready.wait()
+
+    def leave(self, client):
+        self.clients.discard(client)
+
+    async def run(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(LOBBY_GROUP, channel)
+        self.ready.set()
+        flusher = asyncio.ensure_future(self.flush_loop(layer, channel))
+        try:
+            while True:
+                message = await layer.receive(channel)
+                delta = message['delta']
+                self.pending[delta_key(delta)] = delta
+        finally:
+            flusher.cancel()
+
+    async def flush_loop(self, layer, channel):
+        tick = lobby_setting('TICK', 0.5)
+        refreshed_at = time.monotonic()
+        while True:
+            if time.monotonic() - refreshed_at > GROUP_REFRESH_INTERVAL:
+                await layer.group_add(LOBBY_GROUP, channel)
+                refreshed_at = time.monotonic()
+            await asyncio.sleep(tick)
+            if not self.pending:
+                continue
+            batch, self.pending = list(self.pending.values()), {}
+            text = json.dumps({'event': 'DELTA', 'deltas': batch})
+            for client in list(self.clients):
+                try:
+                    await client.push(text)
+                except Exception:
+                    logger.exception("Lobi delta gönderilemedi")
+
+
+hub = LobbyHub()
@@ -0,0 +1,37 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from game.archive import archivable_rooms, archive_finished_rooms, archive_setting
+
+
+class Command(BaseCommand):
+    help = (
+        'Saklama süresini aşan bitmiş odaları (oturum ve tahminleriyle) ArchivedGame tablosuna taşır. '
+        'Cron ile periyodik çalıştırılabilir.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None, help="Varsayılan: ARCHIVE['RETENTION_DAYS']")
+        parser.add_argument('--batch-size', type=int, default=None, help="Varsayılan: ARCHIVE['BATCH_SIZE']")
+        parser.add_argument('--max-batches', type=int, default=None, help='En fazla bu kadar batch taşı')
+        parser.add_argument('--dry-run', action='store_true', help='Sadece arşivlenecek oda sayısını göster')
+
+    def handle(self, *args, **options):
+        retention_days = options['retention_days']
+        if retention_days is None:
+            retention_days = archive_setting('RETENTION_DAYS', 30)
+        if retention_days < 0 or (options['batch_size'] is not None and options['batch_size'] < 1):
+            raise CommandError('--retention-days negatif, --batch-size sıfır olamaz')
+
+        if options['dry_run']:
+            cutoff = timezone.now() - timedelta(days=retention_days)
+            count = archivable_rooms(cutoff).count()
+            self.stdout.write(f"{count} oda arşivlenecek (bitiş < {cutoff:%Y-%m-%d %H:%M})")
+            return
+
+        moved = archive_finished_rooms(
+            retention_days=retention_days,
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{moved} oda arşivlendi"))
@@ -0,0 +1,65 @@
+import asyncio
+import json
+from django.core.management.base import BaseCommand
+from game.bench import run_benchmark, throwaway_database
+from game.protocol import CODECS, JSON
+
+
+class Command(BaseCommand):
+    help = (
+        'Oyun protokolünü core.asgi.application üzerinden eşzamanlı simüle oyuncularla ölçer '
+        '(tahmin→yayın gecikmesi, throughput, oyun başına sorgu). Sonuç JSON olarak yazılır.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=50, help='Oynatılacak oda (oyun) sayısı')
+        parser.add_argument('--concurrency', type=int, default=None, help='Aynı anda açık oda sayısı (varsayılan: hepsi)')
+        parser.add_argument('--disconnect-rate', type=float, default=0.05, help='Hamle başına kopup yeniden bağlanma olasılığı')
+        parser.add_argument('--bet', type=int, default=10)
+        parser.add_argument(
+            '--protocol', choices=list(CODECS), default=JSON, help='Oyuncuların önerdiği WebSocket alt protokolü'
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', default=None, help='JSON sonuç dosyası (varsayılan: stdout)')
+        parser.add_argument('--label', default='', help='Sonuca eklenecek etiket (ör. commit hash)')
+        parser.add_argument('--keepdb', action='store_true', help='Geçici test veritabanını silme')
+        parser.add_argument(
+            '--use-existing-db', action='store_true',
+            help='Geçici veritabanı oluşturma, ayarlardaki veritabanını kullan (kayıtlar kalır!)'
+        )
+
+    def handle(self, *args, **options):
+        from core.asgi import application
+
+        async def run():
+            return await run_benchmark(
+                application,
+                rooms=options['rooms'],
+                concurrency=options['concurrency'],
+                disconnect_rate=options['disconnect_rate'],
+                bet_amount=options['bet'],
+                seed=options['seed'],
+                protocol=options['protocol'],
+            )
+
+        if options['use_existing_db']:
+            result = asyncio.run(run())
+        else:
+            with throwaway_database(keepdb=options['keepdb']):
+                result = asyncio.run(run())
+        result['label'] = options['label']
+
+        output = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            latency = result['latency_ms']
+            self.stdout.write(self.style.SUCCESS(
+                f"{result['games_completed']}/{result['rooms']} oyun, {result['guesses_per_s']} tahmin/sn, "
+                f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms, "
+                f"{result['db_queries_per_game']} sorgu/oyun, {result['bytes_per_message']} bayt/mesaj → {options['output']}"
+            ))
+        else:
+            self.stdout.write(output)
+        if result['errors']:
+            self.stderr.write(f"{len(result['errors'])} oyun hata ile bitti")
@@ -0,0 +1,35 @@
+import json
+from django.core.management.base import BaseCommand
+from game.bench import run_fanout_benchmark, run_protocol_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Oyun mesajlarını her WebSocket alt protokolünde kodlar: mesaj başına bayt ve kodlama süresi.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10000, help='Mesaj başına kodlama tekrarı')
+        parser.add_argument(
+            '--receivers', type=int, nargs='+', default=[2, 10, 50], help='Yayın karşılaştırması için oda soket sayıları'
+        )
+        parser.add_argument('--json', action='store_true', help='Sonucu JSON olarak yaz')
+
+    def handle(self, *args, **options):
+        results = run_protocol_benchmark(options['iterations'])
+        fanout = [
+            run_fanout_benchmark(receivers, options['iterations'] // 5, mixed)
+            for mixed in (False, True) for receivers in options['receivers']
+        ]
+        if options['json']:
+            self.stdout.write(json.dumps({'codecs': results, 'fanout': fanout}, indent=2))
+            return
+        for subprotocol, rows in results.items():
+            self.stdout.write(subprotocol)
+            for name, row in rows.items():
+                self.stdout.write(f"  {name:<10} {row['bytes']:>5} bayt  {row['encode_us']:>8} µs")
+        self.stdout.write('Yayın (µs/yayın)')
+        for row in fanout:
+            sockets = 'karışık' if row['mixed'] else 'JSON'
+            self.stdout.write(
+                f"  {row['receivers']:>4} soket ({sockets:<7})  soket başına kodlama: {row['per_socket_us']:>8}"
+                f"  paylaşılan: {row['shared_us']:>8}"
+            )
@@ -0,0 +1,79 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from game.ledger import (
+    Checkpoint, correct, last_transaction_id, mismatches, opening_balance, user_chunks, users_to_check
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Kullanıcı bakiyelerini hesap hareketleriyle karşılaştırır: '
+        'balance = başlangıç bakiyesi + SUM(Transaction.amount). Tutarsızlıkları raporlar, '
+        '--fix ile ADJUSTMENT kaydı yazar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Tek sorguda kontrol edilen kullanıcı sayısı')
+        parser.add_argument(
+            '--opening-balance', type=Decimal, default=None,
+            help='Başlangıç bakiyesi (varsayılan: CustomUser.balance varsayılanı)'
+        )
+        parser.add_argument('--fix', action='store_true', help='Tutarsız kullanıcılar için ADJUSTMENT kaydı yaz')
+        parser.add_argument(
+            '--checkpoint', default=None,
+            help='İlerleme dosyası: yarıda kalan çalışma kaldığı yerden devam eder'
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Sadece son tamamlanan çalışmadan sonra hareketi olan kullanıcıları kontrol et (--checkpoint gerekir)'
+        )
+
+    def handle(self, *args, **options):
+        if options['incremental'] and not options['checkpoint']:
+            raise CommandError('--incremental için --checkpoint gerekli')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size pozitif olmalı')
+
+        opening = options['opening_balance']
+        if opening is None:
+            opening = opening_balance()
+        checkpoint = Checkpoint(options['checkpoint'])
+
+        if checkpoint.get('user_id') is not None:
+            # Yarıda kalan çalışmaya devam
+            since = checkpoint.get('since')
+            after = checkpoint.get('user_id')
+            run_transaction_id = checkpoint.get('run_transaction_id')
+            self.stdout.write(f"Kaldığı yerden devam: user_id > {after}")
+        else:
+            since = checkpoint.get('transaction_id') if options['incremental'] else None
+            after = 0
+            run_transaction_id = last_transaction_id()
+            checkpoint.save(since=since, run_transaction_id=run_transaction_id, user_id=0)
+
+        users = users_to_check(since)
+        checked = found = 0
+        total_difference = Decimal('0.00')
+        for first_id, last_id, count in user_chunks(users, options['chunk_size'], after):
+            for row in mismatches(users, first_id, last_id, opening):
+                difference = row['balance'] - row['expected']
+                if options['fix']:
+                    difference = correct(row['id'], opening)
+                    if not difference:
+                        continue
+                found += 1
+                total_difference += difference
+                self.stdout.write(
+                    f"user={row['id']} {row['username']}: bakiye={row['balance']} "
+                    f"defter={row['expected']} fark={difference}"
+                    + (" (düzeltildi)" if options['fix'] else "")
+                )
+            checked += count
+            checkpoint.save(user_id=last_id)
+
+        checkpoint.save(user_id=None, transaction_id=run_transaction_id)
+        summary = f"{checked} kullanıcı kontrol edildi, {found} tutarsız, toplam fark {total_difference}"
+        if found and not options['fix']:
+            # Çıkış kodu 1: zamanlanmış çalıştırmalarda alarm için
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
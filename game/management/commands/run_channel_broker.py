@@ -0,0 +1,30 @@
+import asyncio
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from game.broker import ChannelBroker
+
+
+class Command(BaseCommand):
+    help = 'Worker process\'leri arası channel layer broker\'ını başlatır'
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'CHANNEL_BROKER', {})
+        parser.add_argument('--address', default=config.get('ADDRESS', 'unix:///tmp/numberduel-broker.sock'))
+        parser.add_argument('--group-expiry', type=int, default=config.get('GROUP_EXPIRY', 86400))
+        parser.add_argument('--max-client-buffer', type=int, default=config.get('MAX_CLIENT_BUFFER', 8 * 1024 * 1024))
+        parser.add_argument('--token', default=config.get('TOKEN', ''))
+
+    def handle(self, *args, **options):
+        broker = ChannelBroker(
+            options['address'],
+            group_expiry=options['group_expiry'],
+            max_client_buffer=options['max_client_buffer'],
+            token=options['token']
+        )
+        self.stdout.write(self.style.SUCCESS(f"🚀 Channel broker dinliyor: {options['address']}"))
+        try:
+            asyncio.run(broker.serve_forever())
+        except KeyboardInterrupt:
+            self.stdout.write("Broker durduruldu")
+        except ValueError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,112 @@
+import asyncio
+import json
+from django.core.management.base import BaseCommand, CommandError
+from game.bench import throwaway_database
+from game.protocol import CODECS, JSON
+from game.soak import run_soak
+
+
+class Command(BaseCommand):
+    help = (
+        'Uzun süreli yük testi: core.asgi.application üzerinde bağlantıları açıp kapatarak binlerce oyun oynatır, '
+        'periyodik olarak RSS, tracemalloc, açık task, channel layer grup ve process içi durum boyutlarını kaydeder. '
+        '1000 oyun başına büyüme eşiği aşılırsa çıkış kodu 1 ile biter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=None, help='Oynatılacak oyun sayısı')
+        parser.add_argument('--duration', type=float, default=None, help='Süre (saniye); --games ile birlikte ilk dolan')
+        parser.add_argument('--concurrency', type=int, default=20, help='Aynı anda oynanan oyun sayısı')
+        parser.add_argument('--disconnect-rate', type=float, default=0.1, help='Hamle başına kopup yeniden bağlanma olasılığı')
+        parser.add_argument('--spectators', type=int, default=1, help='Oyun başına izleyici bağlantısı')
+        parser.add_argument('--sample-every', type=int, default=500, help='Bu kadar oyunda bir örnek al')
+        parser.add_argument(
+            '--warmup', type=int, default=500,
+            help="Büyüme hesabına katılmayan ilk oyunlar (ayrıca en az REPLAY['TTL'] saniye)"
+        )
+        parser.add_argument('--bet', type=int, default=10)
+        parser.add_argument(
+            '--protocol', choices=list(CODECS), default=JSON, help='Oyuncuların önerdiği WebSocket alt protokolü'
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--top', type=int, default=10, help='Örnek başına raporlanan tracemalloc satırı')
+        parser.add_argument(
+            '--no-tracemalloc', action='store_true', help='tracemalloc kapalı (daha hızlı, bellek kontrolü RSS ile)'
+        )
+        parser.add_argument(
+            '--max-rss-growth', type=float, default=None,
+            help='1000 oyun başına RSS artışı eşiği (KB, sadece --no-tracemalloc ile kontrol edilir)'
+        )
+        parser.add_argument(
+            '--max-traced-growth', type=float, default=None, help='1000 oyun başına tracemalloc artışı eşiği (KB)'
+        )
+        parser.add_argument(
+            '--max-object-growth', type=float, default=None,
+            help='1000 oyun başına task/grup/oda vb. sayı artışı eşiği'
+        )
+        parser.add_argument('--output', default=None, help='JSON sonuç dosyası (varsayılan: stdout)')
+        parser.add_argument('--keepdb', action='store_true', help='Geçici test veritabanını silme')
+        parser.add_argument(
+            '--use-existing-db', action='store_true',
+            help='Geçici veritabanı oluşturma, ayarlardaki veritabanını kullan (soak kullanıcıları silinir)'
+        )
+
+    def handle(self, *args, **options):
+        from core.asgi import application
+
+        if options['games'] is None and options['duration'] is None:
+            raise CommandError('--games veya --duration gerekli')
+        thresholds = {
+            name: options[option]
+            for name, option in (
+                ('rss_kb', 'max_rss_growth'), ('traced_kb', 'max_traced_growth'), ('objects', 'max_object_growth')
+            )
+            if options[option] is not None
+        }
+
+        def progress(sample):
+            traced = f"traced={sample['traced_kb']}KB " if sample['traced_kb'] is not None else ''
+            self.stdout.write(
+                f"{sample['games']} oyun {sample['elapsed_s']}s rss={sample['rss_kb']}KB {traced}"
+                f"tasks={sample['tasks']} groups={sample['layer_groups']} channels={sample['layer_channels']} "
+                f"engine_rooms={sample['engine_rooms']} timers={sample['pending_timers']} errors={sample['errors']}"
+            )
+
+        async def run():
+            return await run_soak(
+                application,
+                games=options['games'],
+                duration=options['duration'],
+                concurrency=options['concurrency'],
+                disconnect_rate=options['disconnect_rate'],
+                spectators=options['spectators'],
+                sample_every=options['sample_every'],
+                warmup=options['warmup'],
+                bet_amount=options['bet'],
+                seed=options['seed'],
+                protocol=options['protocol'],
+                top=options['top'],
+                trace=not options['no_tracemalloc'],
+                thresholds=thresholds,
+                on_sample=progress,
+            )
+
+        if options['use_existing_db']:
+            result = asyncio.run(run())
+        else:
+            with throwaway_database(keepdb=options['keepdb']):
+                result = asyncio.run(run())
+
+        output = json.dumps(result, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        growth = ', '.join(f'{name}={value}' for name, value in result['growth_per_1k_games'].items() if value)
+        summary = f"{result['games']} oyun, 1000 oyun başına büyüme: {growth or 'yok'}"
+        if result['failures']:
+            # Çıkış kodu 1: CI / zamanlanmış çalıştırmalarda alarm için
+            raise CommandError(summary + '\n' + '\n'.join(result['failures']))
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,164 @@
+import bisect
+from collections import OrderedDict
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from .lobby import publish_room
+from .leaderboard import publish as publish_leaderboard
+from .config import global_settings
+from .models import Room
+from .utils import reserve_stake
+
+
+class Ticket:
+    """Kuyruktaki bir oyuncu - kabul ettiği bahis aralığı [min_bet, max_bet]"""
+    __slots__ = ('user_id', 'username', 'channel_name', 'min_bet', 'max_bet')
+
+    def __init__(self, user_id, username, channel_name, min_bet, max_bet):
+        self.user_id = user_id
+        self.username = username
+        self.channel_name = channel_name
+        self.min_bet = min_bet
+        self.max_bet = max_bet
+
+
+class MatchQueue:
+    """
+    Bahis aralığına göre kovalanmış eşleşme kuyruğu (process içi)
+
+    - Bekleyenler kabul ettikleri aralığa göre kovalara, kova içinde geliş sırasına (FIFO) göre dizilir
+    - Dolu kovaların anahtarları (max_bet, min_bet) sırasıyla tutulur. Arama bekleyen sayısıyla değil
+      farklı aralık sayısıyla büyür (bahisler bet_step adımlı olduğundan sınırlı): max_bet'i gelenin
+      aralığında olan ilk kova O(log n) ile bulunur ve içindeki herkes uyumludur; daha yüksek
+      max_bet'li kovalarda sadece kova anahtarının min_bet'i kontrol edilir
+    - Sabit bahis [X, X] de bir aralıktır; eşleşme bahsi iki aralığın kesişimindeki en yüksek değer
+    """
+
+    def __init__(self):
+        # {(max_bet, min_bet): OrderedDict(user_id -> Ticket)}
+        self.buckets = {}
+        # Boş olmayan kovaların sıralı anahtarları
+        self.keys = []
+        # {user_id: Ticket}
+        self.tickets = {}
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __contains__(self, user_id):
+        return user_id in self.tickets
+
+    def add(self, ticket, front=False):
+        self.remove(ticket.user_id)
+        key = (ticket.max_bet, ticket.min_bet)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = OrderedDict()
+            bisect.insort(self.keys, key)
+        bucket[ticket.user_id] = ticket
+        if front:
+            bucket.move_to_end(ticket.user_id, last=False)
+        self.tickets[ticket.user_id] = ticket
+
+    def remove(self, user_id):
+        ticket = self.tickets.pop(user_id, None)
+        if ticket is None:
+            return None
+        key = (ticket.max_bet, ticket.min_bet)
+        bucket = self.buckets[key]
+        del bucket[user_id]
+        if not bucket:
+            del self.buckets[key]
+            del self.keys[bisect.bisect_left(self.keys, key)]
+        return ticket
+
+    def pop_partner(self, ticket):
+        """
+        ticket ile uyumlu bir bekleyeni kuyruktan çıkar: max_bet'i en düşük uyumlu kovanın
+        en eskisi (geliş sırası kova içinde korunur, kovalar arasında değil)
+        max_bet >= ticket.min_bet olan kovalar sırayla taranır; min_bet'i ticket.max_bet'ten
+        büyük olanlar atlanır (farklı aralık sayısıyla doğrusal, bekleyen sayısıyla değil)
+        Dönüş: (partner, bahis) veya (None, None)
+        """
+        # max_bet >= ticket.min_bet olan ilk kova
+        for index in range(bisect.bisect_left(self.keys, (ticket.min_bet,)), len(self.keys)):
+            max_bet, min_bet = self.keys[index]
+            # max_bet <= ticket.max_bet ise min_bet de öyledir: kova uyumlu
+            if min_bet > ticket.max_bet:
+                continue
+            for partner in self.buckets[max_bet, min_bet].values():
+                if partner.user_id != ticket.user_id:
+                    self.remove(partner.user_id)
+                    return partner, min(max_bet, ticket.max_bet)
+        return None, None
+
+
+def bet_limits():
+    config = global_settings.get()
+    return config.min_bet, config.max_bet
+
+
+def validate_request(user_id, min_bet, max_bet):
+    """Dönüş: hata mesajı veya None"""
+    if not (min_bet.is_finite() and max_bet.is_finite()):
+        return "Geçersiz bahis miktarı!"
+    low, high = bet_limits()
+    if min_bet > max_bet:
+        return "min_bet, max_bet'ten büyük olamaz"
+    if min_bet < low or max_bet > high:
+        return f"Bahis {low} ile {high} arasında olmalı!"
+    User = get_user_model()
+    balance = User.objects.filter(id=user_id).values_list('balance', flat=True).first()
+    if balance is None or balance < min_bet:
+        return "Bakiye yetersiz!"
+    return None
+
+
+def parse_bets(data):
+    """{'bet': X} veya {'min_bet': A, 'max_bet': B} - Dönüş: (min_bet, max_bet)"""
+    if data.get('bet') is not None:
+        bet = Decimal(str(data['bet']))
+        return bet, bet
+    return Decimal(str(data['min_bet'])), Decimal(str(data['max_bet']))
+
+
+def create_match_room(waiting, incoming, bet):
+    """
+    Eşleşen iki oyuncu için FULL odayı tek transaction'da oluştur
+    İki bahis de burada kilitlenir ve her oyuncu için JOIN_TIMEOUT zamanlayıcısı kurulur:
+    oyun soketini açmayan oyuncunun bahsi iade edilir veya hükmen kaybeder (bkz. consumers.expire_join)
+    Dönüş: (room_id, None) veya bakiyesi yetmeyen oyuncu için (None, user_id)
+    """
+    User = get_user_model()
+    with transaction.atomic():
+        # Kilit sırası sabit (id'ye göre): karşılıklı beklemeyi önle
+        users = {
+            user.id: user
+            for user in User.objects.select_for_update().filter(
+                id__in=[waiting.user_id, incoming.user_id]
+            ).order_by('id')
+        }
+        for ticket in (waiting, incoming):
+            user = users.get(ticket.user_id)
+            if user is None or user.balance < bet:
+                return None, ticket.user_id
+
+        room = Room.objects.create(
+            name=f"{waiting.username} vs {incoming.username}"[:50],
+            bet_amount=bet,
+            creator=users[waiting.user_id],
+            player2=users[incoming.user_id],
+            status='FULL'
+        )
+        for ticket in (waiting, incoming):
+            if not reserve_stake(room, ticket.user_id):
+                # Oda ve diğer kilit de geri alınır
+                transaction.set_rollback(True)
+                return None, ticket.user_id
+            users[ticket.user_id].balance -= bet
+        publish_leaderboard(*users.values())
+        publish_room(room, 'created')
+        return room.id, None
+
+
+queue = MatchQueue()
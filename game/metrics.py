@@ -0,0 +1,160 @@
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+# Aktif ölçümün sorgu sayacı: [sayı] - database_sync_to_async thread'lerine context ile taşınır
+QUERY_COUNTER = ContextVar('query_counter', default=None)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # {label: [bucket sayıları..., toplam, adet]}
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self.lock:
+            row = self.values.get(label)
+            if row is None:
+                row = self.values[label] = [0] * (len(self.buckets) + 2)
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[idx] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self, label_name):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label, row in sorted(self.values.items()):
+                for idx, bound in enumerate(self.buckets):
+                    lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {row[idx]}')
+                lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="+Inf"}} {row[-1]}')
+                lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {row[-2]}')
+                lines.append(f'{self.name}_count{{{label_name}="{label}"}} {row[-1]}')
+        return lines
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def render(self):
+        value = self.func() if self.func is not None else self.value
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", f"{self.name} {value}"]
+
+
+class Counter(Gauge):
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        # Sorgular birden fazla thread'den sayılır
+        with self.lock:
+            self.value += amount
+
+
+phase_seconds = Histogram('numberduel_phase_seconds', 'Aşama süresi (saniye)', LATENCY_BUCKETS)
+phase_queries = Histogram('numberduel_phase_db_queries', 'Aşama başına veritabanı sorgusu', QUERY_BUCKETS)
+db_queries = Counter('numberduel_db_queries_total', 'Toplam veritabanı sorgusu')
+open_sockets = Gauge('numberduel_open_sockets', 'Açık WebSocket bağlantısı')
+gauges = [db_queries, open_sockets]
+
+
+def register_gauge(name, help_text, func):
+    gauges.append(Gauge(name, help_text, func))
+
+
+class track:
+    """
+    Bir aşamanın süresini ve sorgu sayısını ölç
+
+        async with track('handle_guess'):
+            ...
+
+    İç içe ölçümlerde iç aşamanın sorguları dış aşamaya da eklenir.
+    """
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.parent = QUERY_COUNTER.get()
+        self.counter = [0]
+        self.token = QUERY_COUNTER.set(self.counter)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        phase_seconds.observe(self.phase, time.perf_counter() - self.started)
+        phase_queries.observe(self.phase, self.counter[0])
+        QUERY_COUNTER.reset(self.token)
+        if self.parent is not None:
+            self.parent[0] += self.counter[0]
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def count_queries(execute, sql, params, many, context):
+    db_queries.inc()
+    counter = QUERY_COUNTER.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created sinyali: her yeni bağlantıya sorgu sayacını ekle"""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def render():
+    lines = []
+    lines += phase_seconds.render('phase')
+    lines += phase_queries.render('phase')
+    for gauge in gauges:
+        lines += gauge.render()
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus formatında metrikler - Authorization: Bearer <METRICS_TOKEN> gerekir
+    Token tanımlı değilse kapalıdır; METRICS_REQUIRE_TOKEN=False ile tokensız açılır (sadece iç ağ için)
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif getattr(settings, 'METRICS_REQUIRE_TOKEN', True):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4')
@@ -1,50 +1,147 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
-from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from jwt import decode as jwt_decode
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from urllib.parse import parse_qs
 
+logger = logging.getLogger(__name__)
+
+
+def ws_auth_setting(name, default):
+    return getattr(settings, 'WEBSOCKET_AUTH', {}).get(name, default)
+
+
+class SocketUser:
+    """
+    WebSocket scope'undaki kullanıcı - sadece kimlik bilgileri (id, username, is_active)
+    Bakiye vb. için veritabanından güncel kayıt okunmalı.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, is_active=True):
+        self.id = id
+        self.pk = id
+        self.username = username
+        self.is_active = is_active
+
+    def __str__(self):
+        return self.username
+
+
+class IdentityCache:
+    """
+    Boyut sınırlı TTL/LRU kullanıcı kimliği önbelleği (process içi)
+
+    Reconnect fırtınalarında handshake'in veritabanına gitmemesi için.
+    Kullanıcı kaydı değişince/silinince sinyallerle güncellenir (bkz. GameConfig.ready);
+    diğer worker'larda en fazla TTL kadar eski kalabilir.
+    """
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        # {user_id: (SocketUser, expires_at)}
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[0]
+
+    def set(self, user):
+        with self.lock:
+            self.entries[user.id] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user.id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+identity_cache = IdentityCache(
+    max_size=ws_auth_setting('USER_CACHE_SIZE', 10000),
+    ttl=ws_auth_setting('USER_CACHE_TTL', 300)
+)
+
+
+def refresh_identity(sender, instance, **kwargs):
+    """post_save: önbellekteki kimlik değiştiyse güncelle (bakiye kayıtları önbelleği boşaltmasın)"""
+    cached = identity_cache.get(instance.pk)
+    if cached is None:
+        return
+    if cached.username != instance.username or cached.is_active != instance.is_active:
+        identity_cache.set(SocketUser(instance.pk, instance.username, instance.is_active))
+
+
+def forget_identity(sender, instance, **kwargs):
+    """post_delete"""
+    identity_cache.invalidate(instance.pk)
+
 
 @database_sync_to_async
-def get_user(user_id):
+def load_identity(user_id):
     from django.contrib.auth import get_user_model
     User = get_user_model()
-    try:
-        return User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    row = User.objects.filter(id=user_id).values('id', 'username', 'is_active').first()
+    if row is None:
+        return None
+    return SocketUser(row['id'], row['username'], row['is_active'])
+
+
+async def get_user(user_id):
+    user = identity_cache.get(user_id)
+    if user is None:
+        user = await load_identity(user_id)
+        if user is None:
+            return AnonymousUser()
+        identity_cache.set(user)
+    if not user.is_active:
         return AnonymousUser()
+    return user
 
 
 class JWTAuthMiddleware(BaseMiddleware):
-    
+
     async def __call__(self, scope, receive, send):
         query_string = scope.get('query_string', b'').decode()
         params = parse_qs(query_string)
         token = params.get('token', [None])[0]
-        
+
         if token:
             try:
-                UntypedToken(token)
-                
-                decoded_data = jwt_decode(
-                    token, 
-                    settings.SECRET_KEY, 
-                    algorithms=["HS256"]
-                )
-                user_id = decoded_data.get('user_id')
-                
+                # Tek geçiş: imza, süre ve token tipi birlikte doğrulanır
+                access = AccessToken(token)
+                user_id = access[api_settings.USER_ID_CLAIM]
+
                 scope['user'] = await get_user(user_id)
-                print(f"✅ WebSocket Auth Başarılı: {scope['user'].username} (ID: {scope['user'].id})")
-                
-            except (InvalidToken, TokenError, KeyError) as e:
-                print(f"❌ WebSocket Auth Hatası: {str(e)}")
+                logger.debug("WebSocket auth başarılı user=%s", scope['user'].id)
+
+            except (TokenError, KeyError) as e:
+                logger.warning("WebSocket auth hatası: %s", e)
                 scope['user'] = AnonymousUser()
         else:
-            print("⚠️ WebSocket Token bulunamadı!")
+            logger.warning("WebSocket token bulunamadı")
             scope['user'] = AnonymousUser()
-        
-        return await super().__call__(scope, receive, send)
 
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,88 @@
+# Generated by Django 6.0 on 2026-10-17 11:18
+
+import django.db.models.deletion
+from datetime import datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_guesses(apps, schema_editor):
+    """GameSession.history JSON listesini GameGuess satırlarına taşı"""
+    GameSession = apps.get_model('game', 'GameSession')
+    GameGuess = apps.get_model('game', 'GameGuess')
+
+    batch = []
+    sessions = GameSession.objects.select_related('room__creator', 'room__player2').exclude(history=[])
+    for session in sessions.iterator(chunk_size=500):
+        players = {session.room.creator.username: session.room.creator_id}
+        if session.room.player2_id:
+            players[session.room.player2.username] = session.room.player2_id
+
+        for seq, entry in enumerate(session.history or [], 1):
+            try:
+                created_at = datetime.fromisoformat(entry.get('timestamp', ''))
+            except ValueError:
+                created_at = session.started_at
+            batch.append(GameGuess(
+                session_id=session.id,
+                seq=seq,
+                guess=entry.get('guess', 0),
+                guesser_id=players.get(entry.get('guesser')),
+                guesser_name=entry.get('guesser', '')[:150],
+                response=entry.get('response', '')[:255],
+                created_at=created_at
+            ))
+        if len(batch) >= 5000:
+            GameGuess.objects.bulk_create(batch)
+            batch = []
+    GameGuess.objects.bulk_create(batch)
+
+
+def restore_history(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    GameGuess = apps.get_model('game', 'GameGuess')
+
+    for session in GameSession.objects.iterator(chunk_size=500):
+        session.history = [
+            {
+                'guess': guess.guess,
+                'guesser': guess.guesser_name,
+                'response': guess.response,
+                'timestamp': guess.created_at.isoformat()
+            }
+            for guess in GameGuess.objects.filter(session_id=session.id).order_by('seq')
+        ]
+        session.save(update_fields=['history'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_scheduledtimer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameGuess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('guess', models.IntegerField()),
+                ('guesser_name', models.CharField(max_length=150)),
+                ('response', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('guesser', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='guesses', to='game.gamesession')),
+            ],
+            options={
+                'ordering': ['session', 'seq'],
+                'constraints': [models.UniqueConstraint(fields=('session', 'seq'), name='game_guess_session_seq')],
+            },
+        ),
+        migrations.RunPython(backfill_guesses, restore_history),
+        migrations.RemoveField(
+            model_name='gamesession',
+            name='history',
+        ),
+    ]
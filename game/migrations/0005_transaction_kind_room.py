@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+import re
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+ROOM_RE = re.compile(r"Oda #(\d+)")
+
+# (açıklama parçası, kind) - ilk eşleşen kazanır
+KIND_PATTERNS = (
+    ('bahis kilidi', 'LOCK'),
+    ('bahis iadesi', 'REFUND'),
+    ('kazancı', 'PAYOUT'),
+    ('Oyun Kazanıldı', 'PAYOUT'),
+    ('Oyun Kaybedildi', 'LOSS'),
+)
+
+
+def backfill_kind_and_room(apps, schema_editor):
+    """Mevcut kayıtların kind ve room alanlarını açıklamadan çıkar"""
+    Transaction = apps.get_model('game', 'Transaction')
+    Room = apps.get_model('game', 'Room')
+
+    batch = []
+    for tx in Transaction.objects.only('id', 'description').iterator(chunk_size=2000):
+        for pattern, kind in KIND_PATTERNS:
+            if pattern in tx.description:
+                tx.kind = kind
+                break
+        match = ROOM_RE.search(tx.description)
+        if match:
+            tx.room_id = int(match.group(1))
+        batch.append(tx)
+        if len(batch) >= 2000:
+            flush(Room, Transaction, batch)
+            batch = []
+    flush(Room, Transaction, batch)
+
+
+def flush(Room, Transaction, batch):
+    # Silinmiş odalara FK verme
+    room_ids = {tx.room_id for tx in batch if tx.room_id}
+    existing = set(Room.objects.filter(id__in=room_ids).values_list('id', flat=True))
+    for tx in batch:
+        if tx.room_id not in existing:
+            tx.room_id = None
+    Transaction.objects.bulk_update(batch, ['kind', 'room'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_gameguess'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='kind',
+            field=models.CharField(choices=[('LOCK', 'Bahis Kilidi'), ('REFUND', 'Bahis İadesi'), ('PAYOUT', 'Kazanç'), ('LOSS', 'Kayıp'), ('ADJUSTMENT', 'Düzeltme'), ('OTHER', 'Diğer')], default='OTHER', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='room',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='game.room'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['room', 'kind'], name='game_tx_room_kind'),
+        ),
+        migrations.RunPython(backfill_kind_and_room, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 11:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_transaction_kind_room'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(condition=models.Q(('status__in', ['OPEN', 'FULL'])), fields=['-created_at', '-id'], name='game_room_active_created'),
+        ),
+    ]
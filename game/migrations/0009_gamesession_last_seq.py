@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-17 13:44
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_last_seq(apps, schema_editor):
+    """Mevcut oturumların son seq'i GameGuess satırlarından"""
+    GameSession = apps.get_model('game', 'GameSession')
+    GameGuess = apps.get_model('game', 'GameGuess')
+
+    last = GameGuess.objects.filter(session_id=OuterRef('pk')).values('session_id').annotate(
+        last=Max('seq')
+    ).values('last')
+    GameSession.objects.update(last_seq=Coalesce(Subquery(last), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_archived_game'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='last_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_seq, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from .config import invalidate as invalidate_config
 
 User = settings.AUTH_USER_MODEL
 
@@ -18,6 +20,12 @@ class GlobalSettings(models.Model):
     def save(self, *args, **kwargs):
         self.pk = 1
         super().save(*args, **kwargs)
+        invalidate_config('global_settings')
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_config('global_settings')
+        return result
 
 class Room(models.Model):
     STATUS_CHOICES = (
@@ -33,11 +41,35 @@ class Room(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='OPEN')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Lobi listesi: sadece aktif odalar, keyset sıralamasıyla
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='game_room_active_created',
+                condition=models.Q(status__in=['OPEN', 'FULL'])
+            ),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.bet_amount} Point"
 
 class Transaction(models.Model):
+    KIND_CHOICES = (
+        ('LOCK', 'Bahis Kilidi'),
+        ('REFUND', 'Bahis İadesi'),
+        ('PAYOUT', 'Kazanç'),
+        ('LOSS', 'Kayıp'),
+        ('ADJUSTMENT', 'Düzeltme'),
+        ('OTHER', 'Diğer'),
+    )
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="transactions")
+    # Kısıtsız FK: oda arşivlenip silinince room_id hareket kaydında kalır (bkz. ArchivedGame)
+    room = models.ForeignKey(
+        'Room', on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="transactions"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='OTHER')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -47,16 +79,38 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['room', 'kind'], name='game_tx_room_kind'),
+            # Kullanıcı geçmişi: keyset sayfalama ve export sıralaması
+            models.Index(fields=['user', '-created_at', '-id'], name='game_tx_user_created'),
+        ]
+
+    @classmethod
+    def locked_stakes(cls, room_id):
+        """
+        Odada bahsi şu an kilitli olan kullanıcıların id'leri
+        Kullanıcının son LOCK/REFUND kaydı LOCK ise kilitlidir (iade sonrası yeni oyun tekrar kilitler).
+        Katılan oyuncunun bahsi join sırasında, kurucununki oyun başlarken kilitlenir;
+        eşleştirme odasında ikisi de oda kurulurken.
+        """
+        last_kinds = {}
+        rows = cls.objects.filter(
+            room_id=room_id, kind__in=['LOCK', 'REFUND']
+        ).order_by('id').values_list('user_id', 'kind')
+        for user_id, kind in rows:
+            last_kinds[user_id] = kind
+        return {user_id for user_id, kind in last_kinds.items() if kind == 'LOCK'}
 
 
 class GameSession(models.Model):
     room = models.OneToOneField(Room, on_delete=models.CASCADE, related_name="game_session")
     target_number = models.IntegerField()
     current_turn = models.ForeignKey(User, on_delete=models.CASCADE, related_name="current_games")
-    history = models.JSONField(default=list)
     started_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(null=True, blank=True)
     winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="won_games")
+    # Son tahminin sıra numarası (GameGuess.seq): tahmin oturum kilidi altında MAX(seq) sorgusuz eklenir
+    last_seq = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Game #{self.id} - Room: {self.room.name}"
@@ -78,7 +132,7 @@ class GameSession(models.Model):
     
     @property
     def turn_count(self):
-        return len(self.history) if self.history else 0
+        return self.guesses.count()
 
     @property
     def game_duration(self):
@@ -87,4 +141,69 @@ class GameSession(models.Model):
             minutes = int(delta.total_seconds() / 60)
             seconds = int(delta.total_seconds() % 60)
             return f"{minutes}:{seconds:02d}"
-        return "Devam ediyor"
\ No newline at end of file
+        return "Devam ediyor"
+
+class GameGuess(models.Model):
+    """
+    Oyun geçmişi: her tahmin tek satır (append-only)
+    (session, seq) üzerinden ucuz ekleme ve aralık okuma
+    """
+    session = models.ForeignKey(GameSession, on_delete=models.CASCADE, related_name="guesses")
+    seq = models.PositiveIntegerField()
+    guess = models.IntegerField()
+    guesser = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    guesser_name = models.CharField(max_length=150)
+    response = models.CharField(max_length=255)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['session', 'seq']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'seq'], name='game_guess_session_seq'),
+        ]
+
+    def __str__(self):
+        return f"Game #{self.session_id} #{self.seq}: {self.guesser_name} → {self.guess}"
+
+
+class ScheduledTimer(models.Model):
+    """
+    Kalıcı zamanlayıcı (ör. 30sn disconnect hükmen yenilgisi)
+    Her worker iptal edebilir; claimed_at koşullu güncelleme ile tek sefer tetiklenir.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=20)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="timers")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    fire_at = models.DateTimeField(db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} @ {self.fire_at} (Room #{self.room_id})"
+
+
+class ArchivedGame(models.Model):
+    """
+    Arşivlenmiş oyun: bitmiş oda + oturum + tahminler tek satırda (bkz. game/archive.py)
+    Sıcak tablolardan (Room, GameSession, GameGuess) taşınır; oda id'si korunur.
+    """
+    room_id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=50)
+    bet_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    creator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    player2 = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    winner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    target_number = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    # [[seq, guesser_id, guesser_name, guess, response, created_at], ...] - bkz. archive.GUESS_FIELDS
+    guesses = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Arşiv #{self.room_id} - {self.name}"
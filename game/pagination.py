@@ -0,0 +1,60 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    (created_at, id) üzerinde azalan keyset (cursor) sayfalama
+
+    GET ?cursor=<opak>&page_size=N - sonraki sayfanın cursor'ı X-Next-Cursor header'ında
+    OFFSET kullanılmaz: derin sayfalar da ilk sayfa kadar hızlıdır.
+    """
+    page_size = 20
+    max_page_size = 100
+
+    def __init__(self):
+        self.next_cursor = None
+
+    def encode_cursor(self, obj):
+        raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, value):
+        try:
+            created_at, pk = urlsafe_b64decode(value.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError):
+            created_at = None
+        if created_at is None:
+            raise ValidationError({"error": "Geçersiz cursor"})
+        return created_at, pk
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            raise ValidationError({"error": "page_size sayı olmalı"})
+        return min(max(1, size), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        size = self.get_page_size(request)
+        queryset = queryset.order_by('-created_at', '-id')
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        rows = list(queryset[:size + 1])
+        self.next_cursor = self.encode_cursor(rows[size - 1]) if len(rows) > size else None
+        return rows[:size]
+
+    def get_paginated_response(self, data):
+        response = Response(data)
+        if self.next_cursor:
+            response['X-Next-Cursor'] = self.next_cursor
+        return response
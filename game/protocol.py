@@ -0,0 +1,201 @@
+import itertools
+import json
+import uuid
+import cbor2
+import msgpack
+from .metrics import Counter, gauges
+
+# WebSocket alt protokolleri (Sec-WebSocket-Protocol)
+JSON = 'numberduel.json.v1'
+MSGPACK = 'numberduel.msgpack.v1'
+CBOR = 'numberduel.cbor.v1'
+
+# İkili protokollerde kısa anahtarlar (iç içe sözlüklere ve sözlük listelerine de uygulanır)
+KEYS = {
+    'event': 'e',
+    'turn': 't',
+    'turn_name': 'tn',
+    'last_guess': 'g',
+    'guesser_id': 'gi',
+    'guesser_name': 'gn',
+    'winner_id': 'w',
+    'reason': 'r',
+    'hint': 'h',
+    'balances': 'b',
+    'creator': 'c',
+    'player2': 'p',
+    'user_id': 'u',
+    'current': 'cu',
+    'start': 's',
+    'bet': 'bt',
+    'error': 'x',
+    'seq': 'q',
+    'deltas': 'd',
+    'guesses': 'gs',
+    'guess': 'gv',
+    'players': 'pl',
+    'status': 'st',
+    'room_id': 'ri',
+    'username': 'un',
+    'id': 'i',
+    'event_seq': 'es',
+    'time_left': 'tl',
+}
+LONG_KEYS = {short: key for key, short in KEYS.items()}
+
+# Değeri tamsayı koda çevrilen alanlar
+CODES = {
+    'event': {'START': 1, 'CONTINUE': 2, 'WINNER': 3, 'SNAPSHOT': 4, 'DELTA': 5, 'TIMEOUT': 6},
+    'reason': {'normal': 1, 'disconnect': 2, 'manual_leave': 3, 'timeout': 4},
+    'hint': {'UP': 1, 'DOWN': -1},
+}
+NAMES = {key: {code: name for name, code in codes.items()} for key, codes in CODES.items()}
+
+# Yayın kimliği (bkz. broadcast_message) - istemciye gönderilmez
+BROADCAST_ID = 'frame_id'
+
+# İstemcinin event/reason/hint'ten kendisinin üretebileceği alanlar: ikili protokolde gönderilmez
+DROPPED = ('type', 'message', BROADCAST_ID)
+
+
+def compact(message):
+    """
+    Kanal mesajını ikili protokol gövdesine çevir
+    Kısa anahtarlar, tamsayı kodlar; None değerler ve Türkçe metin gönderilmez
+    (hata mesajları hariç: 'x' anahtarıyla metin olarak kalır).
+    """
+    body = {}
+    for key, value in message.items():
+        if value is None or key in DROPPED:
+            continue
+        if key in CODES:
+            value = CODES[key].get(value, value)
+        elif isinstance(value, dict):
+            value = compact(value)
+        elif isinstance(value, list):
+            value = [compact(item) if isinstance(item, dict) else item for item in value]
+        body[KEYS.get(key, key)] = value
+    return body
+
+
+def expand(body):
+    """compact() tersi (istemci/test tarafı) - atlanan metinler geri gelmez"""
+    message = {}
+    for short, value in body.items():
+        key = LONG_KEYS.get(short, short)
+        if key in NAMES:
+            value = NAMES[key].get(value, value)
+        elif isinstance(value, dict):
+            value = expand(value)
+        elif isinstance(value, list):
+            value = [expand(item) if isinstance(item, dict) else item for item in value]
+        message[key] = value
+    return message
+
+
+class JsonCodec:
+    """Varsayılan: mesajlar olduğu gibi JSON metin çerçevesi olarak gider"""
+    subprotocol = JSON
+    binary = False
+
+    def encode(self, message):
+        return json.dumps(message)
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    subprotocol = MSGPACK
+    binary = True
+
+    def encode(self, message):
+        return msgpack.packb(compact(message), use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+class CborCodec:
+    subprotocol = CBOR
+    binary = True
+
+    def encode(self, message):
+        return cbor2.dumps(compact(message))
+
+    def decode(self, data):
+        return cbor2.loads(data)
+
+
+CODECS = {codec.subprotocol: codec for codec in (MsgpackCodec(), CborCodec(), JsonCodec())}
+DEFAULT_CODEC = CODECS[JSON]
+
+
+def negotiate(scope):
+    """
+    Handshake'te istemcinin önerdiği alt protokollerden desteklenen ilkini seç
+    Dönüş: (codec, accept'e verilecek alt protokol veya None)
+    Alt protokol önermeyen istemciler JSON ile devam eder.
+    """
+    for subprotocol in scope.get('subprotocols') or ():
+        codec = CODECS.get(subprotocol)
+        if codec is not None:
+            return codec, subprotocol
+    return DEFAULT_CODEC, None
+
+
+def frame(codec, message):
+    """self.send(**frame(...)) için"""
+    data = codec.encode(message)
+    if codec.binary:
+        return {'bytes_data': data}
+    return {'text_data': data}
+
+
+frames_encoded = Counter('numberduel_frames_encoded_total', 'Kodlanan yayın çerçevesi')
+gauges.append(frames_encoded)
+
+# Yayın kimliği: process öneki + sayaç (process'ler arası çakışmaz)
+BROADCAST_PREFIX = uuid.uuid4().hex[:8]
+broadcast_ids = itertools.count()
+
+
+def broadcast_message(message):
+    """group_send öncesi: yayına kimlik ekle (bkz. FrameCache)"""
+    return {**message, BROADCAST_ID: f'{BROADCAST_PREFIX}:{next(broadcast_ids)}'}
+
+
+class FrameCache:
+    """
+    Yayın başına kodlanmış çerçeveler (process içi)
+
+    Bir yayını alan yerel soketlerin her biri aynı mesajı kendisi kodlamaz:
+    her alt protokol için ilk soket kodlar, diğerleri aynı değişmez str/bytes çerçeveyi gönderir.
+    Kodlama maliyeti oda üye sayısıyla değil, yayın ve kullanılan protokol sayısıyla artar.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        # {(yayın kimliği, alt protokol): send() argümanları}
+        # İki nesil: yeni dolunca eskisi atılır (tek tek silmekten ucuz)
+        self.frames = {}
+        self.previous = {}
+
+    def frame(self, codec, message):
+        broadcast_id = message.get(BROADCAST_ID)
+        if broadcast_id is None:
+            return frame(codec, message)
+        key = (broadcast_id, codec.subprotocol)
+        cached = self.frames.get(key) or self.previous.get(key)
+        if cached is not None:
+            return cached
+        body = message.copy()
+        del body[BROADCAST_ID]
+        cached = self.frames[key] = frame(codec, body)
+        frames_encoded.inc()
+        if len(self.frames) >= self.max_size:
+            self.previous, self.frames = self.frames, {}
+        return cached
+
+
+frame_cache = FrameCache()
@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict, deque
+from urllib.parse import parse_qs
+from django.conf import settings
+from .metrics import Counter, gauges
+from .protocol import BROADCAST_PREFIX
+
+# Oda yayınlarının imleci "<epoch>-<sıra>" (istemci yeniden bağlanırken ?since=<event_seq> gönderir)
+EVENT_SEQ = 'event_seq'
+
+replays = Counter('numberduel_replays_total', 'Kaçırılan olaylar tekrar gönderilerek devam eden bağlantı')
+replay_snapshots = Counter('numberduel_replay_snapshots_total', 'Tam durum (SNAPSHOT) ile devam eden bağlantı')
+gauges.extend([replays, replay_snapshots])
+
+
+def replay_setting(name, default):
+    return getattr(settings, 'REPLAY', {}).get(name, default)
+
+
+def parse_since(scope):
+    """Handshake query string'inden since imleci (ham) - yoksa None"""
+    values = parse_qs(scope.get('query_string', b'').decode()).get('since')
+    return values[0] if values else None
+
+
+class RoomLog:
+    """Bir odanın son BUFFER_SIZE yayını (halka tampon) - (sıra, mesaj) çiftleri"""
+
+    __slots__ = ('last_seq', 'events', 'touched')
+
+    def __init__(self, size, start=0):
+        self.last_seq = start
+        self.events = deque(maxlen=size)
+        self.touched = time.monotonic()
+
+    def replay(self, since):
+        """
+        since'ten sonraki olaylar
+        Dönüş: liste (boş olabilir) veya None - boşluk tampondan büyükse ya da imleç bu günlüğe ait değilse
+        """
+        if since > self.last_seq:
+            return None
+        first_seq = self.events[0][0] if self.events else self.last_seq + 1
+        if since < first_seq - 1:
+            return None
+        return [event for seq, event in self.events if seq > since]
+
+
+class EventLog:
+    """
+    Process başına oda olay günlüğü
+
+    Her oda yayını bir imleç (event_seq = "<epoch>-<sıra>") alır ve odanın halka tamponuna yazılır.
+    Yeniden bağlanan oyuncuya sadece kaçırdığı olaylar gönderilir; boşluk tampondan büyükse
+    çağıran tam durum (SNAPSHOT) gönderir.
+
+    Sıra numarası process'in kendi sayacıdır; epoch process başına tekildir (BROADCAST_PREFIX).
+    Başka bir worker'ın veya restart öncesi process'in imleci bu günlükte karşılık bulmaz: SNAPSHOT.
+    Günlük, odanın tüm yayınlarını gördüğü sürece geçerlidir: başka bir process'in yayını
+    görüldüğünde (observe) veya odada yerel soket kalmadığında (drop) atılır.
+
+    TTL boyunca yayın yapmayan odaların (bitmiş oyunlar) günlüğü atılır. Yeniden açılan günlük
+    atılanların en büyük numarasından devam eder: eski bir imleç yanlış olayları almaz, SNAPSHOT alır.
+    """
+
+    def __init__(self, epoch=BROADCAST_PREFIX):
+        self.epoch = epoch
+        self.prefix = f'{epoch}-'
+        # {room_id: RoomLog} - son yayın sırasına göre (en eski başta)
+        self.rooms = OrderedDict()
+        # Atılan günlüklerin en büyük sıra numarası
+        self.floor = 0
+
+    def cursor(self, seq):
+        return f'{self.prefix}{seq}'
+
+    def parse(self, cursor):
+        """İmlecin sıra numarası - başka bir process'e (epoch) aitse veya geçersizse None"""
+        if not cursor.startswith(self.prefix):
+            return None
+        try:
+            return int(cursor[len(self.prefix):])
+        except ValueError:
+            return None
+
+    def expire(self, now):
+        """TTL'i dolan veya MAX_ROOMS'u aşan en eski günlükleri at"""
+        ttl = replay_setting('TTL', 600)
+        max_rooms = replay_setting('MAX_ROOMS', 10000)
+        while self.rooms:
+            log = next(iter(self.rooms.values()))
+            if len(self.rooms) <= max_rooms and log.touched >= now - ttl:
+                return
+            self.floor = max(self.floor, log.last_seq)
+            self.rooms.popitem(last=False)
+
+    def drop(self, room_id):
+        """Odanın günlüğünü at: eldeki imleçler SNAPSHOT alır"""
+        log = self.rooms.pop(int(room_id), None)
+        if log is not None:
+            # +1: yeni günlük eski imleçten devam edemez (aradaki olaylar bu process'te yok)
+            self.floor = max(self.floor, log.last_seq + 1)
+
+    def observe(self, room_id, message):
+        """Gruptan gelen yayın başka bir process'te numaralandıysa günlükte boşluk var: at"""
+        if not message[EVENT_SEQ].startswith(self.prefix):
+            self.drop(room_id)
+
+    def record(self, room_id, message):
+        """Yayına imleç ekle ve tampona yaz - Dönüş: numaralı mesaj"""
+        room_id = int(room_id)
+        now = time.monotonic()
+        log = self.rooms.get(room_id)
+        if log is None:
+            self.expire(now)
+            log = self.rooms[room_id] = RoomLog(replay_setting('BUFFER_SIZE', 64), start=self.floor)
+        else:
+            self.rooms.move_to_end(room_id)
+            log.touched = now
+            self.expire(now)
+        log.last_seq += 1
+        message = {**message, EVENT_SEQ: self.cursor(log.last_seq)}
+        log.events.append((log.last_seq, message))
+        return message
+
+    def last_seq(self, room_id):
+        """SNAPSHOT'a yazılacak imleç: günlük yoksa yeni günlük bundan sonrasını numaralar"""
+        log = self.rooms.get(int(room_id))
+        return self.cursor(log.last_seq if log is not None else self.floor)
+
+    def events(self, room_id):
+        log = self.rooms.get(int(room_id))
+        return [event for _, event in log.events] if log is not None else []
+
+    def replay(self, room_id, since):
+        """since imlecinden sonraki olaylar - None: SNAPSHOT gönderilmeli"""
+        log = self.rooms.get(int(room_id))
+        seq = self.parse(since)
+        if log is None or seq is None:
+            return None
+        return log.replay(seq)
+
+
+event_log = EventLog()
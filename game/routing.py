@@ -3,4 +3,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/game/(?P<room_id>\d+)/$', consumers.GameConsumer.as_asgi()),
+    re_path(r'ws/matchmaking/$', consumers.MatchmakingConsumer.as_asgi()),
+    re_path(r'ws/lobby/$', consumers.LobbyConsumer.as_asgi()),
 ]
\ No newline at end of file
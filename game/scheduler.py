@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import timedelta
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import ScheduledTimer
+
+logger = logging.getLogger(__name__)
+
+
+def scheduler_setting(name, default):
+    return getattr(settings, 'GAME_SCHEDULER', {}).get(name, default)
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel
+
+    Binlerce zamanlayıcı tek bir tick döngüsü ile izlenir:
+    ekleme/silme O(1), her tick sadece bir slot taranır.
+    """
+
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        # {key: slot_index}
+        self.index = {}
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def add(self, key, delay, value=None):
+        self.remove(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.cursor + ticks) % len(self.slots)
+        rounds = (ticks - 1) // len(self.slots)
+        self.slots[slot][key] = [rounds, value]
+        self.index[key] = slot
+
+    def remove(self, key):
+        slot = self.index.pop(key, None)
+        if slot is None:
+            return None
+        return self.slots[slot].pop(key)[1]
+
+    def get(self, key):
+        """Anahtarın değeri, yoksa None"""
+        slot = self.index.get(key)
+        if slot is None:
+            return None
+        return self.slots[slot][key][1]
+
+    def remaining(self, key):
+        """Kalan süre (saniye), yoksa None"""
+        slot = self.index.get(key)
+        if slot is None:
+            return None
+        rounds = self.slots[slot][key][0]
+        # add ile aynı yuvarlama: imleç slotun üzerindeyse slot bir tam tur sonra taranır (1..slots)
+        ticks = (slot - self.cursor - 1) % len(self.slots) + 1 + rounds * len(self.slots)
+        return ticks * self.tick
+
+    def advance(self):
+        """Bir tick ilerle, süresi dolan (key, value) çiftlerini döndür"""
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        bucket = self.slots[self.cursor]
+        due = []
+        for key, entry in list(bucket.items()):
+            if entry[0] > 0:
+                entry[0] -= 1
+            else:
+                del bucket[key]
+                del self.index[key]
+                due.append((key, entry[1]))
+        return due
+
+
+class LocalTimer:
+    """
+    Veritabanına yazılmayan, sadece bu process'in wheel'inde tutulan zamanlayıcı
+    Handler'a ScheduledTimer yerine verilir (kind, key, room_id, user_id + ek alanlar)
+    """
+
+    def __init__(self, kind, key, room_id, user_id=None, **data):
+        self.kind = kind
+        self.key = key
+        self.room_id = room_id
+        self.user_id = user_id
+        self.__dict__.update(data)
+
+
+class TimerScheduler:
+    """
+    Kalıcı, cluster genelinde zamanlayıcı
+
+    - Zamanlayıcılar ScheduledTimer tablosunda tutulur (restart'ta kaybolmaz)
+    - Her process kendi zamanlayıcılarını tek bir TimingWheel ile izler
+    - İptal herhangi bir worker'dan yapılabilir (satır silinir)
+    - Tetikleme, claimed_at koşullu güncellemesi ile tek worker'a düşer;
+      periyodik tarama başka process'te kalmış / yarım kalmış zamanlayıcıları toplar
+
+    Sık yeniden kurulan kısa zamanlayıcılar (sıra süresi) schedule_local ile aynı wheel'e
+    yazılır: veritabanına gitmez, process restart'ında kaybolur. Handler tetiklendiğinde
+    durumun hâlâ geçerli olduğunu kendisi doğrulamalıdır.
+    """
+
+    def __init__(self):
+        self.wheel = TimingWheel(
+            tick=scheduler_setting('TICK', 1.0),
+            slots=scheduler_setting('SLOTS', 512)
+        )
+        self.handlers = {}
+        self.runner = None
+        self.loop = None
+
+    def register(self, kind, handler):
+        """handler: async def handler(timer) - timer bir ScheduledTimer veya LocalTimer"""
+        self.handlers[kind] = handler
+
+    def ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self.runner is None or self.runner.done() or self.loop is not loop:
+            self.loop = loop
+            self.runner = loop.create_task(self.run())
+
+    async def start(self):
+        """Sunucu açılışında: restart'tan kalan zamanlayıcılar ilk bağlantıyı beklemeden taranır"""
+        self.ensure_started()
+
+    async def stop(self):
+        if self.runner is not None and not self.runner.done():
+            self.runner.cancel()
+            try:
+                await self.runner
+            except asyncio.CancelledError:
+                pass
+        self.runner = None
+
+    @property
+    def pending(self):
+        return len(self.wheel)
+
+    async def schedule(self, kind, key, delay, room_id, user_id=None):
+        self.ensure_started()
+        await self.store(kind, key, delay, room_id, user_id)
+        # +1 tick: wheel, veritabanındaki fire_at'ten önce tetiklenmesin
+        self.wheel.add(key, delay + self.wheel.tick)
+
+    def schedule_sync(self, kind, key, delay, room_id, user_id=None):
+        """
+        Senkron kod (HTTP view) için: sadece satır yazılır (çağıranın transaction'ında),
+        periyodik tarama tetikler - en fazla SWEEP_INTERVAL gecikmeyle
+        """
+        self.write(kind, key, delay, room_id, user_id)
+
+    async def cancel(self, key):
+        self.ensure_started()
+        self.wheel.remove(key)
+        return await self.delete(key)
+
+    def schedule_local(self, kind, key, delay, room_id, user_id=None, **data):
+        """Aynı anahtarla kurulu zamanlayıcının yerine geçer - delay dolmadan tetiklenmez (en fazla 1 tick geç)"""
+        self.ensure_started()
+        # +1 tick: süren tick'in geçen kısmı yüzünden erken tetiklenmesin
+        self.wheel.add(key, delay + self.wheel.tick, LocalTimer(kind, key, room_id, user_id, **data))
+
+    def cancel_local(self, key):
+        self.wheel.remove(key)
+
+    def local(self, key):
+        """Kurulu yerel zamanlayıcı, yoksa None"""
+        return self.wheel.get(key)
+
+    def remaining(self, key):
+        """Yerel zamanlayıcının kalan süresi (saniye, schedule_local'daki ek tick hariç), yoksa None"""
+        remaining = self.wheel.remaining(key)
+        return None if remaining is None else max(0, remaining - self.wheel.tick)
+
+    async def run(self):
+        sweep_every = max(1, int(scheduler_setting('SWEEP_INTERVAL', 5) / self.wheel.tick))
+        ticks = 0
+        next_tick = time.monotonic()
+        while True:
+            next_tick += self.wheel.tick
+            await asyncio.sleep(max(0, next_tick - time.monotonic()))
+            ticks += 1
+            try:
+                due = self.wheel.advance()
+                # Yerel zamanlayıcılar veritabanı beklemeden, aynı tick'tekiler birlikte
+                local = [timer for _, timer in due if timer is not None]
+                if local:
+                    await asyncio.gather(*(self.fire_local(timer) for timer in local))
+                for key, timer in due:
+                    if timer is None:
+                        await self.fire(key)
+                if ticks % sweep_every == 0:
+                    for key in await self.due_keys():
+                        self.wheel.remove(key)
+                        await self.fire(key)
+            except Exception:
+                logger.exception("Scheduler hatası")
+
+    async def fire(self, key):
+        timer = await self.claim(key)
+        if timer is None:
+            # İptal edilmiş veya başka bir worker tarafından alınmış
+            return
+        handler = self.handlers.get(timer.kind)
+        try:
+            if handler is not None:
+                await handler(timer)
+            await self.delete(key)
+        except Exception:
+            # Satır silinmedi: kira süresi dolunca tarama tekrar dener
+            logger.exception("Zamanlayıcı çalıştırılamadı key=%s", key)
+
+    async def fire_local(self, timer):
+        handler = self.handlers.get(timer.kind)
+        if handler is None:
+            return
+        try:
+            await handler(timer)
+        except Exception:
+            logger.exception("Zamanlayıcı çalıştırılamadı key=%s", timer.key)
+
+    @database_sync_to_async
+    def store(self, kind, key, delay, room_id, user_id):
+        self.write(kind, key, delay, room_id, user_id)
+
+    def write(self, kind, key, delay, room_id, user_id):
+        ScheduledTimer.objects.update_or_create(
+            key=key,
+            defaults={
+                'kind': kind,
+                'room_id': room_id,
+                'user_id': user_id,
+                'fire_at': timezone.now() + timedelta(seconds=delay),
+                'claimed_at': None
+            }
+        )
+
+    @database_sync_to_async
+    def delete(self, key):
+        deleted, _ = ScheduledTimer.objects.filter(key=key).delete()
+        return deleted > 0
+
+    def claimable(self, now):
+        lease = timedelta(seconds=scheduler_setting('CLAIM_LEASE', 60))
+        return Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - lease)
+
+    @database_sync_to_async
+    def claim(self, key):
+        """Koşullu UPDATE: sadece bir worker 1 satır günceller"""
+        now = timezone.now()
+        claimed = ScheduledTimer.objects.filter(self.claimable(now), key=key, fire_at__lte=now).update(claimed_at=now)
+        if not claimed:
+            return None
+        return ScheduledTimer.objects.filter(key=key).first()
+
+    @database_sync_to_async
+    def due_keys(self):
+        now = timezone.now()
+        return list(
+            ScheduledTimer.objects.filter(self.claimable(now), fire_at__lte=now)
+            .order_by('fire_at')
+            .values_list('key', flat=True)[:scheduler_setting('SWEEP_BATCH_SIZE', 500)]
+        )
+
+
+scheduler = TimerScheduler()
+
+
+class SchedulerLifespan:
+    """
+    ASGI sarmalayıcısı: zamanlayıcıyı sunucu açılışında başlatır, kapanışta durdurur
+
+    lifespan destekleyen sunucularda (uvicorn, hypercorn) lifespan.startup ile başlar.
+    Desteklemeyenlerde (daphne) ilk HTTP/WebSocket isteğinde başlar - load balancer
+    sağlık kontrolü sunucu açılır açılmaz tetikler.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        scheduler.ensure_started()
+        return await self.application(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await scheduler.start()
+                except Exception as e:
+                    logger.exception("Zamanlayıcı başlatılamadı")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await scheduler.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Room, GlobalSettings, Transaction
+from .config import global_settings
+from .models import Room, Transaction
 
 
 class RoomSerializer(serializers.ModelSerializer):
@@ -12,13 +13,14 @@ class RoomSerializer(serializers.ModelSerializer):
         read_only_fields = ['creator_name', 'player_count', 'status', 'created_at']
 
     def get_player_count(self, obj):
+        # player2_id: ikinci oyuncu kaydını yüklemeden
         count = 1
-        if obj.player2:
+        if obj.player2_id:
             count += 1
         return count
 
     def validate_bet_amount(self, value):
-        config = GlobalSettings.objects.get_or_create(pk=1)[0]
+        config = global_settings.get()
         
         if value < config.min_bet or value > config.max_bet:
             raise serializers.ValidationError(
@@ -35,4 +37,4 @@ class RoomSerializer(serializers.ModelSerializer):
 class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
-        fields = ['id', 'amount', 'description', 'created_at']
\ No newline at end of file
+        fields = ['id', 'kind', 'amount', 'description', 'created_at']
\ No newline at end of file
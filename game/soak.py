@@ -0,0 +1,251 @@
+import asyncio
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from .bench import RECEIVE_TIMEOUT, create_rooms, play_room
+from .consumers import active_rooms
+from .engine import engine
+from .lobby import hub as lobby_hub
+from .matchmaking import queue as match_queue
+from .metrics import open_sockets
+from .middleware import identity_cache
+from .protocol import CODECS, JSON, frame_cache
+from .replay import event_log, replay_setting
+from .scheduler import scheduler
+from .spectators import hub as spectator_hub
+
+# Uzun çalışmada büyümemesi gereken yapılar (1000 oyun başına artış eşiğe göre kontrol edilir)
+TRACKED = (
+    'tasks', 'open_sockets', 'active_rooms', 'engine_rooms', 'engine_dirty', 'pending_timers',
+    'layer_groups', 'layer_group_members', 'layer_channels', 'lobby_clients', 'spectator_rooms',
+    'matchmaking_queue',
+)
+
+# Boyut/süre sınırlı önbellekler: sadece raporlanır (REPLAY['TTL'] dolana kadar replay_rooms büyür)
+BOUNDED = ('frame_cache', 'identity_cache', 'replay_rooms')
+
+
+def soak_setting(name, default):
+    return getattr(settings, 'SOAK', {}).get(name, default)
+
+
+def rss_kb():
+    """Process'in güncel RSS'i (KB) - /proc yoksa tepe değer"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def live_objects():
+    """Process içi durum: bağlantılar kapandıktan sonra sabit kalmalı"""
+    layer = get_channel_layer()
+    groups = getattr(layer, 'groups', {})
+    return {
+        'tasks': len(asyncio.all_tasks()),
+        'open_sockets': open_sockets.value,
+        'active_rooms': len(active_rooms),
+        'engine_rooms': len(getattr(engine, 'rooms', ())),
+        'engine_dirty': len(getattr(engine, 'dirty', ())),
+        'pending_timers': scheduler.pending,
+        'layer_groups': len(groups),
+        'layer_group_members': sum(len(members) for members in groups.values()),
+        'layer_channels': len(getattr(layer, 'channels', {})),
+        'lobby_clients': len(lobby_hub.clients),
+        'spectator_rooms': len(spectator_hub.watches),
+        'replay_rooms': len(event_log.rooms),
+        'matchmaking_queue': len(match_queue),
+        'frame_cache': len(frame_cache.frames) + len(frame_cache.previous),
+        'identity_cache': len(identity_cache.entries),
+    }
+
+
+def top_allocators(baseline, limit):
+    """baseline'dan bu yana en çok büyüyen tracemalloc satırları"""
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+    return [
+        f'{stat.traceback[0].filename}:{stat.traceback[0].lineno} +{stat.size_diff // 1024}KB +{stat.count_diff}'
+        for stat in snapshot.compare_to(baseline, 'lineno')[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+def growth_per_1k(samples, name):
+    """Isınmadan sonraki örneklerde en küçük kareler eğimi × 1000 oyun"""
+    points = [(sample['games'], sample[name]) for sample in samples]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+    return round(slope * 1000, 2)
+
+
+@database_sync_to_async
+def delete_players(prefix):
+    """Biten partinin kullanıcıları (odalar, hareketler, oyunlar CASCADE) - veritabanı büyümesi ölçüme girmesin"""
+    get_user_model().objects.filter(username__startswith=prefix).delete()
+
+
+def watcher_tokens(room_list, index, spectators):
+    """İzleyiciler sonraki odaların kurucuları (kendi odasının oyuncusu olmayan kullanıcılar)"""
+    others = [room_list[(index + step) % len(room_list)] for step in range(1, len(room_list))]
+    return [players[0][1] for _, players in others[:spectators]]
+
+
+async def watch_room(application, room_id, token, codec):
+    """Oyun boyunca bağlı kalan izleyici (izleyici hub'ına giriş/çıkış da her oyunda tekrarlanır)"""
+    subprotocols = [codec.subprotocol] if codec.binary else None
+    socket = WebsocketCommunicator(application, f'/ws/game/{room_id}/?token={token}', subprotocols=subprotocols)
+    connected, _ = await socket.connect(RECEIVE_TIMEOUT)
+    if not connected:
+        raise RuntimeError(f'İzleyici reddedildi: room={room_id}')
+    return socket
+
+
+async def run_soak(application, games=None, duration=None, concurrency=20, disconnect_rate=0.1, spectators=1,
+                   sample_every=500, warmup=500, bet_amount=10, seed=None, protocol=JSON, top=10, trace=True,
+                   thresholds=None, on_sample=None):
+    """
+    Bağlantıları sürekli açıp kapatarak oyun oynat, periyodik olarak bellek ve process içi durumu ölç
+
+    games ve/veya duration (saniye) dolunca durur. Her sample_every oyunda örnek alınır; warmup
+    oyundan sonraki örneklerden 1000 oyun başına artış hesaplanır ve eşikle karşılaştırılır
+    (tracemalloc açıkken RSS sadece raporlanır). Olay günlüğü REPLAY['TTL'] boyunca büyüdüğü için
+    ölçüm en erken o süre dolunca başlar.
+    on_sample(sample): her örnekte çağrılır (ilerleme çıktısı için).
+    Dönüş: sonuç sözlüğü - 'failures' boş değilse çalışma başarısız
+    """
+    if games is None and duration is None:
+        raise ValueError('games veya duration gerekli')
+    thresholds = {
+        'rss_kb': soak_setting('MAX_RSS_KB_PER_1K', 8192),
+        'traced_kb': soak_setting('MAX_TRACED_KB_PER_1K', 2048),
+        'objects': soak_setting('MAX_OBJECTS_PER_1K', 5),
+        **(thresholds or {}),
+    }
+    rng = random.Random(seed)
+    codec = CODECS[protocol]
+    stats = {
+        'latencies': [], 'guesses': 0, 'reconnects': 0, 'errors': [],
+        'bytes_received': 0, 'messages_received': 0,
+    }
+    batch_size = concurrency * 5
+    # Süre sınırlı önbellekler dolana kadar büyüme beklenir
+    warmup_s = replay_setting('TTL', 600)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def play(room_id, players, tokens):
+        async with semaphore:
+            watchers = []
+            try:
+                for token in tokens:
+                    watchers.append(await watch_room(application, room_id, token, codec))
+                await play_room(application, room_id, players, rng, disconnect_rate, stats, codec)
+            except Exception as e:
+                stats['errors'].append(f'room={room_id}: {e!r}')
+            finally:
+                for watcher in watchers:
+                    await watcher.disconnect(timeout=RECEIVE_TIMEOUT)
+
+    if trace:
+        tracemalloc.start()
+    baseline = None
+    samples = []
+    played = batches = 0
+    next_sample = sample_every
+    started = time.perf_counter()
+    try:
+        while (games is None or played < games) and (duration is None or time.perf_counter() - started < duration):
+            count = batch_size if games is None else min(batch_size, games - played)
+            prefix = f'soak{int(time.time() * 1000)}_{batches}_'
+            room_list = await create_rooms(count, bet_amount, prefix)
+            await asyncio.gather(*(
+                play(room_id, players, watcher_tokens(room_list, index, spectators))
+                for index, (room_id, players) in enumerate(room_list)
+            ))
+            await delete_players(prefix)
+            played += count
+            batches += 1
+            if played < next_sample:
+                continue
+            next_sample += sample_every
+
+            # Gecikmeli temizlikler (lobi/izleyici tick'leri, group_discard) bitsin
+            await asyncio.sleep(soak_setting('SETTLE', 1.0))
+            gc.collect()
+            sample = {
+                'games': played,
+                'elapsed_s': round(time.perf_counter() - started, 1),
+                'errors': len(stats['errors']),
+                'rss_kb': rss_kb(),
+                'traced_kb': tracemalloc.get_traced_memory()[0] // 1024 if trace else None,
+                **live_objects(),
+            }
+            if trace and baseline is not None:
+                sample['top'] = top_allocators(baseline, top)
+            sample['measured'] = played >= warmup and sample['elapsed_s'] >= warmup_s
+            if trace and baseline is None and sample['measured']:
+                baseline = tracemalloc.take_snapshot()
+            samples.append(sample)
+            if on_sample is not None:
+                on_sample(sample)
+    finally:
+        if trace:
+            tracemalloc.stop()
+
+    measured = [sample for sample in samples if sample['measured']]
+    names = ('rss_kb', 'traced_kb') + TRACKED if trace else ('rss_kb',) + TRACKED
+    growth = {name: growth_per_1k(measured, name) for name in names}
+    failures = []
+    for name, value in growth.items():
+        if trace and name == 'rss_kb':
+            # tracemalloc'un kendi kayıtları ve snapshot'lar RSS'e girer: traced_kb kontrol edilir
+            continue
+        limit = thresholds.get(name, thresholds['objects'])
+        if value is not None and value > limit:
+            failures.append(f'{name}: +{value}/1000 oyun (eşik {limit})')
+    if stats['errors']:
+        failures.append(f"{len(stats['errors'])} oyun hata ile bitti")
+    if len(measured) < 2:
+        failures.append(
+            f'Isınmadan sonra yeterli örnek yok ({len(measured)}, ısınma {warmup} oyun ve {warmup_s} sn): '
+            '--games/--duration artırın'
+        )
+
+    return {
+        'protocol': protocol,
+        'games': played,
+        'duration_s': round(time.perf_counter() - started, 1),
+        'concurrency': concurrency,
+        'disconnect_rate': disconnect_rate,
+        'spectators': spectators,
+        'reconnects': stats['reconnects'],
+        'guesses': stats['guesses'],
+        'errors': stats['errors'][:20],
+        'warmup': warmup,
+        'warmup_s': warmup_s,
+        'thresholds': thresholds,
+        'growth_per_1k_games': growth,
+        'bounded': {name: samples[-1][name] for name in BOUNDED} if samples else {},
+        'failures': failures,
+        'samples': samples,
+    }
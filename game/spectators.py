@@ -0,0 +1,251 @@
+import asyncio
+import logging
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .engine import engine
+from .models import GameGuess, GameSession, Room
+from .protocol import frame
+
+logger = logging.getLogger(__name__)
+
+SPECTATOR_GROUP = 'spectate_{}'
+
+# Oyuncu yayınından izleyicilere giden alanlar (hedef sayı, bakiye ve metinler gitmez)
+DELTA_FIELDS = ('event', 'seq', 'last_guess', 'guesser_id', 'hint', 'turn', 'winner_id', 'reason', 'time_left')
+
+
+def spectator_setting(name, default):
+    return getattr(settings, 'SPECTATORS', {}).get(name, default)
+
+
+def spectator_delta(message):
+    return {key: message[key] for key in DELTA_FIELDS if message.get(key) is not None}
+
+
+async def publish_spectator(room_id, message):
+    """Oda yayınını izleyici aboneliklerine ilet (process başına tek mesaj, bkz. SpectatorHub)"""
+    await get_channel_layer().group_send(
+        SPECTATOR_GROUP.format(room_id),
+        {'type': 'spectator.delta', 'delta': spectator_delta(message)}
+    )
+
+
+def guess_hint(guess, target_number):
+    if guess < target_number:
+        return 'UP'
+    if guess > target_number:
+        return 'DOWN'
+    return None
+
+
+def empty_view(room_id):
+    return {
+        'event': 'SNAPSHOT',
+        'room_id': room_id,
+        'status': None,
+        'players': [],
+        'turn': None,
+        'winner_id': None,
+        'seq': 0,
+        'guesses': [],
+    }
+
+
+@database_sync_to_async
+def load_view(room_id, unflushed, live):
+    """
+    İzleyici görünümü: oyuncular, sıra, tahmin listesi (hedef sayı olmadan)
+    unflushed: motorun henüz veritabanına yazmadığı tahminler; live: bellekteki oda durumu
+    """
+    room = Room.objects.filter(id=room_id).values(
+        'status', 'creator_id', 'creator__username', 'player2_id', 'player2__username'
+    ).first()
+    view = empty_view(room_id)
+    if room is None:
+        return view
+    session = GameSession.objects.filter(room_id=room_id).values(
+        'target_number', 'current_turn_id', 'winner_id'
+    ).first()
+
+    view['status'] = room['status']
+    view['players'] = [{'id': room['creator_id'], 'username': room['creator__username']}]
+    if room['player2_id']:
+        view['players'].append({'id': room['player2_id'], 'username': room['player2__username']})
+    if session is None:
+        return view
+
+    target = session['target_number']
+    rows = {
+        seq: (guesser_id, guess)
+        for seq, guesser_id, guess in GameGuess.objects.filter(session__room_id=room_id).values_list(
+            'seq', 'guesser_id', 'guess'
+        )
+    }
+    # Yazılmakta olan tahminler sorguda olmayabilir
+    for entry in unflushed:
+        rows[entry.seq] = (entry.guesser_id, entry.guess)
+    view['guesses'] = [
+        {'seq': seq, 'guesser_id': guesser_id, 'guess': guess, 'hint': guess_hint(guess, target)}
+        for seq, (guesser_id, guess) in sorted(rows.items())
+    ]
+    view['seq'] = max(rows, default=0)
+    view['turn'] = live.current_turn_id if live is not None else session['current_turn_id']
+    view['winner_id'] = (live.winner_id if live is not None else None) or session['winner_id']
+    if view['winner_id']:
+        view['turn'] = None
+    return view
+
+
+def apply_delta(view, delta):
+    """
+    Delta'yı görünüme uygula - Dönüş: False ise görünümde zaten var (gönderilmez)
+    Tahmini SNAPSHOT'ta olan delta yine de olay alanlarını (kazanan, durum, sıra) taşıyabilir:
+    yalnızca tahmin tekrar eklenmez.
+    """
+    seq = delta.get('seq')
+    changed = seq is None
+    if seq is not None and seq > view['seq']:
+        view['seq'] = seq
+        view['guesses'].append({
+            'seq': seq,
+            'guesser_id': delta.get('guesser_id'),
+            'guess': delta.get('last_guess'),
+            'hint': delta.get('hint'),
+        })
+        changed = True
+    if delta.get('event') == 'WINNER':
+        if view['winner_id'] != delta.get('winner_id') or view['status'] != 'FINISHED':
+            view['winner_id'] = delta.get('winner_id')
+            view['turn'] = None
+            view['status'] = 'FINISHED'
+            changed = True
+    elif view['winner_id'] is None and (seq is None or seq >= view['seq']):
+        # Eski tahminin sırası daha yeni görünümün üzerine yazılmaz
+        turn = delta.get('turn', view['turn'])
+        if turn != view['turn'] or view['status'] != 'FULL':
+            view['turn'] = turn
+            view['status'] = 'FULL'
+            changed = True
+    return changed
+
+
+class RoomWatch:
+    """Bir odanın bu process'teki izleyicileri ve ortak görünümü"""
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.clients = set()
+        # Henüz uygulanmamış delta'lar (bir sonraki tick'te)
+        self.pending = []
+        # Son tick itibarıyla görünüm - yeni izleyiciler bunu SNAPSHOT olarak alır
+        self.view = None
+        # {alt protokol: kodlanmış SNAPSHOT} - görünüm değişince sıfırlanır
+        self.snapshots = {}
+        self.ready = asyncio.Event()
+        self.runner = None
+
+
+class SpectatorHub:
+    """
+    Process başına izleyici dağıtımı
+
+    - Her izlenen oda için channel layer'da tek abonelik: oyuncu yayınları izleyici
+      sayısından bağımsız olarak process başına bir mesaj üretir
+    - Görünüm bir kez yüklenir, sonra delta'larla güncellenir: katılan izleyici veritabanına gitmez
+    - Delta'lar TICK boyunca biriktirilip batch olarak, protokol başına bir kez kodlanarak gönderilir;
+      gönderim SEND_BATCH sokette bir event loop'a bırakılır (oyuncu mesajları beklemez)
+    """
+
+    def __init__(self):
+        # {room_id: RoomWatch}
+        self.watches = {}
+
+    @property
+    def total(self):
+        return sum(len(watch.clients) for watch in self.watches.values())
+
+    async def join(self, room_id, client):
+        """Dönüş: False ise oda izleyici kapasitesi dolu"""
+        watch = self.watches.get(room_id)
+        if watch is None or watch.runner.done() or watch.runner.get_loop() is not asyncio.get_running_loop():
+            watch = self.watches[room_id] = RoomWatch(room_id)
+            watch.runner = asyncio.get_running_loop().create_task(self.run(watch))
+        if len(watch.clients) >= spectator_setting('MAX_PER_ROOM', 10000):
+            return False
+        watch.clients.add(client)
+        try:
+            await watch.ready.wait()
+        except asyncio.CancelledError:
+            # Bağlantı görünüm yüklenirken iptal edildi: disconnect çağrılmayabilir
+            self.leave(room_id, client)
+            raise
+        return True
+
+    def leave(self, room_id, client):
+        watch = self.watches.get(room_id)
+        if watch is None:
+            return
+        watch.clients.discard(client)
+        if not watch.clients:
+            watch.runner.cancel()
+            del self.watches[room_id]
+
+    def snapshot(self, room_id, codec):
+        watch = self.watches[room_id]
+        cached = watch.snapshots.get(codec.subprotocol)
+        if cached is None:
+            cached = watch.snapshots[codec.subprotocol] = frame(codec, watch.view)
+        return cached
+
+    async def run(self, watch):
+        layer = get_channel_layer()
+        group = SPECTATOR_GROUP.format(watch.room_id)
+        channel = await layer.new_channel()
+        await layer.group_add(group, channel)
+        receiver = asyncio.ensure_future(self.receive_loop(layer, channel, watch))
+        try:
+            # Abonelik görünümden önce: aradaki delta'lar pending'de bekler, seq ile elenir
+            unflushed, live = engine.unflushed(watch.room_id)
+            watch.view = await load_view(watch.room_id, unflushed, live)
+            watch.ready.set()
+            await self.flush_loop(watch)
+        finally:
+            receiver.cancel()
+            asyncio.ensure_future(layer.group_discard(group, channel))
+
+    async def receive_loop(self, layer, channel, watch):
+        while True:
+            message = await layer.receive(channel)
+            watch.pending.append(message['delta'])
+
+    async def flush_loop(self, watch):
+        tick = spectator_setting('TICK', 0.25)
+        send_batch = spectator_setting('SEND_BATCH', 500)
+        while True:
+            await asyncio.sleep(tick)
+            if not watch.pending:
+                continue
+            pending, watch.pending = watch.pending, []
+            deltas = [delta for delta in pending if apply_delta(watch.view, delta)]
+            if not deltas:
+                continue
+            watch.snapshots = {}
+
+            # Görünüm güncellendi ve alıcı listesi alındı (arada await yok):
+            # bundan sonra katılan izleyici bu delta'ları SNAPSHOT içinde alır
+            message = {'event': 'DELTA', 'deltas': deltas}
+            frames = {}
+            for index, client in enumerate(list(watch.clients)):
+                if index and index % send_batch == 0:
+                    await asyncio.sleep(0)
+                encoded = frames.get(client.codec.subprotocol)
+                if encoded is None:
+                    encoded = frames[client.codec.subprotocol] = frame(client.codec, message)
+                try:
+                    await client.push(encoded)
+                except Exception:
+                    logger.exception("İzleyici delta gönderilemedi room=%s", watch.room_id)
+
+
+hub = SpectatorHub()
@@ -1,3 +1,1379 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from core.asgi import application
+from .admin import guess_history_table
+from .archive import game_record
+from .broker import ChannelBroker
+from .config import ConfigCache, global_settings
+from .consumers import GameConsumer, MatchmakingConsumer, expire_join, expire_turn, match_ticket
+from .engine import DatabaseGameEngine, GameEngine, build_engine, engine
+from .exports import EXPORT_FIELDS, async_chunks, csv_chunks
+from .layers import BrokerChannelLayer
+from .leaderboard import CHANGE_KEY, VERSION_KEY, Leaderboard
+from .lobby import LOBBY_GROUP, LobbyHub, publish_removal, publish_room, send_delta, sends as lobby_sends
+from .matchmaking import MatchQueue, Ticket, create_match_room, validate_request
+from .metrics import metrics_view
+from .middleware import IdentityCache, SocketUser, get_user, identity_cache
+from .models import ArchivedGame, GameGuess, GameSession, GlobalSettings, Room, ScheduledTimer, Transaction
+from .protocol import (
+    BROADCAST_ID, CBOR, CODECS, JSON, MSGPACK, FrameCache, broadcast_message, expand, frame, frames_encoded, negotiate
+)
+from .replay import EVENT_SEQ, EventLog
+from .scheduler import LocalTimer, SchedulerLifespan, TimerScheduler, TimingWheel, scheduler
+from .spectators import apply_delta, load_view
+from .utils import join_timer_key, settle_game
+from .views import RoomViewSet
 
-# Create your tests here.
+User = get_user_model()
+
+
+class GameFixture:
+    """İki oyunculu, bahisleri kilitlenmiş (FULL) oda ve oyun"""
+
+    def create_game(self, target_number=50, bet_amount=Decimal('50.00')):
+        self.creator = User.objects.create_user(username='creator', password='x', balance=Decimal('950.00'))
+        self.player2 = User.objects.create_user(username='player2', password='x', balance=Decimal('950.00'))
+        self.room = Room.objects.create(
+            name='oda', bet_amount=bet_amount, creator=self.creator, player2=self.player2, status='FULL'
+        )
+        self.game = GameSession.objects.create(
+            room=self.room, target_number=target_number, current_turn=self.creator
+        )
+        return self.room
+
+
+class SettleGameTests(GameFixture, TransactionTestCase):
+    """settle_game idempotent: ikinci çağrı (ör. başka worker'ın zamanlayıcısı) bir şey yapmaz"""
+
+    def setUp(self):
+        self.create_game()
+
+    def test_second_settlement_is_noop(self):
+        self.assertTrue(settle_game(self.room.id, self.player2.id, 'disconnect'))
+        self.assertFalse(settle_game(self.room.id, self.player2.id, 'disconnect'))
+        self.assertFalse(settle_game(self.room.id, self.creator.id))
+
+        self.creator.refresh_from_db()
+        self.player2.refresh_from_db()
+        self.assertEqual(self.player2.balance, Decimal('1050.00'))
+        self.assertEqual(self.creator.balance, Decimal('950.00'))
+        self.assertEqual((self.player2.total_wins, self.player2.total_games), (1, 1))
+        self.assertEqual((self.creator.total_wins, self.creator.total_games), (0, 1))
+        payouts = Transaction.objects.filter(room=self.room, kind='PAYOUT')
+        self.assertEqual(list(payouts.values_list('user_id', 'amount')), [(self.player2.id, Decimal('100.00'))])
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.winner_id, self.player2.id)
+        self.assertIsNotNone(self.game.ended_at)
+
+    def test_concurrent_settlements_pay_once(self):
+        async def race():
+            settle = database_sync_to_async(settle_game)
+            return await asyncio.gather(
+                settle(self.room.id, self.creator.id), settle(self.room.id, self.player2.id, 'timeout')
+            )
+
+        results = async_to_sync(race)()
+
+        self.assertEqual(sorted(results), [False, True])
+        total = sum(User.objects.values_list('balance', flat=True))
+        # Kilitli iki bahis (2 x 50) tek kazanana gider: toplam bakiye başlangıçla aynı
+        self.assertEqual(total, Decimal('2000.00'))
+        self.assertEqual(Transaction.objects.filter(kind='PAYOUT').count(), 1)
+
+    def test_room_without_opponent_is_not_settled(self):
+        Room.objects.filter(id=self.room.id).update(player2=None)
+        self.assertFalse(settle_game(self.room.id, self.creator.id))
+        self.assertFalse(Transaction.objects.exists())
+
+
+class MemoryEngineTests(GameFixture, TransactionTestCase):
+    """Bellek motoru: sıra ve seq oda kilidi altında, yazma arka planda"""
+
+    def setUp(self):
+        self.engine = GameEngine()
+        self.create_game()
+
+    def test_concurrent_guesses_advance_turn_once(self):
+        async def race():
+            results = await asyncio.gather(*(
+                self.engine.apply_guess(self.room.id, self.creator.id, self.creator.username, number)
+                for number in (10, 20, 30)
+            ))
+            await self.engine.flush()
+            return results
+
+        results = async_to_sync(race)()
+
+        accepted = [result for result in results if 'error' not in result]
+        self.assertEqual(len(accepted), 1)
+        self.assertEqual(accepted[0]['seq'], 1)
+        self.assertEqual(accepted[0]['turn'], self.player2.id)
+        self.assertEqual(GameGuess.objects.count(), 1)
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.current_turn_id, self.player2.id)
+
+    def test_seq_continues_from_persisted_guesses(self):
+        async def play():
+            await self.engine.apply_guess(self.room.id, self.creator.id, self.creator.username, 10)
+            await self.engine.close_room(self.room.id)
+            # Yeni process: durum veritabanından yüklenir
+            other = GameEngine()
+            payload = await other.apply_guess(self.room.id, self.player2.id, self.player2.username, 20)
+            await other.flush()
+            return payload
+
+        payload = async_to_sync(play)()
+
+        self.assertEqual(payload['seq'], 2)
+        self.assertEqual(list(GameGuess.objects.order_by('seq').values_list('seq', flat=True)), [1, 2])
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.last_seq, 2)
+
+    def test_skipped_turn_survives_reload(self):
+        async def skip():
+            result = await self.engine.timeout_turn(self.room.id, self.creator.id, 0, forfeit=False)
+            await self.engine.flush()
+            # Yeni process: durum veritabanından yüklenir
+            return result, (await GameEngine().get_state(self.room.id)).current_turn_id
+
+        (other_id, _, settled), reloaded_turn = async_to_sync(skip)()
+
+        self.assertEqual((other_id, settled), (self.player2.id, False))
+        self.assertEqual(reloaded_turn, self.player2.id)
+
+    @override_settings(GAME_ENGINE={'BACKEND': 'memory'}, CHANNEL_BROKER={'ADDRESS': 'unix:///tmp/broker.sock'})
+    def test_memory_backend_is_refused_with_broker(self):
+        with self.assertRaises(ImproperlyConfigured):
+            build_engine()
+
+    def test_failed_close_flush_still_settles_and_announces_winner(self):
+        consumer = GameConsumer()
+        consumer.scope = {'user': self.creator}
+        consumer.room_id = str(self.room.id)
+        consumer.send_message = mock.AsyncMock()
+        real_write = self.engine.write_batch
+
+        async def play():
+            with mock.patch.object(self.engine, 'write_batch', side_effect=RuntimeError('db')), \
+                    mock.patch('game.consumers.engine', self.engine), \
+                    mock.patch('game.consumers.broadcast', new_callable=mock.AsyncMock) as broadcast:
+                await consumer.handle_guess(50)
+            # Yazılamayan kazanan tahmin bellekte kalır, sonraki flush yazar ve odayı çıkarır
+            self.assertIn(self.room.id, self.engine.rooms)
+            with mock.patch.object(self.engine, 'write_batch', real_write):
+                await self.engine.flush()
+            return broadcast
+
+        with self.assertLogs('game.engine', 'ERROR'):
+            broadcast = async_to_sync(play)()
+
+        self.assertEqual(broadcast.call_args.args[1]['event'], 'WINNER')
+        self.room.refresh_from_db()
+        self.creator.refresh_from_db()
+        self.assertEqual(self.room.status, 'FINISHED')
+        self.assertEqual(self.creator.balance, Decimal('1050.00'))
+        self.assertEqual(list(GameGuess.objects.values_list('seq', 'guess')), [(1, 50)])
+        self.assertNotIn(self.room.id, self.engine.rooms)
+
+    def test_expired_turn_settles_after_timeout(self):
+        timer = LocalTimer('turn', f'turn_{self.room.id}', self.room.id, self.creator.id, seq=0, skips=0)
+        with mock.patch('game.consumers.engine', self.engine), \
+                mock.patch('game.consumers.broadcast', new_callable=mock.AsyncMock) as broadcast:
+            async_to_sync(expire_turn)(timer)
+
+        self.assertEqual(broadcast.call_args.args[1]['winner_id'], self.player2.id)
+        self.game.refresh_from_db()
+        self.player2.refresh_from_db()
+        self.assertEqual(self.game.winner_id, self.player2.id)
+        self.assertEqual(self.player2.balance, Decimal('1050.00'))
+
+
+class DatabaseEngineTests(GameFixture, TransactionTestCase):
+    """Veritabanı motoru: tahmin kilitli okuma ile tek transaction'da uygulanır"""
+
+    def setUp(self):
+        self.engine = DatabaseGameEngine()
+        self.create_game()
+
+    def guess(self, user, number):
+        return async_to_sync(self.engine.apply_guess)(self.room.id, user.id, user.username, number)
+
+    def test_double_guess_is_rejected(self):
+        first = self.guess(self.creator, 10)
+        second = self.guess(self.creator, 20)
+
+        self.assertEqual(first['event'], 'CONTINUE')
+        self.assertEqual(first['turn'], self.player2.id)
+        self.assertIn('sıranı bekle', second['error'])
+        self.assertEqual(list(GameGuess.objects.values_list('seq', 'guess')), [(1, 10)])
+
+    def test_guess_takes_seq_from_locked_session(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.guess(self.creator, 10)
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('BEGIN', 'COMMIT'))]
+
+        # Kilitli okuma + INSERT + UPDATE: MAX(seq) sorgusu yok
+        self.assertEqual(len(statements), 3, statements)
+        self.assertFalse(any('MAX(' in sql for sql in statements))
+        self.assertEqual(self.guess(self.player2, 20)['seq'], 2)
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.last_seq, 2)
+        # Süre yalnızca son seq ile eşleşirse işler
+        self.assertIsNone(self.timeout(self.creator, seq=1, forfeit=False))
+        self.assertEqual(self.timeout(self.creator, seq=2, forfeit=False)[0], self.player2.id)
+
+    def test_winning_guess_settles_in_same_transaction(self):
+        payload = self.guess(self.creator, 50)
+
+        self.assertEqual(payload['event'], 'WINNER')
+        self.room.refresh_from_db()
+        self.game.refresh_from_db()
+        self.creator.refresh_from_db()
+        self.assertEqual(self.room.status, 'FINISHED')
+        self.assertEqual(self.game.winner_id, self.creator.id)
+        self.assertEqual(self.creator.balance, Decimal('1050.00'))
+        self.assertEqual(Transaction.objects.filter(kind='PAYOUT').count(), 1)
+        self.assertEqual(self.guess(self.player2, 50), {'error': 'Oyun zaten bitti!'})
+
+    def test_failed_settlement_rolls_back_winning_guess(self):
+        with mock.patch('game.engine.settle', side_effect=RuntimeError('db')), self.assertLogs('game.engine', 'ERROR'):
+            payload = self.guess(self.creator, 50)
+
+        self.assertIn('error', payload)
+        self.room.refresh_from_db()
+        self.game.refresh_from_db()
+        self.assertEqual(self.room.status, 'FULL')
+        self.assertIsNone(self.game.winner_id)
+        self.assertFalse(GameGuess.objects.exists())
+        # Oyun sürer: aynı oyuncu tekrar deneyebilir
+        self.assertEqual(self.guess(self.creator, 50)['event'], 'WINNER')
+
+    def timeout(self, user, seq=0, forfeit=True):
+        return async_to_sync(self.engine.timeout_turn)(self.room.id, user.id, seq, forfeit)
+
+    def test_turn_timeout_settles_in_same_transaction(self):
+        other_id, players, settled = self.timeout(self.creator)
+
+        self.assertEqual((other_id, settled), (self.player2.id, True))
+        self.room.refresh_from_db()
+        self.game.refresh_from_db()
+        self.player2.refresh_from_db()
+        self.assertEqual(self.room.status, 'FINISHED')
+        self.assertEqual(self.game.winner_id, self.player2.id)
+        self.assertEqual(self.player2.balance, Decimal('1050.00'))
+        self.assertIsNone(self.timeout(self.creator))
+
+    def test_failed_timeout_settlement_leaves_no_winner(self):
+        with mock.patch('game.engine.settle', return_value=False):
+            self.assertIsNone(self.timeout(self.creator))
+        with mock.patch('game.engine.settle', side_effect=RuntimeError('db')), self.assertRaises(RuntimeError):
+            self.timeout(self.creator)
+
+        self.game.refresh_from_db()
+        self.assertIsNone(self.game.winner_id)
+        self.assertIsNone(self.game.ended_at)
+
+    def test_expired_turn_announces_settled_winner(self):
+        timer = LocalTimer('turn', f'turn_{self.room.id}', self.room.id, self.creator.id, seq=0, skips=0)
+        with mock.patch('game.consumers.engine', self.engine), \
+                mock.patch('game.consumers.broadcast', new_callable=mock.AsyncMock) as broadcast:
+            async_to_sync(expire_turn)(timer)
+
+        message = broadcast.call_args.args[1]
+        self.assertEqual((message['event'], message['winner_id'], message['reason']), ('WINNER', self.player2.id, 'timeout'))
+        self.assertEqual(Transaction.objects.filter(kind='PAYOUT').count(), 1)
+
+
+class TimerSchedulerTests(GameFixture, TransactionTestCase):
+    """Kalıcı zamanlayıcı: iptal ve tetikleme aynı satır üzerinde yarışır, tek taraf kazanır"""
+
+    def setUp(self):
+        self.create_game()
+        self.scheduler = TimerScheduler()
+        self.fired = []
+
+        async def handler(timer):
+            self.fired.append(timer.key)
+
+        self.scheduler.register('test', handler)
+
+    def store(self, key, delay=0):
+        async_to_sync(self.scheduler.store)('test', key, delay, self.room.id, self.creator.id)
+
+    def test_cancelled_timer_does_not_fire(self):
+        self.store('t1')
+        self.assertTrue(async_to_sync(self.scheduler.delete)('t1'))
+        async_to_sync(self.scheduler.fire)('t1')
+        self.assertEqual(self.fired, [])
+
+    def test_timer_fires_once_and_cancel_after_fire_is_noop(self):
+        self.store('t1')
+
+        async def fire_twice():
+            await asyncio.gather(self.scheduler.fire('t1'), self.scheduler.fire('t1'))
+
+        async_to_sync(fire_twice)()
+        self.assertEqual(self.fired, ['t1'])
+        self.assertFalse(ScheduledTimer.objects.exists())
+        self.assertFalse(async_to_sync(self.scheduler.delete)('t1'))
+
+    def test_timer_is_not_fired_before_due(self):
+        self.store('t1', delay=60)
+        async_to_sync(self.scheduler.fire)('t1')
+        self.assertEqual(self.fired, [])
+        self.assertEqual(async_to_sync(self.scheduler.due_keys)(), [])
+
+    def test_failed_handler_is_retried_after_lease(self):
+        async def failing(timer):
+            raise RuntimeError('handler')
+
+        self.scheduler.register('test', failing)
+        self.store('t1')
+        with self.assertLogs('game.scheduler', 'ERROR'):
+            async_to_sync(self.scheduler.fire)('t1')
+        # Kira sürerken başka worker almaz, dolunca tarama tekrar bulur
+        self.assertEqual(async_to_sync(self.scheduler.due_keys)(), [])
+        with override_settings(GAME_SCHEDULER={'CLAIM_LEASE': -1}):
+            self.assertEqual(async_to_sync(self.scheduler.due_keys)(), ['t1'])
+
+    def test_wheel_remove_before_advance(self):
+        wheel = TimingWheel(tick=1, slots=4)
+        wheel.add('a', 1)
+        wheel.add('b', 6)
+        wheel.remove('a')
+        self.assertEqual([wheel.advance() for _ in range(7)], [[], [], [], [], [], [('b', None)], []])
+        self.assertEqual(len(wheel), 0)
+
+    def test_wheel_remaining_matches_firing_tick(self):
+        wheel = TimingWheel(tick=1, slots=4)
+        wheel.advance()
+        # delay == slots * tick (ve katları): eklenen anahtar imlecin üzerindeki slota düşer
+        delays = (1, 3, 4, 5, 8)
+        for delay in delays:
+            wheel.add(delay, delay)
+        self.assertEqual([wheel.remaining(delay) for delay in delays], list(delays))
+        fired = {}
+        for tick in range(1, 9):
+            for key, _ in wheel.advance():
+                fired[key] = tick
+            for key in wheel.index:
+                self.assertEqual(wheel.remaining(key), key - tick)
+        self.assertEqual(fired, {delay: delay for delay in delays})
+
+    def test_lifespan_starts_and_stops_scheduler(self):
+        async def lifespan():
+            messages = asyncio.Queue()
+            sent = []
+            for message in ('lifespan.startup', 'lifespan.shutdown'):
+                messages.put_nowait({'type': message})
+
+            async def send(message):
+                sent.append(message['type'])
+                if message['type'] == 'lifespan.startup.complete':
+                    sent.append(scheduler.runner is not None and not scheduler.runner.done())
+
+            await SchedulerLifespan(None)({'type': 'lifespan'}, messages.get, send)
+            return sent, scheduler.runner
+
+        sent, runner = async_to_sync(lifespan)()
+        self.assertEqual(sent, ['lifespan.startup.complete', True, 'lifespan.shutdown.complete'])
+        self.assertIsNone(runner)
+
+
+class MetricsViewTests(SimpleTestCase):
+    """Metrik uç noktası açıkça izin verilmedikçe token ister"""
+
+    def get(self, **headers):
+        return metrics_view(RequestFactory().get('/metrics', headers=headers))
+
+    @override_settings(METRICS_TOKEN='', METRICS_REQUIRE_TOKEN=True)
+    def test_closed_without_token(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_bearer_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(authorization='Bearer wrong').status_code, 403)
+        response = self.get(authorization='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'numberduel_phase_seconds', response.content)
+
+    @override_settings(METRICS_TOKEN='', METRICS_REQUIRE_TOKEN=False)
+    def test_explicitly_public(self):
+        self.assertEqual(self.get().status_code, 200)
+
+
+class GuessHistoryTableTests(SimpleTestCase):
+    """Admin geçmiş tablosu kullanıcı kaynaklı metni escape eder"""
+
+    def test_escapes_user_content(self):
+        html = guess_history_table([
+            (1, '<script>alert(1)</script>', 42, '<img src=x onerror=alert(1)>', '2026-01-01T10:00:00.000'),
+        ])
+        self.assertNotIn('<script>', html)
+        self.assertNotIn('<img', html)
+        self.assertIn('&lt;script&gt;alert(1)&lt;/script&gt;', html)
+        self.assertIn('2026-01-01T10:00:00<', html)
+        self.assertIn('<strong>Toplam Tahmin:</strong> 1', html)
+
+
+class EventLogTests(SimpleTestCase):
+    """Yeniden bağlanma imleci sadece onu üreten process'in günlüğünde geçerlidir"""
+
+    def record(self, log, room_id, event):
+        return log.record(room_id, {'type': 'game_message', 'event': event})[EVENT_SEQ]
+
+    def test_resume_replays_missed_events(self):
+        log = EventLog(epoch='a')
+        cursor = self.record(log, 1, 'START')
+        self.record(log, 1, 'GUESS')
+        self.assertEqual([event['event'] for event in log.replay(1, cursor)], ['GUESS'])
+        self.assertEqual(log.replay(1, log.last_seq(1)), [])
+
+    def test_restart_resume_gets_snapshot(self):
+        before = EventLog(epoch='a')
+        cursor = self.record(before, 1, 'START')
+        self.record(before, 1, 'GUESS')
+        # Yeni process aynı sıra numaralarını tekrar üretir: epoch farklı
+        after = EventLog(epoch='b')
+        self.record(after, 1, 'START')
+        self.record(after, 1, 'GUESS')
+        self.assertIsNone(after.replay(1, cursor))
+        self.assertIsNone(after.replay(1, '1'))
+        self.assertIsNone(after.replay(1, 'b-x'))
+
+    def test_cross_worker_resume_gets_snapshot(self):
+        worker_a, worker_b = EventLog(epoch='a'), EventLog(epoch='b')
+        cursor_a = self.record(worker_a, 1, 'START')
+        message_b = worker_b.record(1, {'type': 'game_message', 'event': 'GUESS'})
+        # Diğer worker'ın imleci bu günlükte karşılık bulmaz
+        self.assertIsNone(worker_a.replay(1, message_b[EVENT_SEQ]))
+        # A, B'nin yayınını gruptan görür: A'nın günlüğünde artık boşluk var
+        worker_a.observe(1, message_b)
+        self.assertIsNone(worker_a.replay(1, cursor_a))
+        # Yeni günlük eski numaraları tekrar vermez
+        self.assertNotEqual(self.record(worker_a, 1, 'GUESS'), cursor_a)
+        self.assertIsNone(worker_a.replay(1, cursor_a))
+
+    def test_own_broadcast_keeps_log(self):
+        log = EventLog(epoch='a')
+        cursor = self.record(log, 1, 'START')
+        message = log.record(1, {'type': 'game_message', 'event': 'GUESS'})
+        log.observe(1, message)
+        self.assertEqual(len(log.replay(1, cursor)), 1)
+
+    def test_drop_without_local_sockets(self):
+        log = EventLog(epoch='a')
+        cursor = self.record(log, 1, 'START')
+        log.drop(1)
+        self.record(log, 1, 'GUESS')
+        self.assertIsNone(log.replay(1, cursor))
+
+
+class SpectatorViewTests(GameFixture, TransactionTestCase):
+    """İzleyici SNAPSHOT'ı ve sonrasında gelen delta'lar: tahmin bir kez, olay alanları her zaman"""
+
+    def setUp(self):
+        self.create_game(target_number=50)
+        for seq, (guesser, number) in enumerate([(self.creator, 10), (self.player2, 50)], start=1):
+            GameGuess.objects.create(
+                session=self.game, seq=seq, guess=number, guesser=guesser,
+                guesser_name=guesser.username, response='', created_at=timezone.now()
+            )
+        GameSession.objects.filter(id=self.game.id).update(last_seq=2)
+        self.view = async_to_sync(load_view)(self.room.id, [], None)
+
+    def test_winner_delta_for_guess_in_snapshot(self):
+        # Kazanan tahmin yazıldı ama oyun henüz kapanmadı: SNAPSHOT'ta tahmin var, kazanan yok
+        self.assertEqual(self.view['seq'], 2)
+        self.assertIsNone(self.view['winner_id'])
+
+        winner = {'event': 'WINNER', 'seq': 2, 'last_guess': 50, 'guesser_id': self.player2.id,
+                  'winner_id': self.player2.id}
+        self.assertTrue(apply_delta(self.view, winner))
+        self.assertEqual(self.view['winner_id'], self.player2.id)
+        self.assertEqual(self.view['status'], 'FINISHED')
+        self.assertIsNone(self.view['turn'])
+        self.assertEqual([guess['seq'] for guess in self.view['guesses']], [1, 2])
+        # Aynı delta ikinci kez (ör. abonelik ile yükleme arasında) gönderilmez
+        self.assertFalse(apply_delta(self.view, dict(winner)))
+
+    def test_stale_guess_delta_is_dropped(self):
+        turn = self.view['turn']
+        stale = {'event': 'GUESS', 'seq': 1, 'last_guess': 10, 'guesser_id': self.creator.id,
+                 'hint': 'UP', 'turn': self.player2.id}
+        self.assertFalse(apply_delta(self.view, stale))
+        self.assertEqual(self.view['turn'], turn)
+        self.assertEqual(len(self.view['guesses']), 2)
+
+    def test_new_deltas_append_in_order(self):
+        deltas = [
+            {'event': 'GUESS', 'seq': 3, 'last_guess': 70, 'guesser_id': self.creator.id,
+             'hint': 'DOWN', 'turn': self.player2.id},
+            {'event': 'GUESS', 'seq': 3, 'last_guess': 70, 'guesser_id': self.creator.id,
+             'hint': 'DOWN', 'turn': self.player2.id},
+            {'event': 'TIMEOUT', 'turn': self.creator.id, 'time_left': 30},
+        ]
+        self.assertEqual([apply_delta(self.view, delta) for delta in deltas], [True, False, True])
+        self.assertEqual([guess['seq'] for guess in self.view['guesses']], [1, 2, 3])
+        self.assertEqual(self.view['guesses'][-1]['hint'], 'DOWN')
+        self.assertEqual(self.view['turn'], self.creator.id)
+        self.assertEqual(self.view['status'], 'FULL')
+
+
+class MatchQueueTests(SimpleTestCase):
+    """Eşleşme: bahis aralıkları kesişen, max_bet'i en düşük kovanın en eski bekleyeni"""
+
+    def ticket(self, user_id, min_bet, max_bet=None):
+        return Ticket(user_id, f'u{user_id}', f'c{user_id}', Decimal(min_bet), Decimal(max_bet or min_bet))
+
+    def test_wider_waiting_range_matches_fixed_bet(self):
+        queue = MatchQueue()
+        queue.add(self.ticket(1, 20, 500))
+
+        partner, bet = queue.pop_partner(self.ticket(2, 50))
+
+        self.assertEqual((partner.user_id, bet), (1, Decimal(50)))
+        self.assertEqual(len(queue), 0)
+
+    def test_disjoint_ranges_do_not_match(self):
+        queue = MatchQueue()
+        queue.add(self.ticket(1, 10, 40))
+        queue.add(self.ticket(2, 200, 500))
+
+        self.assertEqual(queue.pop_partner(self.ticket(3, 50, 100)), (None, None))
+        self.assertEqual(len(queue), 2)
+
+    def test_fifo_within_range_and_highest_common_bet(self):
+        queue = MatchQueue()
+        for user_id in (1, 2):
+            queue.add(self.ticket(user_id, 10, 100))
+
+        partner, bet = queue.pop_partner(self.ticket(3, 50, 300))
+
+        self.assertEqual((partner.user_id, bet), (1, Decimal(100)))
+        self.assertEqual(list(queue.tickets), [2])
+        self.assertEqual(queue.keys, [(Decimal(100), Decimal(10))])
+
+    def test_lowest_compatible_bucket_wins_over_older_waiter(self):
+        queue = MatchQueue()
+        queue.add(self.ticket(1, 10, 500))
+        queue.add(self.ticket(2, 10, 100))
+
+        partner, bet = queue.pop_partner(self.ticket(3, 50, 300))
+
+        self.assertEqual((partner.user_id, bet), (2, Decimal(100)))
+
+    def test_binary_frame_is_rejected(self):
+        consumer = MatchmakingConsumer()
+        consumer.send = mock.AsyncMock()
+
+        async_to_sync(consumer.receive)(bytes_data=b'\x81\xa6action\xa5queue')
+
+        self.assertIn('error', json.loads(consumer.send.await_args.kwargs['text_data']))
+
+    def test_nan_and_infinite_bets_are_rejected(self):
+        for value in ('NaN', 'Infinity', 'sNaN'):
+            self.assertEqual(
+                validate_request(1, Decimal(value), Decimal(100)), 'Geçersiz bahis miktarı!'
+            )
+
+    def test_partner_is_requeued_when_room_creation_fails(self):
+        waiting, incoming = self.ticket(1, 50), self.ticket(2, 50)
+        queue = MatchQueue()
+        queue.add(waiting)
+        notify = mock.AsyncMock()
+
+        with mock.patch('game.consumers.match_queue', queue), \
+                mock.patch('game.consumers.create_match_room', side_effect=RuntimeError('db')), \
+                mock.patch('game.consumers.notify_ticket', notify), \
+                self.assertLogs('game.consumers', 'ERROR'):
+            async_to_sync(match_ticket)(incoming)
+
+        self.assertEqual(list(queue.tickets), [1])
+        notify.assert_awaited_once()
+        self.assertIs(notify.await_args.args[0], incoming)
+        self.assertIn('error', notify.await_args.kwargs)
+
+
+class MatchRoomTests(TransactionTestCase):
+    """Eşleşme odası: iki bahis oda ile birlikte kilitlenir, bağlanmayan oyuncunun zamanlayıcısı kurulur"""
+
+    def setUp(self):
+        self.waiting = User.objects.create_user(username='waiting', password='x', balance=Decimal('1000.00'))
+        self.incoming = User.objects.create_user(username='incoming', password='x', balance=Decimal('1000.00'))
+
+    def match(self):
+        tickets = [Ticket(user.id, user.username, f'c{user.id}', Decimal(50), Decimal(50)) for user in (self.waiting, self.incoming)]
+        room_id, short_user_id = create_match_room(*tickets, Decimal('50.00'))
+        return room_id, short_user_id
+
+    def balances(self):
+        return [user.balance for user in User.objects.filter(id__in=[self.waiting.id, self.incoming.id]).order_by('id')]
+
+    def expire(self, room_id, user):
+        async_to_sync(expire_join)(ScheduledTimer.objects.get(key=join_timer_key(room_id, user.id)))
+
+    def test_match_reserves_both_stakes_and_schedules_expiry(self):
+        room_id, _ = self.match()
+
+        self.assertEqual(self.balances(), [Decimal('950.00')] * 2)
+        self.assertEqual(Transaction.locked_stakes(room_id), {self.waiting.id, self.incoming.id})
+        self.assertEqual(
+            set(ScheduledTimer.objects.filter(kind='join').values_list('user_id', flat=True)),
+            {self.waiting.id, self.incoming.id}
+        )
+
+    def test_short_balance_rolls_back_room_and_stakes(self):
+        User.objects.filter(id=self.incoming.id).update(balance=Decimal('10.00'))
+
+        self.assertEqual(self.match(), (None, self.incoming.id))
+        self.assertEqual(self.balances(), [Decimal('1000.00'), Decimal('10.00')])
+        self.assertFalse(Room.objects.exists())
+        self.assertFalse(ScheduledTimer.objects.exists())
+
+    def test_nobody_connects_refunds_both_stakes_once(self):
+        room_id, _ = self.match()
+
+        self.expire(room_id, self.waiting)
+        self.expire(room_id, self.incoming)
+
+        self.assertEqual(self.balances(), [Decimal('1000.00')] * 2)
+        self.assertEqual(Transaction.locked_stakes(room_id), set())
+        self.assertEqual(Transaction.objects.filter(kind='REFUND').count(), 2)
+        self.assertEqual(Room.objects.get(id=room_id).status, 'OPEN')
+
+    def test_no_show_forfeits_to_player_who_started_the_game(self):
+        room_id, _ = self.match()
+        # Eşleşen oyunculardan biri bağlandı ve oyunu başlattı, diğeri hiç gelmedi
+        GameSession.objects.create(room_id=room_id, target_number=50, current_turn=self.waiting)
+
+        self.expire(room_id, self.incoming)
+
+        self.assertEqual(Room.objects.get(id=room_id).status, 'FINISHED')
+        self.assertEqual(GameSession.objects.get(room_id=room_id).winner_id, self.waiting.id)
+        self.assertEqual(self.balances(), [Decimal('1050.00'), Decimal('950.00')])
+
+
+class JoinRoomTests(TransactionTestCase):
+    """Katılma: koşullu UPDATE, bahis kilidi ve bağlanmayan katılanın iadesi"""
+
+    def setUp(self):
+        self.creator = User.objects.create_user(username='creator', password='x', balance=Decimal('1000.00'))
+        self.joiner = User.objects.create_user(username='joiner', password='x', balance=Decimal('1000.00'))
+        self.other = User.objects.create_user(username='other', password='x', balance=Decimal('1000.00'))
+        self.room = Room.objects.create(name='oda', bet_amount=Decimal('50.00'), creator=self.creator)
+
+    def join(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse('room-join', args=[self.room.id]))
+
+    def test_join_reserves_stake_and_schedules_expiry(self):
+        response = self.join(self.joiner)
+
+        self.assertEqual(response.status_code, 200)
+        self.joiner.refresh_from_db()
+        self.assertEqual(self.joiner.balance, Decimal('950.00'))
+        self.assertEqual(Transaction.locked_stakes(self.room.id), {self.joiner.id})
+        timer = ScheduledTimer.objects.get(key=join_timer_key(self.room.id, self.joiner.id))
+        self.assertEqual((timer.kind, timer.user_id), ('join', self.joiner.id))
+
+    def test_lost_compare_and_swap_returns_409(self):
+        # İkinci istek odayı OPEN olarak okudu, ama ilk katılım önce commit oldu
+        stale = Room.objects.get(id=self.room.id)
+        self.assertEqual(self.join(self.joiner).status_code, 200)
+
+        with mock.patch.object(RoomViewSet, 'get_object', return_value=stale):
+            response = self.join(self.other)
+
+        self.assertEqual(response.status_code, 409)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.balance, Decimal('1000.00'))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.player2_id, self.joiner.id)
+        self.assertFalse(Transaction.objects.filter(user=self.other).exists())
+
+    def test_expired_join_refunds_and_reopens_room(self):
+        self.join(self.joiner)
+        timer = ScheduledTimer.objects.get(key=join_timer_key(self.room.id, self.joiner.id))
+
+        async_to_sync(expire_join)(timer)
+
+        self.room.refresh_from_db()
+        self.joiner.refresh_from_db()
+        self.assertEqual((self.room.status, self.room.player2_id), ('OPEN', None))
+        self.assertEqual(self.joiner.balance, Decimal('1000.00'))
+        self.assertEqual(Transaction.locked_stakes(self.room.id), set())
+
+    def test_expired_join_after_rejoin_by_other_player_is_noop(self):
+        self.join(self.joiner)
+        timer = ScheduledTimer.objects.get(key=join_timer_key(self.room.id, self.joiner.id))
+        Room.objects.filter(id=self.room.id).update(player2=self.other)
+
+        async_to_sync(expire_join)(timer)
+
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.status, self.room.player2_id), ('FULL', self.other.id))
+
+    def test_expired_join_after_game_start_forfeits_absent_joiner(self):
+        self.join(self.joiner)
+        timer = ScheduledTimer.objects.get(key=join_timer_key(self.room.id, self.joiner.id))
+        # Kurucu bağlandı ve oyunu başlattı, katılan hiç gelmedi
+        GameSession.objects.create(room=self.room, target_number=50, current_turn=self.joiner)
+
+        async_to_sync(expire_join)(timer)
+
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, 'FINISHED')
+        self.assertEqual(GameSession.objects.get(room=self.room).winner_id, self.creator.id)
+
+
+async def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Koşul zamanında sağlanmadı')
+        await asyncio.sleep(0.01)
+
+
+class BrokerChannelLayerTests(SimpleTestCase):
+    """Broker üzerinden iki process (iki layer) arası kanal ve grup mesajları"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.address = f'unix://{os.path.join(directory, "broker.sock")}'
+
+    def run_with_broker(self, scenario, token='', layer_tokens=('', ''), **layer_options):
+        async def run():
+            broker = ChannelBroker(self.address, token=token)
+            await broker.start()
+            layers = [BrokerChannelLayer(self.address, token=layer_token, **layer_options) for layer_token in layer_tokens]
+            try:
+                if not token:
+                    # Broker'a kaydolmamış process'e gönderilen mesaj düşer
+                    for layer in layers:
+                        await layer.connection()
+                    await wait_until(lambda: all(layer.client_id in broker.clients for layer in layers))
+                return await scenario(broker, *layers)
+            finally:
+                for layer in layers:
+                    await layer.close()
+                await broker.close()
+        return async_to_sync(run)()
+
+    def test_send_and_group_send_across_processes(self):
+        async def scenario(broker, first, second):
+            channel_a, channel_b = await first.new_channel(), await second.new_channel()
+            await second.send(channel_a, {'type': 'direct', 'n': 1})
+            self.assertEqual(await asyncio.wait_for(first.receive(channel_a), 2), {'type': 'direct', 'n': 1})
+
+            await first.group_add('game_1', channel_a)
+            await second.group_add('game_1', channel_b)
+            await wait_until(lambda: len(broker.groups.get('game_1', ())) == 2)
+            await second.group_send('game_1', {'type': 'game_message'})
+            for layer, channel in ((first, channel_a), (second, channel_b)):
+                self.assertEqual(await asyncio.wait_for(layer.receive(channel), 2), {'type': 'game_message'})
+
+        self.run_with_broker(scenario)
+
+    def test_local_channel_capacity(self):
+        async def scenario(broker, layer):
+            channel = await layer.new_channel()
+            await layer.send(channel, {'type': 'a'})
+            with self.assertRaises(ChannelFull):
+                await layer.send(channel, {'type': 'b'})
+
+        self.run_with_broker(scenario, layer_tokens=('',), capacity=1)
+
+    def test_expired_messages_release_dead_channels(self):
+        async def scenario(broker, first, second):
+            # Alıcısı hiç receive çağırmayan (ölü) kanal ve hiç var olmamış kanal
+            dead = await first.new_channel()
+            await first.group_add('game_1', dead)
+            await wait_until(lambda: 'game_1' in broker.groups)
+            await second.group_send('game_1', {'type': 'game_message'})
+            await second.send(f'specific.{first.client_id}!unknown', {'type': 'direct'})
+            await wait_until(lambda: len(first.channels) == 2)
+
+            await wait_until(lambda: not first.channels and 'game_1' not in broker.groups)
+            self.assertEqual(first.groups, {})
+
+        self.run_with_broker(scenario, expiry=0.05)
+
+    def test_token_is_required(self):
+        async def scenario(broker, trusted, intruder):
+            await trusted.connection()
+            await intruder.connection()
+            await wait_until(lambda: trusted.client_id in broker.clients)
+            await asyncio.sleep(0.05)
+            self.assertNotIn(intruder.client_id, broker.clients)
+
+        with self.assertLogs('game.broker', 'WARNING'):
+            self.run_with_broker(scenario, token='secret', layer_tokens=('secret', 'wrong'), reconnect_delay=10)
+
+    def test_tcp_broker_refuses_to_listen_without_token(self):
+        with self.assertRaises(ValueError):
+            async_to_sync(ChannelBroker('tcp://127.0.0.1:0').start)()
+
+
+
+class LobbyStreamTests(TransactionTestCase):
+    """Lobi: değişiklikler commit sonrası yayınlanır, tick başına oda bazında birleştirilir"""
+
+    def setUp(self):
+        self.layer = InMemoryChannelLayer()
+        patcher = mock.patch('game.lobby.get_channel_layer', return_value=self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_publish_waits_for_commit(self):
+        creator = User.objects.create_user(username='creator', password='x')
+        with mock.patch('game.lobby.send_delta') as send:
+            with transaction.atomic():
+                room = Room.objects.create(name='oda', bet_amount=Decimal('20.00'), creator=creator)
+                publish_room(room, 'created')
+                room.status = 'FINISHED'
+                publish_room(room, 'finished')
+                self.assertFalse(send.called)
+        deltas = [call.args[0] for call in send.call_args_list]
+        self.assertEqual([(delta['op'], delta['reason']) for delta in deltas], [('upsert', 'created'), ('remove', 'finished')])
+        self.assertEqual(deltas[0]['room']['name'], 'oda')
+        self.assertEqual(deltas[1]['id'], room.id)
+
+        with mock.patch('game.lobby.send_delta') as send:
+            publish_removal(str(room.id), 'finished')
+        self.assertEqual(send.call_args.args[0]['id'], room.id)
+
+    def test_send_from_event_loop_keeps_task_until_sent(self):
+        async def send():
+            channel = await self.layer.new_channel()
+            await self.layer.group_add(LOBBY_GROUP, channel)
+            send_delta({'op': 'remove', 'reason': 'expired', 'id': 7})
+            self.assertEqual(len(lobby_sends), 1)
+            message = await self.layer.receive(channel)
+            await wait_until(lambda: not lobby_sends)
+            return message
+
+        message = async_to_sync(send)()
+
+        self.assertEqual(message['delta'], {'op': 'remove', 'reason': 'expired', 'id': 7})
+
+    @override_settings(LOBBY={'TICK': 0.02})
+    def test_hub_coalesces_deltas_per_room(self):
+        client = mock.Mock(push=mock.AsyncMock())
+        hub = LobbyHub()
+
+        async def stream():
+            await hub.join(client)
+            try:
+                send_delta({'op': 'upsert', 'reason': 'created', 'room': {'id': 1, 'status': 'OPEN'}})
+                send_delta({'op': 'upsert', 'reason': 'joined', 'room': {'id': 1, 'status': 'FULL'}})
+                send_delta({'op': 'remove', 'reason': 'expired', 'id': 2})
+                await wait_until(lambda: client.push.await_count)
+                hub.leave(client)
+                send_delta({'op': 'remove', 'reason': 'finished', 'id': 1})
+                await asyncio.sleep(0.1)
+            finally:
+                hub.runner.cancel()
+
+        async_to_sync(stream)()
+
+        client.push.assert_awaited_once()
+        message = json.loads(client.push.await_args.args[0])
+        self.assertEqual(message['event'], 'DELTA')
+        self.assertEqual(message['deltas'], [
+            {'op': 'upsert', 'reason': 'joined', 'room': {'id': 1, 'status': 'FULL'}},
+            {'op': 'remove', 'reason': 'expired', 'id': 2},
+        ])
+
+
+class LeaderboardIndexTests(GameFixture, TransactionTestCase):
+    """Sıralama indeksi tek sorguyla yüklenir, sonra sadece değişen oyuncular uygulanır"""
+
+    def setUp(self):
+        cache.clear()
+        self.create_game()
+        self.veteran = User.objects.create_user(
+            username='veteran', password='x', balance=Decimal('500.00'), total_games=20, total_wins=10
+        )
+        self.board = Leaderboard()
+
+    def usernames(self, order='wins'):
+        return [entry['username'] for entry in self.board.page(order, 1, 10)[0]]
+
+    def test_settlement_is_applied_without_reload(self):
+        self.assertEqual(self.usernames(), ['veteran'])
+
+        with mock.patch.object(self.board, 'load', wraps=self.board.load) as load:
+            settle_game(self.room.id, self.player2.id)
+            self.assertEqual(self.usernames(), ['veteran', 'player2', 'creator'])
+        load.assert_not_called()
+
+        entry = self.board.rank(self.player2.id)
+        self.assertEqual((entry['rank'], entry['balance'], entry['total_wins'], entry['win_rate']), (2, 1050.0, 1, 100.0))
+        self.assertEqual(self.board.total(), 3)
+        # Tek oyunla win_rate sıralamasına girilmez
+        self.assertEqual(self.usernames('win_rate'), ['veteran'])
+        self.assertIsNone(self.board.rank(self.player2.id, 'win_rate'))
+
+    def test_missing_change_reloads_from_database(self):
+        self.assertEqual(self.usernames(), ['veteran'])
+        settle_game(self.room.id, self.creator.id)
+        cache.delete(CHANGE_KEY.format(cache.get(VERSION_KEY)))
+
+        with mock.patch.object(self.board, 'load', wraps=self.board.load) as load:
+            self.assertEqual(self.usernames(), ['veteran', 'creator', 'player2'])
+        load.assert_called_once()
+
+
+class IdentityCacheTests(TransactionTestCase):
+    """WebSocket kimlik önbelleği: TTL, LRU sınırı ve kullanıcı kaydı sinyalleri"""
+
+    def setUp(self):
+        identity_cache.clear()
+        self.addCleanup(identity_cache.clear)
+
+    def test_entries_expire_after_ttl(self):
+        identities = IdentityCache(max_size=10, ttl=5)
+        with mock.patch('game.middleware.time.monotonic', return_value=100):
+            identities.set(SocketUser(1, 'a'))
+        with mock.patch('game.middleware.time.monotonic', return_value=104):
+            self.assertEqual(identities.get(1).username, 'a')
+        with mock.patch('game.middleware.time.monotonic', return_value=106):
+            self.assertIsNone(identities.get(1))
+        self.assertEqual(len(identities.entries), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        identities = IdentityCache(max_size=2, ttl=60)
+        identities.set(SocketUser(1, 'a'))
+        identities.set(SocketUser(2, 'b'))
+        identities.get(1)
+        identities.set(SocketUser(3, 'c'))
+        self.assertIsNone(identities.get(2))
+        self.assertEqual([identities.get(1).username, identities.get(3).username], ['a', 'c'])
+
+    def test_cached_identity_follows_user_record(self):
+        user = User.objects.create_user(username='oyuncu', password='x')
+        self.assertEqual(async_to_sync(get_user)(user.id).username, 'oyuncu')
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(get_user)(user.id).id, user.id)
+
+        # Bakiye kaydı kimliği değiştirmez, önbellekte kalır
+        user.balance = Decimal('10.00')
+        user.save()
+        self.assertIsNotNone(identity_cache.get(user.id))
+
+        user.username = 'yeni'
+        user.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(get_user)(user.id).username, 'yeni')
+
+        user.is_active = False
+        user.save()
+        self.assertFalse(async_to_sync(get_user)(user.id).is_authenticated)
+
+        user.delete()
+        self.assertIsNone(identity_cache.get(user.id))
+        self.assertFalse(async_to_sync(get_user)(user.id).is_authenticated)
+
+
+class RoomListPaginationTests(TransactionTestCase):
+    """Oda listesi (created_at, id) keyset sayfalama: aynı zamanlı odalar atlanmaz, tekrarlanmaz"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='oyuncu', password='x')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        tied = timezone.now()
+        rooms = [
+            Room.objects.create(name=f'oda{index}', bet_amount=Decimal('10.00'), creator=self.user)
+            for index in range(7)
+        ]
+        # Beş oda aynı created_at ile: sayfa sınırı bu eşitliklerin ortasına düşer
+        Room.objects.filter(id__in=[room.id for room in rooms[1:6]]).update(created_at=tied)
+        Room.objects.filter(id=rooms[0].id).update(created_at=tied - timedelta(seconds=1))
+        Room.objects.filter(id=rooms[6].id).update(created_at=tied + timedelta(seconds=1))
+        Room.objects.create(name='bitti', bet_amount=Decimal('10.00'), creator=self.user, status='FINISHED')
+        self.expected = [rooms[6].id] + [room.id for room in reversed(rooms[1:6])] + [rooms[0].id]
+
+    def list_rooms(self, **params):
+        return self.api.get(reverse('room-list'), params)
+
+    def test_pages_walk_ties_in_order(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            response = self.list_rooms(page_size=2, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            seen += [room['id'] for room in response.data]
+            pages += 1
+            cursor = response.get('X-Next-Cursor')
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(pages, 4)
+
+    def test_filters_and_invalid_cursor(self):
+        self.assertEqual(len(self.list_rooms(page_size=100).data), 7)
+        self.assertEqual(self.list_rooms(status='FINISHED').status_code, 400)
+        self.assertEqual(self.list_rooms(cursor='bozuk').status_code, 400)
+        self.assertEqual(self.list_rooms(page_size='x').status_code, 400)
+
+
+class ConfigCacheTests(TransactionTestCase):
+    """Yapılandırma önbelleği: tek yükleme (single-flight), TTL ve sürümle geçersiz kılma"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_cold_reads_load_once(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'loaded': len(calls)}
+
+        config = ConfigCache('test', loader)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(config.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'loaded': 1}] * 8)
+
+    @override_settings(CONFIG_CACHE={'TTL': 10, 'VERSION_CHECK_INTERVAL': 0})
+    def test_ttl_and_version_invalidate(self):
+        loader = mock.Mock(side_effect=range(10))
+        config, other_worker = ConfigCache('test', loader), ConfigCache('test', mock.Mock())
+
+        with mock.patch('game.config.time.monotonic', return_value=100):
+            self.assertEqual([config.get(), config.get()], [0, 0])
+        with mock.patch('game.config.time.monotonic', return_value=111):
+            self.assertEqual(config.get(), 1)
+            # Başka worker'daki invalidate paylaşılan sürümü artırır
+            other_worker.invalidate()
+            self.assertEqual([config.get(), config.get()], [2, 2])
+            config.invalidate()
+            self.assertEqual(config.get(), 3)
+
+    def test_saving_global_settings_refreshes_cached_copy(self):
+        self.addCleanup(global_settings.invalidate)
+        self.assertEqual(global_settings.get().max_bet, Decimal('1000.00'))
+        with self.assertNumQueries(0):
+            global_settings.get()
+
+        GlobalSettings.objects.update_or_create(pk=1, defaults={'max_bet': Decimal('200.00')})
+        self.assertEqual(global_settings.get().max_bet, Decimal('200.00'))
+
+
+class TransactionExportTests(TransactionTestCase):
+    """Hareket geçmişi: cursor sayfalama ve parça parça CSV/NDJSON akışı"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='oyuncu', password='x')
+        other = User.objects.create_user(username='diger', password='x')
+        self.transactions = [
+            Transaction.objects.create(user=self.user, kind='LOCK', amount=Decimal(-index), description=f'hareket "{index}", ş')
+            for index in range(1, 6)
+        ]
+        Transaction.objects.create(user=other, kind='PAYOUT', amount=Decimal('99.00'), description='başkası')
+        self.expected = [row.id for row in reversed(self.transactions)]
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def export(self, fmt):
+        response = self.api.get(reverse('transaction-export', args=[fmt]))
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        return response, chunks
+
+    @override_settings(TRANSACTION_EXPORT={'LINES_PER_CHUNK': 2})
+    def test_csv_streams_own_rows_in_chunks(self):
+        response, chunks = self.export('csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="transactions-oyuncu-', response['Content-Disposition'])
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(tuple(rows[0]), EXPORT_FIELDS)
+        self.assertEqual([int(row[0]) for row in rows[1:]], self.expected)
+        self.assertEqual((rows[1][3], rows[1][5]), ('-5.00', 'hareket "5", ş'))
+
+    @override_settings(TRANSACTION_EXPORT={'LINES_PER_CHUNK': 2})
+    def test_ndjson_streams_one_object_per_line(self):
+        response, chunks = self.export('ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(chunks), 3)
+        lines = [json.loads(line) for line in ''.join(chunks).splitlines()]
+        self.assertEqual([line['id'] for line in lines], self.expected)
+        self.assertEqual((lines[0]['kind'], lines[0]['amount']), ('LOCK', '-5.00'))
+        self.assertEqual(self.api.get(reverse('transaction-export', args=['xml'])).status_code, 404)
+
+    def test_async_chunks_pulls_generator_in_order(self):
+        async def collect():
+            return [chunk async for chunk in async_chunks(csv_chunks(iter([(1, 'a'), (2, 'b')])))]
+
+        self.assertEqual(''.join(async_to_sync(collect)()).splitlines()[1:], ['1,a', '2,b'])
+
+    def test_list_pages_with_cursor(self):
+        seen, cursor = [], None
+        while True:
+            response = self.api.get(reverse('transaction-list'), {'page_size': 2, **({'cursor': cursor} if cursor else {})})
+            seen += [row['id'] for row in response.data]
+            cursor = response.get('X-Next-Cursor')
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+
+class ReconcileLedgerTests(TransactionTestCase):
+    """reconcile_ledger: balance = başlangıç + SUM(hareketler); tutarsızlık raporu, düzeltme ve artımlı çalışma"""
+
+    def setUp(self):
+        self.clean = User.objects.create_user(username='temiz', password='x', balance=Decimal('950.00'))
+        Transaction.objects.create(user=self.clean, kind='LOCK', amount=Decimal('-50.00'), description='kilit')
+        # Hareketi yazılmış ama bakiyesi düşmemiş kullanıcı
+        self.drifted = User.objects.create_user(username='kayik', password='x', balance=Decimal('1000.00'))
+        Transaction.objects.create(user=self.drifted, kind='LOCK', amount=Decimal('-50.00'), description='kilit')
+        User.objects.create_user(username='yeni', password='x')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.checkpoint = os.path.join(directory, 'ledger.json')
+
+    def reconcile(self, *args):
+        out = io.StringIO()
+        call_command('reconcile_ledger', '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_mismatch_and_fails(self):
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '3 kullanıcı kontrol edildi, 1 tutarsız, toplam fark 50.00'):
+            call_command('reconcile_ledger', '--chunk-size', '2', stdout=out)
+        self.assertIn(f'user={self.drifted.id} kayik: bakiye=1000.00', out.getvalue())
+        self.assertIn('fark=50.00', out.getvalue())
+        self.assertFalse(Transaction.objects.filter(kind='ADJUSTMENT').exists())
+
+    def test_fix_writes_adjustment(self):
+        self.assertIn('(düzeltildi)', self.reconcile('--fix'))
+        adjustment = Transaction.objects.get(kind='ADJUSTMENT')
+        self.assertEqual((adjustment.user_id, adjustment.amount), (self.drifted.id, Decimal('50.00')))
+        self.assertIn('0 tutarsız', self.reconcile())
+
+    def test_incremental_run_checks_only_users_with_new_transactions(self):
+        with self.assertRaises(CommandError):
+            self.reconcile('--checkpoint', self.checkpoint)
+        User.objects.filter(id=self.clean.id).update(balance=Decimal('1000.00'))
+        Transaction.objects.create(user=self.clean, kind='REFUND', amount=Decimal('50.00'), description='iade')
+
+        # Tutarsız ama yeni hareketi olmayan kullanıcıya bakılmaz
+        self.assertIn('1 kullanıcı kontrol edildi, 0 tutarsız', self.reconcile('--incremental', '--checkpoint', self.checkpoint))
+
+    def test_interrupted_run_resumes_after_checkpoint(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'since': None, 'run_transaction_id': 0, 'user_id': self.drifted.id}, f)
+
+        out = self.reconcile('--checkpoint', self.checkpoint)
+
+        self.assertIn(f'Kaldığı yerden devam: user_id > {self.drifted.id}', out)
+        self.assertIn('1 kullanıcı kontrol edildi, 0 tutarsız', out)
+        with open(self.checkpoint) as f:
+            self.assertIsNone(json.load(f)['user_id'])
+
+
+class ArchiveRoomsTests(GameFixture, TransactionTestCase):
+    """archive_rooms bitmiş odaları arşive taşır; game_record arşivden aynı kaydı okur"""
+
+    def setUp(self):
+        self.create_game(target_number=42)
+        for seq, (guesser, number) in enumerate([(self.creator, 10), (self.player2, 42)], start=1):
+            GameGuess.objects.create(
+                session=self.game, seq=seq, guess=number, guesser=guesser,
+                guesser_name=guesser.username, response=f'yanıt {seq}', created_at=timezone.now()
+            )
+        settle_game(self.room.id, self.player2.id)
+        GameSession.objects.filter(id=self.game.id).update(ended_at=timezone.now() - timedelta(days=40))
+        # Saklama süresi içinde biten ve süren odalar yerinde kalır
+        self.recent = Room.objects.create(name='yeni', bet_amount=Decimal('10.00'), creator=self.creator, status='FINISHED')
+        self.open = Room.objects.create(name='açık', bet_amount=Decimal('10.00'), creator=self.creator)
+
+    def test_moves_finished_rooms_and_reads_them_back(self):
+        before = game_record(self.room.id)
+        out = io.StringIO()
+
+        call_command('archive_rooms', '--retention-days', '30', '--batch-size', '1', stdout=out)
+
+        self.assertIn('1 oda arşivlendi', out.getvalue())
+        self.assertEqual(set(Room.objects.values_list('id', flat=True)), {self.recent.id, self.open.id})
+        self.assertFalse(GameSession.objects.exists())
+        self.assertFalse(GameGuess.objects.exists())
+        self.assertEqual(Transaction.objects.filter(room_id=self.room.id, kind='PAYOUT').count(), 1)
+
+        after = game_record(self.room.id)
+        self.assertEqual((before.pop('archived'), after.pop('archived')), (False, True))
+        self.assertEqual(after, before)
+        self.assertEqual([guess['guess'] for guess in after['guesses']], [10, 42])
+
+        api = APIClient()
+        api.force_authenticate(self.creator)
+        response = api.get(reverse('game-history', args=[self.room.id]))
+        self.assertEqual((response.status_code, response.data['winner_id'], response.data['target_number']), (200, self.player2.id, 42))
+        api.force_authenticate(User.objects.create_user(username='yabanci', password='x'))
+        self.assertEqual(api.get(reverse('game-history', args=[self.room.id])).status_code, 404)
+
+    def test_dry_run_moves_nothing(self):
+        out = io.StringIO()
+        call_command('archive_rooms', '--dry-run', stdout=out)
+        self.assertIn('1 oda arşivlenecek', out.getvalue())
+        self.assertEqual(Room.objects.count(), 3)
+        self.assertFalse(ArchivedGame.objects.exists())
+
+
+class ProtocolNegotiationTests(TransactionTestCase):
+    """Oyun soketi: handshake'te anlaşılan alt protokol (msgpack/CBOR) her iki yönde kullanılır"""
+
+    def test_negotiate_picks_first_supported(self):
+        self.assertEqual(negotiate({'subprotocols': ['numberduel.v0', CBOR, MSGPACK]}), (CODECS[CBOR], CBOR))
+        self.assertEqual(negotiate({'subprotocols': ['numberduel.v0']}), (CODECS[JSON], None))
+        self.assertEqual(negotiate({}), (CODECS[JSON], None))
+
+    def test_binary_codecs_round_trip(self):
+        message = {
+            'type': 'game_message', 'message': '🏆 Kazandınız!', 'event': 'WINNER', 'winner_id': 5,
+            'reason': 'timeout', 'seq': 3, 'hint': None,
+            'balances': {'creator': {'user_id': 1, 'current': 950.0}},
+            'deltas': [{'event': 'CONTINUE', 'hint': 'UP', 'turn': 2}],
+        }
+        expected = {
+            'event': 'WINNER', 'winner_id': 5, 'reason': 'timeout', 'seq': 3,
+            'balances': {'creator': {'user_id': 1, 'current': 950.0}},
+            'deltas': [{'event': 'CONTINUE', 'hint': 'UP', 'turn': 2}],
+        }
+        for subprotocol in (MSGPACK, CBOR):
+            codec = CODECS[subprotocol]
+            data = frame(codec, message)['bytes_data']
+            self.assertEqual(expand(codec.decode(data)), expected)
+            # Kısa anahtar ve tamsayı kodlar JSON'dan küçük
+            self.assertLess(len(data), len(json.dumps(message)) / 2)
+
+    def test_game_socket_speaks_negotiated_protocol(self):
+        creator = User.objects.create_user(username='creator', password='x')
+        player2 = User.objects.create_user(username='player2', password='x')
+        room = Room.objects.create(name='oda', bet_amount=Decimal('50.00'), creator=creator, player2=player2, status='FULL')
+        codec = CODECS[MSGPACK]
+
+        async def receive(communicator):
+            output = await communicator.receive_output(5)
+            if output.get('bytes') is not None:
+                return 'bytes', expand(codec.decode(output['bytes']))
+            return 'text', json.loads(output['text'])
+
+        async def receive_event(communicator, event):
+            while True:
+                kind, message = await receive(communicator)
+                if message.get('event') == event or 'error' in message:
+                    return kind, message
+
+        async def play():
+            binary = WebsocketCommunicator(
+                application, f'/ws/game/{room.id}/?token={AccessToken.for_user(creator)}', subprotocols=['x', MSGPACK]
+            )
+            text = WebsocketCommunicator(application, f'/ws/game/{room.id}/?token={AccessToken.for_user(player2)}')
+            accepted = [await binary.connect(5), await text.connect(5)]
+            try:
+                starts = [await receive_event(binary, 'START'), await receive_event(text, 'START')]
+                turn = starts[0][1]['turn']
+                guesser = binary if turn == creator.id else text
+                if guesser is binary:
+                    await binary.send_to(bytes_data=codec.encode({'action': 'guess', 'number': 0}))
+                else:
+                    await text.send_to(text_data=json.dumps({'action': 'guess', 'number': 0}))
+                guesses = [await receive_event(binary, 'CONTINUE'), await receive_event(text, 'CONTINUE')]
+            finally:
+                await binary.disconnect()
+                await text.disconnect()
+                await engine.flush()
+            return accepted, starts, guesses
+
+        accepted, starts, guesses = async_to_sync(play)()
+
+        self.assertEqual(accepted, [(True, MSGPACK), (True, None)])
+        self.assertEqual([kind for kind, _ in starts + guesses], ['bytes', 'text', 'bytes', 'text'])
+        (_, binary_guess), (_, text_guess) = guesses
+        # İkili protokolde metin gönderilmez; ortak alanlar aynı
+        self.assertNotIn('message', binary_guess)
+        self.assertIn('message', text_guess)
+        for key in ('seq', 'last_guess', 'hint', 'turn'):
+            self.assertEqual(binary_guess[key], text_guess[key])
+        self.assertEqual((binary_guess['seq'], binary_guess['hint']), (1, 'UP'))
+
+
+class FrameCacheTests(SimpleTestCase):
+    """Yayın başına, alt protokol başına tek kodlama; aynı çerçeve tüm yerel soketlere gider"""
+
+    def setUp(self):
+        self.frames = FrameCache(max_size=4)
+        self.message = broadcast_message({'type': 'game_message', 'event': 'CONTINUE', 'seq': 1, 'message': 'metin'})
+
+    def test_each_protocol_encodes_once(self):
+        before = frames_encoded.value
+        sockets = [CODECS[subprotocol] for subprotocol in (JSON, MSGPACK, CBOR) for _ in range(3)]
+        sent = [self.frames.frame(codec, self.message) for codec in sockets]
+
+        self.assertEqual(frames_encoded.value - before, 3)
+        for index in range(0, 9, 3):
+            self.assertIs(sent[index], sent[index + 1])
+            self.assertIs(sent[index], sent[index + 2])
+        # Yayın kimliği istemciye gitmez
+        self.assertNotIn(BROADCAST_ID, json.loads(sent[0]['text_data']))
+        self.assertEqual(expand(CODECS[MSGPACK].decode(sent[3]['bytes_data'])), {'event': 'CONTINUE', 'seq': 1})
+
+    def test_messages_without_broadcast_id_are_not_cached(self):
+        message = {'type': 'game_message', 'event': 'CONTINUE'}
+        first, second = self.frames.frame(CODECS[JSON], message), self.frames.frame(CODECS[JSON], message)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.frames.frames, {})
+
+    def test_old_generation_is_dropped(self):
+        codec = CODECS[JSON]
+        first = self.frames.frame(codec, self.message)
+        for seq in range(2, 6):
+            self.frames.frame(codec, broadcast_message({'event': 'CONTINUE', 'seq': seq}))
+        # Bir nesil geride: hâlâ aynı çerçeve
+        self.assertIs(self.frames.frame(codec, self.message), first)
+        for seq in range(6, 14):
+            self.frames.frame(codec, broadcast_message({'event': 'CONTINUE', 'seq': seq}))
+        self.assertIsNot(self.frames.frame(codec, self.message), first)
@@ -1,6 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RoomViewSet, TransactionListView, LeaderboardView
+from .views import (
+    RoomViewSet, TransactionListView, TransactionExportView, LeaderboardView, LeaderboardRankView, GameHistoryView
+)
 
 router = DefaultRouter()
 router.register(r'rooms', RoomViewSet, basename='room')
@@ -8,6 +10,9 @@ router.register(r'rooms', RoomViewSet, basename='room')
 urlpatterns = [
     path('', include(router.urls)),
     path('transactions/', TransactionListView.as_view(), name='transaction-list'),
+    path('transactions/export/<str:fmt>/', TransactionExportView.as_view(), name='transaction-export'),
     path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('leaderboard/me/', LeaderboardRankView.as_view(), name='leaderboard-rank'),
+    path('games/<int:room_id>/history/', GameHistoryView.as_view(), name='game-history'),
 ]
 
@@ -1,5 +1,46 @@
+import logging
+from django.contrib.auth import get_user_model
 from django.db import transaction
-from .models import Transaction, Room
+from django.db.models import Case, F, When
+from django.utils import timezone
+from .models import Transaction, Room, GameSession
+from .leaderboard import publish as publish_leaderboard
+from .lobby import publish_removal
+from .metrics import track
+from .scheduler import scheduler
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Bahsi kilitlenen oyuncunun oyun soketini açması için süre (saniye)
+JOIN_TIMEOUT = 60
+
+
+def join_timer_key(room_id, user_id):
+    return f'join_{room_id}_{user_id}'
+
+
+def reserve_stake(room, user_id):
+    """
+    Oyuncunun bahsini kilitle (çağıranın transaction'ında) - bakiye koşulu UPDATE'in içinde
+    Oyuncu JOIN_TIMEOUT içinde oyun soketini açmazsa zamanlayıcı bahsi iade eder (bkz. consumers.expire_join)
+    Dönüş: bakiye yetip kilitlendiyse True
+    """
+    reserved = User.objects.filter(
+        pk=user_id, balance__gte=room.bet_amount
+    ).update(balance=F('balance') - room.bet_amount)
+    if not reserved:
+        return False
+    Transaction.objects.create(
+        user_id=user_id,
+        room=room,
+        kind='LOCK',
+        amount=-room.bet_amount,
+        description=f"Oda #{room.id} bahis kilidi"
+    )
+    scheduler.schedule_sync('join', join_timer_key(room.id, user_id), JOIN_TIMEOUT, room.id, user_id)
+    return True
+
 
 def process_game_results(room_id, winner_id):
     with transaction.atomic():
@@ -15,8 +56,97 @@ def process_game_results(room_id, winner_id):
         loser.balance -= bet
         loser.save()
 
-        Transaction.objects.create(user=winner, amount=bet, description=f"Oyun Kazanıldı: Oda #{room.id}")
-        Transaction.objects.create(user=loser, amount=-bet, description=f"Oyun Kaybedildi: Oda #{room.id}")
+        Transaction.objects.create(user=winner, room=room, kind='PAYOUT', amount=bet, description=f"Oyun Kazanıldı: Oda #{room.id}")
+        Transaction.objects.create(user=loser, room=room, kind='LOSS', amount=-bet, description=f"Oyun Kaybedildi: Oda #{room.id}")
         
         room.status = 'FINISHED'
-        room.save()
\ No newline at end of file
+        room.save()
+
+
+PAYOUT_DESCRIPTIONS = {
+    'disconnect': "Oda #{room_id} kazancı - Rakip 30sn bağlantısız",
+    'manual_leave': "Oda #{room_id} kazancı - Rakip oyunu terketti",
+    'timeout': "Oda #{room_id} kazancı - Rakip süresinde tahmin yapmadı",
+}
+
+
+def settle_game(room_id, winner_id, reason='normal'):
+    """
+    Oyun bitişinde bakiye transferini gerçekleştir
+    reason: 'normal' (doğru tahmin), 'disconnect' (rakip ayrıldı), 'manual_leave' veya 'timeout' (hamle süresi)
+    Dönüş: bu çağrı oyunu bitirdiyse True (idempotent: ikinci çağrı False döner)
+
+    Küme tabanlı: bakiye ve istatistikler F() ifadeleriyle veritabanında güncellenir,
+    satır kilitleri sadece dört yazma ifadesi boyunca tutulur.
+    """
+    try:
+        return settle(room_id, winner_id, reason)
+    except Exception:
+        logger.exception("settle_game hatası room=%s winner=%s", room_id, winner_id)
+        return False
+
+
+def settle(room_id, winner_id, reason='normal'):
+    """
+    settle_game'in hata yakalamayan hali: çağıranın transaction'ı içinde de çalışır
+    (ör. kazanan tahminle aynı transaction'da - biri başarısız olursa ikisi birlikte geri alınır)
+    Bildirimler (lobi, leaderboard) en dıştaki transaction commit olunca gönderilir.
+    """
+    # Kilitsiz okuma: oyuncular ve bahis oyun boyunca değişmez,
+    # aşağıdaki koşullu UPDATE okunan değerleri doğrular
+    room = Room.objects.filter(id=room_id).values(
+        'status', 'bet_amount', 'creator_id', 'player2_id', 'creator__username', 'player2__username'
+    ).first()
+    if room is None or room['status'] == 'FINISHED':
+        logger.debug("Oyun zaten bitti room=%s", room_id)
+        return False
+    if room['player2_id'] is None:
+        logger.warning("Rakipsiz oda bitirilemez room=%s", room_id)
+        return False
+
+    # Kazanan ve kaybedeni belirle
+    if winner_id == room['creator_id']:
+        loser_id, loser_name = room['player2_id'], room['player2__username']
+    else:
+        loser_id, loser_name = room['creator_id'], room['creator__username']
+
+    # Bahisler zaten kilitlendiyse, kazanana 2x ver
+    # (Çünkü her iki oyuncudan da çekilmişti)
+    payout = room['bet_amount'] * 2
+    description = PAYOUT_DESCRIPTIONS.get(reason, "Oda #{room_id} kazancı - Rakip: {loser}")
+
+    with track('settle'), transaction.atomic():
+        # Odayı FINISHED yap (koşullu): eşzamanlı ikinci çağrı kilidi bekler,
+        # sonra koşul tutmadığı için 0 satır günceller
+        finished = Room.objects.filter(
+            id=room_id,
+            creator_id=room['creator_id'],
+            player2_id=room['player2_id'],
+            bet_amount=room['bet_amount']
+        ).exclude(status='FINISHED').update(status='FINISHED')
+        if not finished:
+            logger.debug("Oyun zaten bitti room=%s", room_id)
+            return False
+
+        # Bakiye ve istatistikler tek ifadede
+        User.objects.filter(id__in=[winner_id, loser_id]).update(
+            balance=Case(When(id=winner_id, then=F('balance') + payout), default=F('balance')),
+            total_wins=Case(When(id=winner_id, then=F('total_wins') + 1), default=F('total_wins')),
+            total_games=F('total_games') + 1
+        )
+        Transaction.objects.create(
+            user_id=winner_id,
+            room_id=room_id,
+            kind='PAYOUT',
+            amount=payout,
+            description=description.format(room_id=room_id, loser=loser_name)
+        )
+        GameSession.objects.filter(room_id=room_id).update(winner_id=winner_id, ended_at=timezone.now())
+        publish_removal(room_id, 'finished')
+
+    # Commit sonrası, kilitler bırakılmışken: leaderboard için güncel satırlar
+    publish_leaderboard(*User.objects.filter(id__in=[winner_id, loser_id]).only(
+        'id', 'username', 'balance', 'total_games', 'total_wins'
+    ))
+    logger.info("Oyun bitti room=%s winner=%s reason=%s payout=%s", room_id, winner_id, reason, payout)
+    return True
@@ -3,23 +3,53 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
+from decimal import Decimal, InvalidOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from django.db import transaction as db_transaction
 from .models import Room, Transaction
 from .serializers import RoomSerializer, TransactionSerializer
+from .leaderboard import leaderboard, leaderboard_setting, ORDERINGS
+from .leaderboard import publish as publish_leaderboard
+from .lobby import publish_room
+from .pagination import KeysetPagination
+from .exports import FORMATS, async_chunks, export_rows
+from .archive import game_record
+from .utils import reserve_stake
 
 
 class RoomViewSet(viewsets.ModelViewSet):
+    """
+    Liste: GET ?status=OPEN,FULL&min_bet=10&max_bet=100&page_size=20&cursor=...
+    Sonraki sayfa X-Next-Cursor header'ında (bkz. KeysetPagination)
+    """
     queryset = Room.objects.all()
     serializer_class = RoomSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if self.action == 'list':
-            return Room.objects.filter(
-                status__in=['OPEN', 'FULL']
-            ).order_by('-created_at')
+            return self.filter_rooms(Room.objects.select_related('creator'))
         return Room.objects.all()
 
+    def filter_rooms(self, queryset):
+        params = self.request.query_params
+        statuses = params.get('status', 'OPEN,FULL').split(',')
+        if not set(statuses) <= {'OPEN', 'FULL'}:
+            raise serializers.ValidationError({"error": "status sadece OPEN ve/veya FULL olabilir"})
+        # Tek durum filtresi de IN ile yazılır: kısmi index koşuluyla eşleşsin
+        queryset = queryset.filter(status__in=statuses)
+        try:
+            if params.get('min_bet'):
+                queryset = queryset.filter(bet_amount__gte=Decimal(params['min_bet']))
+            if params.get('max_bet'):
+                queryset = queryset.filter(bet_amount__lte=Decimal(params['max_bet']))
+        except InvalidOperation:
+            raise serializers.ValidationError({"error": "min_bet ve max_bet sayı olmalı"})
+        return queryset
+
     def perform_create(self, serializer):
         user = self.request.user
         bet_amount = serializer.validated_data['bet_amount']
@@ -27,14 +57,20 @@ class RoomViewSet(viewsets.ModelViewSet):
         if user.balance < bet_amount:
             raise serializers.ValidationError({"error": "Bakiye yetersiz!"})
         
-        serializer.save(creator=user)
+        room = serializer.save(creator=user)
+        publish_room(room, 'created')
 
     @action(detail=True, methods=['post'])
     def join(self, request, pk=None):
+        """
+        Odaya katıl: koşullu UPDATE (compare-and-swap) + bahsin aynı transaction'da kilitlenmesi
+        Yarışı kaybedenler satır kilidi beklemeden 409 alır. Katılan JOIN_TIMEOUT içinde oyun
+        soketini açmazsa zamanlayıcı bahsi iade eder (bkz. consumers.expire_join).
+        """
         room = self.get_object()
         user = request.user
 
-        if room.creator == user:
+        if room.creator_id == user.id:
             return Response(
                 {"error": "Bu odayı sen oluşturdun, zaten içindesin!"}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -43,7 +79,7 @@ class RoomViewSet(viewsets.ModelViewSet):
         if room.status != 'OPEN':
             return Response(
                 {"error": "Bu oda artık müsait değil!"}, 
-                status=status.HTTP_400_BAD_REQUEST
+                status=status.HTTP_409_CONFLICT
             )
         
         if user.balance < room.bet_amount:
@@ -53,9 +89,29 @@ class RoomViewSet(viewsets.ModelViewSet):
             )
 
         with db_transaction.atomic():
+            claimed = Room.objects.filter(
+                pk=room.pk, status='OPEN', player2__isnull=True
+            ).update(player2=user, status='FULL')
+            if not claimed:
+                return Response(
+                    {"error": "Bu oda artık müsait değil!"}, 
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            # Katılanın bahsini kilitle: bakiye koşulu UPDATE'in içinde
+            if not reserve_stake(room, user.id):
+                # Oda talebi de geri alınır
+                db_transaction.set_rollback(True)
+                return Response(
+                    {"error": "Bakiye yetersiz!"}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            user.balance -= room.bet_amount
             room.player2 = user
             room.status = 'FULL'
-            room.save()
+            publish_leaderboard(user)
+            publish_room(room, 'joined')
         
         return Response({
             "status": "Oyun başlıyor...", 
@@ -64,34 +120,102 @@ class RoomViewSet(viewsets.ModelViewSet):
 
 
 class TransactionListView(generics.ListAPIView):
+    """GET ?page_size=20&cursor=... - sonraki sayfa X-Next-Cursor header'ında"""
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return Transaction.objects.filter(
             user=self.request.user
-        ).order_by('-created_at')
+        ).order_by('-created_at', '-id')
+
+
+class TransactionExportView(APIView):
+    """
+    GET transactions/export/csv/ veya transactions/export/ndjson/
+    Tüm geçmiş parça parça akıtılır; sunucu belleği geçmiş boyutundan bağımsızdır.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, fmt):
+        if fmt not in FORMATS:
+            raise Http404
+        encode, content_type = FORMATS[fmt]
+        chunks = encode(export_rows(Transaction.objects.filter(user=request.user)))
+        if isinstance(request._request, ASGIRequest):
+            chunks = async_chunks(chunks)
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        filename = f"transactions-{request.user.username}-{timezone.now():%Y%m%d}.{fmt}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
 class LeaderboardView(APIView):
+    """
+    GET ?order=wins|win_rate&page=1&page_size=10
+    Sıralama process içi indeksten okunur; veritabanına her istekte gidilmez.
+    """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        top_players = User.objects.filter(
-            total_games__gt=0
-        ).order_by('-total_wins', '-balance')[:10]
-
-        leaderboard_data = []
-        for idx, player in enumerate(top_players, 1):
-            leaderboard_data.append({
-                'rank': idx,
-                'username': player.username,
-                'balance': float(player.balance),
-                'total_games': player.total_games,
-                'total_wins': player.total_wins,
-                'win_rate': player.win_rate
-            })
-        
-        return Response(leaderboard_data)
+        order = request.query_params.get('order', 'wins')
+        if order not in ORDERINGS:
+            return Response(
+                {"error": f"Geçersiz sıralama: {order}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            page_size = int(request.query_params.get('page_size', 10))
+        except ValueError:
+            return Response(
+                {"error": "page ve page_size sayı olmalı"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        page_size = min(max(1, page_size), leaderboard_setting('MAX_PAGE_SIZE', 100))
+
+        leaderboard_data, total = leaderboard.page(order, page, page_size)
+        response = Response(leaderboard_data)
+        response['X-Total-Count'] = total
+        return response
+
+
+class LeaderboardRankView(APIView):
+    """Giriş yapan kullanıcının sırası"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        order = request.query_params.get('order', 'wins')
+        if order not in ORDERINGS:
+            return Response(
+                {"error": f"Geçersiz sıralama: {order}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        entry = leaderboard.rank(request.user.id, order)
+        if entry is None:
+            return Response(
+                {"error": "Henüz sıralamada değilsin"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        entry['total_players'] = leaderboard.total(order)
+        return Response(entry)
+
+
+class GameHistoryView(APIView):
+    """Oyun geçmişi (arşivlenmiş oyunlar dahil) - sadece oyuncular ve yöneticiler görebilir"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, room_id):
+        record = game_record(room_id)
+        players = (record['creator_id'], record['player2_id']) if record else ()
+        if record is None or (request.user.id not in players and not request.user.is_staff):
+            return Response(
+                {"error": "Oyun bulunamadı"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if record['status'] != 'FINISHED':
+            # Devam eden oyunda hedef sayı gizli
+            record['target_number'] = None
+        return Response(record)